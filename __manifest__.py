@@ -26,6 +26,7 @@
     'license': 'LGPL-3',
     'depends': [
         'base',
+        'bus',
         'mail',
         'contacts',
     ],
@@ -57,9 +58,12 @@
         'views/payment_record_views.xml',
         'views/partner_contract_views.xml',
         'views/incident_views.xml',
+        'views/api_token_views.xml',
 
         # Dashboard
         'views/dashboard_views.xml',
+        'views/fleet_map_views.xml',
+        'views/tracking_templates.xml',
 
         # Reports
         'reports/parcel_delivery_note.xml',
@@ -74,6 +78,8 @@
         'web.assets_backend': [
             'routy/static/src/js/dashboard.js',
             'routy/static/src/xml/dashboard.xml',
+            'routy/static/src/js/fleet_map.js',
+            'routy/static/src/xml/fleet_map.xml',
         ],
     },
     'test': True,
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark of the mobile API JSON encoding.
+
+Compares encode time and payload size of get_my_jobs-like job lists for:
+  - the former path: dates converted with isoformat(), then json.dumps()
+  - tools/json_codec with its standard library fallback
+  - tools/json_codec with orjson (when installed)
+and the size of each body once gzipped the way the API sends it.
+
+Runs without Odoo:
+    python benchmarks/bench_mobile_json.py [--jobs 50,200,500] [--repeat 200]
+"""
+
+import argparse
+import gzip
+import importlib.util
+import json
+import os
+import random
+import timeit
+from datetime import datetime, timedelta
+
+# Load the codec from its file so the Odoo-dependent tools package is not imported
+_spec = importlib.util.spec_from_file_location(
+    'json_codec', os.path.join(os.path.dirname(__file__), '..', 'tools', 'json_codec.py'))
+json_codec = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(json_codec)
+
+STREETS = ['Tahrir St', 'Corniche El Nil', 'Ramses St', 'Salah Salem Rd', 'Abbas El Akkad St', 'Mohandessin Sq']
+CITIES = ['Cairo', 'Giza', 'Nasr City', 'Heliopolis', 'Maadi', '6th of October']
+NAMES = ['Ahmed Ali', 'Mona Hassan', 'Omar Farouk', 'Sara Mahmoud', 'Youssef Adel', 'Nour Ibrahim']
+NOTES = [
+    'Fragile items - handle with care',
+    'Call the customer 10 minutes before arrival',
+    'Leave with the building concierge if nobody answers',
+    'Gate code 4512, third floor, apartment on the left',
+    '',
+]
+
+
+def make_jobs(count, seed=42):
+    """Job dicts shaped like get_my_jobs rows, with raw datetime values"""
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 15, 8, 0)
+    jobs = []
+    for index in range(count):
+        jobs.append({
+            'id': 1000 + index,
+            'name': 'JOB%05d' % (1000 + index),
+            'job_type': rng.choice(['pickup', 'delivery']),
+            'state': rng.choice(['assigned', 'accepted', 'in_progress']),
+            'service_request_id': 500 + index // 2,
+            'service_request_name': 'SR%05d' % (500 + index // 2),
+            'customer_name': rng.choice(NAMES),
+            'location_address': '%d %s, %s' % (rng.randint(1, 250), rng.choice(STREETS), rng.choice(CITIES)),
+            'location_lat': round(30.0 + rng.random() / 5, 7),
+            'location_lng': round(31.2 + rng.random() / 5, 7),
+            'contact_name': rng.choice(NAMES),
+            'contact_phone': '+2010%08d' % rng.randint(0, 99999999),
+            'scheduled_time': start + timedelta(minutes=12 * index),
+            'parcel_count': rng.randint(1, 4),
+            'notes': rng.choice(NOTES),
+        })
+    return jobs
+
+
+def encode_legacy(jobs):
+    """The former path: isoformat() by hand, then json.dumps with default settings"""
+    rows = [dict(job, scheduled_time=job['scheduled_time'].isoformat()) for job in jobs]
+    return json.dumps({'success': True, 'jobs': rows, 'count': len(rows)}).encode()
+
+
+def encode_fallback(jobs):
+    orjson, json_codec.orjson = json_codec.orjson, None
+    try:
+        return json_codec.dumps({'success': True, 'jobs': jobs, 'count': len(jobs)})
+    finally:
+        json_codec.orjson = orjson
+
+
+def encode_codec(jobs):
+    return json_codec.dumps({'success': True, 'jobs': jobs, 'count': len(jobs)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--jobs', default='50,200,500', help='Comma-separated job list sizes')
+    parser.add_argument('--repeat', type=int, default=200, help='Encodings timed per measure')
+    args = parser.parse_args()
+
+    encoders = [('json + isoformat', encode_legacy), ('json_codec (json)', encode_fallback)]
+    if json_codec.orjson is not None:
+        encoders.append(('json_codec (orjson)', encode_codec))
+    else:
+        print('orjson is not installed; only the standard library paths are measured\n')
+
+    print('%6s  %-20s %10s %10s %10s %8s' % ('jobs', 'encoder', 'us/encode', 'bytes', 'gzipped', 'ratio'))
+    for count in [int(value) for value in args.jobs.split(',')]:
+        jobs = make_jobs(count)
+        for label, encoder in encoders:
+            seconds = min(timeit.repeat(lambda: encoder(jobs), number=args.repeat, repeat=3)) / args.repeat
+            body = encoder(jobs)
+            compressed = gzip.compress(body, compresslevel=json_codec.GZIP_LEVEL)
+            print('%6d  %-20s %10.1f %10d %10d %7.1f%%' % (
+                count, label, seconds * 1e6, len(body), len(compressed), 100.0 * len(compressed) / len(body)))
+        print()
+
+
+if __name__ == '__main__':
+    main()
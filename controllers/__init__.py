@@ -1,3 +1,5 @@
 # -*- coding: utf-8 -*-
 
 from . import mobile_api
+from . import gps_export
+from . import tracking
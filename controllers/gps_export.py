@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+from datetime import date
+
+from odoo import http
+from odoo.http import request, Response
+
+EXPORT_MIMETYPES = {
+    'ndjson': 'application/x-ndjson',
+    'geojson': 'application/geo+json',
+}
+
+
+class RoutyGPSExport(http.Controller):
+    """Bulk export of GPS tracks for audits and disputes"""
+
+    def _error_response(self, message, status):
+        """Return a plain-text error response"""
+        return Response(message, status=status, mimetype='text/plain')
+
+    @http.route('/routy/gps/export', type='http', auth='user', methods=['GET'], csrf=False)
+    def export_tracks(self, **kwargs):
+        """
+        Stream GPS logs as NDJSON (default) or GeoJSON.
+        Filters: driver_id, job_id, company_id, date_from, date_to (YYYY-MM-DD).
+        """
+        if not request.env.user.has_group('routy.group_dispatcher'):
+            return self._error_response('Not authorized', 403)
+
+        export_format = kwargs.get('format', 'ndjson')
+        if export_format not in EXPORT_MIMETYPES:
+            return self._error_response('Unsupported format: %s' % export_format, 400)
+
+        try:
+            domain = []
+            for field in ('driver_id', 'job_id', 'company_id'):
+                if kwargs.get(field):
+                    domain.append((field, '=', int(kwargs[field])))
+            if kwargs.get('date_from'):
+                domain.append(('date', '>=', date.fromisoformat(kwargs['date_from'])))
+            if kwargs.get('date_to'):
+                domain.append(('date', '<=', date.fromisoformat(kwargs['date_to'])))
+        except ValueError as e:
+            return self._error_response('Invalid filter: %s' % str(e), 400)
+
+        if not domain:
+            return self._error_response('At least one filter is required', 400)
+
+        stream = request.env['routy.gps.log']._export_stream(domain, export_format)
+        filename = 'gps_export.%s' % ('geojson' if export_format == 'geojson' else 'ndjson')
+        return Response(
+            stream,
+            mimetype=EXPORT_MIMETYPES[export_format],
+            headers=[('Content-Disposition', 'attachment; filename="%s"' % filename)],
+            direct_passthrough=True,
+        )
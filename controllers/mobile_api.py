@@ -1,14 +1,147 @@
 # -*- coding: utf-8 -*-
 
+import hashlib
 import json
 import logging
 import base64
-from odoo import http
+import time
+from datetime import date, datetime, timedelta
+from werkzeug.http import unquote_etag
+from odoo import http, fields
 from odoo.http import request, Response
+from odoo.addons.routy.models.api_token import hash_token
+from odoo.addons.routy.models.gps_log import GPS_BATCH_MAX_POINTS
+from odoo.addons.routy.models.sync_tombstone import SYNC_TOMBSTONE_RETENTION_DAYS
+from odoo.addons.routy.tools import gps_codec, json_codec
+
+# Content type of the compact binary GPS upload format
+GPS_BINARY_CONTENT_TYPE = 'application/x-routy-gps'
+GPS_BINARY_MAX_BYTES = 64 * 1024
+
+# Streamed POD uploads: size cap, accepted image types and target field per kind
+POD_UPLOAD_MAX_BYTES = 10 * 1024 * 1024
+POD_UPLOAD_MIMETYPES = ('image/jpeg', 'image/png', 'image/webp')
+# Leading bytes of each accepted image type, as (offset, bytes)
+POD_UPLOAD_SIGNATURES = {
+    'image/jpeg': ((0, b'\xff\xd8\xff'),),
+    'image/png': ((0, b'\x89PNG\r\n\x1a\n'),),
+    'image/webp': ((0, b'RIFF'), (8, b'WEBP')),
+}
+POD_UPLOAD_SIGNATURE_LENGTH = 12
+POD_UPLOAD_FIELDS = {
+    'photo': 'pod_photo',
+    'signature': 'pod_signature',
+}
+
+# Records returned per model by one sync call
+SYNC_PAGE_SIZE = 200
+
+# write_date is the start time of the writing transaction, so a change may
+# commit after the sync cursor went past it: records changed less than this
+# many seconds ago are sent but kept after the cursor, to be sent again
+SYNC_SETTLE_DELAY = 120
+
+# Data set exchanged by the delta sync: (key, model, driver field, fields)
+SYNC_MODELS = (
+    ('jobs', 'routy.job', 'driver_id', [
+        'name', 'job_type', 'state', 'service_request_id', 'customer_id', 'location_address',
+        'location_lat', 'location_lng', 'contact_name', 'contact_phone', 'scheduled_time',
+        'parcel_ids', 'notes',
+    ]),
+    ('parcels', 'routy.parcel', 'assigned_driver_id', [
+        'name', 'description', 'weight', 'declared_value', 'state', 'service_request_id',
+        'current_job_id', 'customer_id',
+    ]),
+    ('service_requests', 'routy.service_request', 'assigned_driver_id', [
+        'name', 'customer_id', 'state', 'pickup_address', 'pickup_lat', 'pickup_lng',
+        'pickup_contact', 'pickup_phone', 'delivery_address', 'delivery_lat', 'delivery_lng',
+        'delivery_contact', 'delivery_phone', 'cod_amount', 'scheduled_pickup_date',
+        'scheduled_delivery_date',
+    ]),
+)
+
+# Items accepted by one bulk job action call
+JOBS_BULK_MAX_ITEMS = 200
+
+# Entries accepted by one offline journal replay
+REPLAY_MAX_ENTRIES = 500
+
+# Default and maximum page size of get_my_jobs when paging is requested
+JOBS_PAGE_DEFAULT_LIMIT = 50
+JOBS_PAGE_MAX_LIMIT = 500
+
+# Keys of a job in get_my_jobs, mapped to the job field they are read from
+JOB_API_FIELDS = {
+    'id': 'id',
+    'name': 'name',
+    'job_type': 'job_type',
+    'state': 'state',
+    'service_request_id': 'service_request_id',
+    'service_request_name': 'service_request_id',
+    'customer_name': 'customer_id',
+    'location_address': 'location_address',
+    'location_lat': 'location_lat',
+    'location_lng': 'location_lng',
+    'contact_name': 'contact_name',
+    'contact_phone': 'contact_phone',
+    'scheduled_time': 'scheduled_time',
+    'parcel_count': 'parcel_ids',
+    'notes': 'notes',
+}
 
 _logger = logging.getLogger(__name__)
 
 
+def _encode_cursor(cursor):
+    """Opaque paging cursor handed to the app"""
+    return base64.urlsafe_b64encode(json_codec.dumps(cursor)).decode()
+
+
+def _decode_cursor(token):
+    """Parse a cursor made by _encode_cursor"""
+    return json.loads(base64.urlsafe_b64decode(token.encode()))
+
+
+def _decode_sync_cursor(token):
+    """Parse a sync cursor; raises ValueError when it is malformed"""
+    cursor = _decode_cursor(token)
+    if not isinstance(cursor, dict) or not isinstance(cursor.get('tombstone'), int):
+        raise ValueError('Invalid cursor')
+    for key, _model, _field, _fields in SYNC_MODELS:
+        position = cursor.get(key)
+        if position is not None:
+            datetime.fromisoformat(position[0])
+            int(position[1])
+    return cursor
+
+
+def _matches_signature(head, mimetype):
+    """Whether the first bytes of an upload are those of an image of `mimetype`"""
+    return all(
+        head[offset:offset + len(magic)] == magic
+        for offset, magic in POD_UPLOAD_SIGNATURES[mimetype]
+    )
+
+
+class _PrefixedStream:
+    """A binary stream whose first bytes were already read, for streams that cannot seek"""
+
+    def __init__(self, head, stream):
+        self.head = head
+        self.stream = stream
+
+    def read(self, size=-1):
+        if not self.head:
+            return self.stream.read(size)
+        if size is None or size < 0:
+            data, self.head = self.head + self.stream.read(), b''
+            return data
+        data, self.head = self.head[:size], self.head[size:]
+        if len(data) < size:
+            data += self.stream.read(size - len(data))
+        return data
+
+
 class RoutyMobileAPI(http.Controller):
     """Mobile API for Routy Driver App"""
 
@@ -17,24 +150,192 @@ class RoutyMobileAPI(http.Controller):
         if not request.env.user or request.env.user._is_public():
             return False, {'error': 'Authentication required'}, 401
 
-        # Check if user is a driver
-        driver_group = request.env.ref('routy.group_driver')
-        if driver_group not in request.env.user.groups_id:
+        # Check if user is a driver (group membership is cached by the ORM)
+        if not request.env.user.has_group('routy.group_driver'):
             return False, {'error': 'User is not a driver'}, 403
 
         return True, None, None
 
-    def _json_response(self, data, status=200):
-        """Return JSON response"""
+    def _json_response(self, data, status=200, headers=None):
+        """Return JSON response, gzip-compressed when large and the client accepts it"""
+        return self._encoded_response(json_codec.dumps(data), status, list(headers or []))
+
+    def _encoded_response(self, body, status, headers):
+        """Response for an encoded JSON body, compressed per the request's Accept-Encoding"""
+        body, content_encoding = json_codec.compress(
+            body, request.httprequest.headers.get('Accept-Encoding'))
+        headers.append(('Vary', 'Accept-Encoding'))
+        if content_encoding:
+            headers.append(('Content-Encoding', content_encoding))
         return Response(
-            json.dumps(data),
+            body,
             status=status,
-            mimetype='application/json'
+            mimetype='application/json',
+            headers=headers
         )
 
-    @http.route('/api/v1/routy/jobs/my', type='http', auth='user', methods=['GET'], csrf=False)
+    def _etag_matches(self, etag):
+        """
+        Whether the client's If-None-Match holds `etag`. The header is parsed
+        as a list of whole tags compared weakly (W/ ignored), * matching any.
+        """
+        tag, _weak = unquote_etag(etag)
+        return request.httprequest.if_none_match.contains_weak(tag)
+
+    def _etag_headers(self, etag):
+        """Validator headers sent alike with a response and its 304"""
+        return [('ETag', etag), ('Cache-Control', 'private, no-cache')]
+
+    def _not_modified(self, headers):
+        """
+        304 answer to a matching If-None-Match, carrying the headers of the
+        full response, including the Vary added by _encoded_response
+        """
+        return Response(status=304, headers=headers + [('Vary', 'Accept-Encoding')])
+
+    def _result_set_etag(self, model, domain, params):
+        """
+        Weak ETag of the records matching `domain`, from their count and
+        latest write_date (one aggregate query, nothing read or serialized)
+        combined with the user and the request parameters shaping the response
+        """
+        [(count, last_write)] = request.env[model]._read_group(
+            domain, aggregates=['__count', 'write_date:max'])
+        version = json_codec.dumps([request.env.uid, count, last_write, sorted(params.items())])
+        return 'W/"%s"' % hashlib.sha1(version).hexdigest()
+
+    def _cacheable_json_response(self, data):
+        """
+        JSON response with a weak ETag of its content, answering a matching
+        If-None-Match with 304
+        """
+        body = json_codec.dumps(data, sort_keys=True)
+        etag = 'W/"%s"' % hashlib.sha1(body).hexdigest()
+        headers = self._etag_headers(etag)
+        if self._etag_matches(etag):
+            return self._not_modified(headers)
+        return self._encoded_response(body, 200, headers)
+
+    def _serialize_rows(self, rows):
+        """Make search_read rows JSON-ready: many2one as id"""
+        for row in rows:
+            for name, value in row.items():
+                if isinstance(value, tuple):
+                    row[name] = value[0]
+        return rows
+
+    def _serialize_jobs(self, jobs, keys):
+        """
+        Serialize jobs for get_my_jobs with one batched read of the fields
+        behind `keys` (see JOB_API_FIELDS), instead of walking each record.
+        """
+        field_names = sorted({JOB_API_FIELDS[key] for key in keys} - {'id'})
+        rows = jobs.read(field_names) if field_names else [{'id': job_id} for job_id in jobs.ids]
+        customer_names = {}
+        if 'customer_name' in keys:
+            customer_names = {partner.id: partner.name for partner in jobs.customer_id}
+
+        job_list = []
+        for row in rows:
+            job = {}
+            for key in keys:
+                value = row[JOB_API_FIELDS[key]]
+                if key == 'service_request_id':
+                    value = value[0] if value else False
+                elif key == 'service_request_name':
+                    value = value[1] if value else False
+                elif key == 'customer_name':
+                    value = customer_names.get(value[0], '') if value else ''
+                elif key == 'scheduled_time':
+                    value = value or None
+                elif key == 'parcel_count':
+                    value = len(value)
+                elif key == 'notes':
+                    value = value or ''
+                job[key] = value
+            job_list.append(job)
+        return job_list
+
+    def _jobs_after_cursor(self, cursor):
+        """Domain of the jobs after a (scheduled_time, id) cursor, in 'scheduled_time, id' order"""
+        scheduled_time, job_id = cursor[0], int(cursor[1])
+        if scheduled_time is None:
+            # Unscheduled jobs sort last
+            return [('scheduled_time', '=', False), ('id', '>', job_id)]
+        scheduled_time = datetime.fromisoformat(scheduled_time)
+        return [
+            '|', '|',
+            ('scheduled_time', '>', scheduled_time),
+            '&', ('scheduled_time', '=', scheduled_time), ('id', '>', job_id),
+            ('scheduled_time', '=', False),
+        ]
+
+    @http.route('/api/v1/routy/auth/token', type='json', auth='user', methods=['POST'], csrf=False)
+    def issue_token(self, **kwargs):
+        """Issue an API token for the driver's device, from a logged-in session"""
+        auth_ok, error_data, status_code = self._check_authentication()
+        if not auth_ok:
+            return error_data
+
+        try:
+            data = request.jsonrequest
+            device_name = data.get('device_name')
+
+            if not isinstance(device_name, str) or not device_name.strip():
+                return {'error': 'Missing required field: device_name'}
+
+            token_record, token = request.env['routy.api.token']._generate(device_name.strip())
+
+            return {
+                'success': True,
+                'token': token,
+                'token_id': token_record.id,
+                'expires_at': token_record.expires_at.isoformat(),
+            }
+
+        except Exception as e:
+            _logger.error('Error issuing API token: %s', str(e))
+            return {'error': str(e)}
+
+    @http.route('/api/v1/routy/auth/token/revoke', type='json', auth='routy_token', methods=['POST'], csrf=False)
+    def revoke_token(self, **kwargs):
+        """Revoke one of the user's API tokens, by default the one authenticating the call"""
+        auth_ok, error_data, status_code = self._check_authentication()
+        if not auth_ok:
+            return error_data
+
+        try:
+            data = request.jsonrequest
+            domain = [('user_id', '=', request.env.user.id)]
+            if data.get('token_id'):
+                domain.append(('id', '=', data['token_id']))
+            else:
+                authorization = request.httprequest.headers.get('Authorization', '')
+                if not authorization.startswith('Bearer '):
+                    return {'error': 'Missing required field: token_id'}
+                domain.append(('token_hash', '=', hash_token(authorization[7:].strip())))
+
+            token_record = request.env['routy.api.token'].sudo().search(domain, limit=1)
+            if not token_record:
+                return {'error': 'Token not found'}
+            token_record.action_revoke()
+
+            return {'success': True, 'token_id': token_record.id}
+
+        except Exception as e:
+            _logger.error('Error revoking API token: %s', str(e))
+            return {'error': str(e)}
+
+    @http.route('/api/v1/routy/jobs/my', type='http', auth='routy_token', methods=['GET'], csrf=False)
     def get_my_jobs(self, **kwargs):
-        """Get jobs assigned to the current driver"""
+        """
+        Get jobs assigned to the current driver.
+        Optional parameters: state, date_from / date_to (scheduled time,
+        ISO date or datetime, both inclusive), fields (comma-separated keys
+        to return) and limit / cursor for keyset paging. Without limit and
+        cursor every matching job is returned. Answers 304 when the ETag
+        sent in If-None-Match still matches the jobs.
+        """
         auth_ok, error_data, status_code = self._check_authentication()
         if not auth_ok:
             return self._json_response(error_data, status_code)
@@ -47,39 +348,168 @@ class RoutyMobileAPI(http.Controller):
             if state_filter:
                 domain.append(('state', '=', state_filter))
 
-            jobs = request.env['routy.job'].search(domain, order='scheduled_time asc')
-
-            job_list = []
-            for job in jobs:
-                job_list.append({
-                    'id': job.id,
-                    'name': job.name,
-                    'job_type': job.job_type,
-                    'state': job.state,
-                    'service_request_id': job.service_request_id.id,
-                    'service_request_name': job.service_request_id.name,
-                    'customer_name': job.customer_id.name if job.customer_id else '',
-                    'location_address': job.location_address,
-                    'location_lat': job.location_lat,
-                    'location_lng': job.location_lng,
-                    'contact_name': job.contact_name,
-                    'contact_phone': job.contact_phone,
-                    'scheduled_time': job.scheduled_time.isoformat() if job.scheduled_time else None,
-                    'parcel_count': job.parcel_count,
-                    'notes': job.notes or '',
-                })
-
-            return self._json_response({
+            try:
+                if kwargs.get('date_from'):
+                    domain.append(('scheduled_time', '>=', datetime.fromisoformat(kwargs['date_from'])))
+                if kwargs.get('date_to'):
+                    date_to = datetime.fromisoformat(kwargs['date_to'])
+                    if 'T' not in kwargs['date_to'] and ' ' not in kwargs['date_to']:
+                        date_to = date_to.replace(hour=23, minute=59, second=59)
+                    domain.append(('scheduled_time', '<=', date_to))
+
+                keys = list(JOB_API_FIELDS)
+                if kwargs.get('fields'):
+                    keys = [key.strip() for key in kwargs['fields'].split(',') if key.strip()]
+                    unknown = [key for key in keys if key not in JOB_API_FIELDS]
+                    if unknown:
+                        return self._json_response({'error': 'Unknown fields: %s' % ', '.join(unknown)}, 400)
+                    if 'id' not in keys:
+                        keys.insert(0, 'id')
+
+                paged = bool(kwargs.get('limit') or kwargs.get('cursor'))
+                limit = None
+                if paged:
+                    limit = min(int(kwargs.get('limit') or JOBS_PAGE_DEFAULT_LIMIT), JOBS_PAGE_MAX_LIMIT)
+                    if limit <= 0:
+                        raise ValueError('limit must be positive')
+                if kwargs.get('cursor'):
+                    domain += self._jobs_after_cursor(_decode_cursor(kwargs['cursor']))
+            except (ValueError, TypeError, IndexError) as e:
+                return self._json_response({'error': 'Invalid parameter: %s' % str(e)}, 400)
+
+            etag = self._result_set_etag('routy.job', domain, kwargs)
+            headers = self._etag_headers(etag)
+            if self._etag_matches(etag):
+                return self._not_modified(headers)
+
+            jobs = request.env['routy.job'].search(domain, order='scheduled_time asc, id asc', limit=limit)
+            job_list = self._serialize_jobs(jobs, keys)
+
+            data = {
                 'success': True,
                 'jobs': job_list,
                 'count': len(job_list)
-            })
+            }
+            if paged:
+                last = jobs[-1:]
+                data['next_cursor'] = _encode_cursor([
+                    last.scheduled_time or None, last.id
+                ]) if len(jobs) == limit else None
+            return self._json_response(data, headers=headers)
 
         except Exception as e:
             _logger.error('Error fetching jobs: %s', str(e))
             return self._json_response({'error': str(e)}, 500)
 
-    @http.route('/api/v1/routy/jobs/<int:job_id>/accept', type='http', auth='user', methods=['POST'], csrf=False)
+    @http.route('/api/v1/routy/sync', type='http', auth='routy_token', methods=['GET'], csrf=False)
+    def sync(self, **kwargs):
+        """
+        Delta sync of the driver's jobs, parcels and service requests.
+        Send back the `cursor` of the previous response to get only what changed
+        since, plus the ids of jobs taken away from the driver. Without a
+        cursor, or with one older than the tombstone retention, everything is
+        sent again and `reset` is true. Call again while `has_more` is true.
+        Records changed in the last SYNC_SETTLE_DELAY seconds may be sent
+        more than once.
+        """
+        auth_ok, error_data, status_code = self._check_authentication()
+        if not auth_ok:
+            return self._json_response(error_data, status_code)
+
+        try:
+            cursor = _decode_sync_cursor(kwargs['cursor']) if kwargs.get('cursor') else None
+        except (ValueError, TypeError, IndexError, KeyError):
+            return self._json_response({'error': 'Invalid cursor'}, 400)
+
+        try:
+            env = request.env
+            Tombstone = env['routy.sync.tombstone']
+            now = int(time.time())
+            reset = not cursor or cursor.get('ts', 0) < now - SYNC_TOMBSTONE_RETENTION_DAYS * 86400
+            if reset:
+                cursor = {'tombstone': Tombstone._get_last_id()}
+            new_cursor = {'ts': now, 'tombstone': cursor['tombstone']}
+            data = {'success': True, 'reset': reset, 'has_more': False}
+            settled = fields.Datetime.now() - timedelta(seconds=SYNC_SETTLE_DELAY)
+
+            for key, model, driver_field, field_names in SYNC_MODELS:
+                domain = [(driver_field, '=', env.user.id)]
+                position = cursor.get(key)
+                if position:
+                    write_date = datetime.fromisoformat(position[0])
+                    domain += [
+                        '|', ('write_date', '>', write_date),
+                        '&', ('write_date', '=', write_date), ('id', '>', position[1]),
+                    ]
+                rows = env[model].search_read(
+                    domain, field_names + ['write_date'], order='write_date asc, id asc', limit=SYNC_PAGE_SIZE
+                )
+                settled_rows = [row for row in rows if row['write_date'] <= settled]
+                if settled_rows:
+                    new_cursor[key] = [settled_rows[-1]['write_date'], settled_rows[-1]['id']]
+                elif position:
+                    new_cursor[key] = position
+                # A page ending with unsettled records would be sent again as is
+                data['has_more'] = data['has_more'] or (
+                    len(rows) == SYNC_PAGE_SIZE and len(settled_rows) == len(rows))
+                data[key] = self._serialize_rows(rows)
+
+            tombstones = Tombstone.sudo().search_read([
+                ('driver_id', '=', env.user.id),
+                ('id', '>', cursor['tombstone']),
+            ], ['res_model', 'res_id'], order='id')
+            if tombstones:
+                new_cursor['tombstone'] = tombstones[-1]['id']
+            removed_ids = {t['res_id'] for t in tombstones if t['res_model'] == 'routy.job'}
+            # A job given back to the driver since then is not removed
+            removed_ids -= set(env['routy.job'].search([
+                ('id', 'in', list(removed_ids)),
+                ('driver_id', '=', env.user.id),
+            ]).ids)
+            data['removed'] = {'jobs': sorted(removed_ids)}
+            data['cursor'] = _encode_cursor(new_cursor)
+
+            return self._json_response(data)
+
+        except Exception as e:
+            _logger.error('Error syncing driver data: %s', str(e))
+            return self._json_response({'error': str(e)}, 500)
+
+    @http.route('/api/v1/routy/day', type='http', auth='routy_token', methods=['GET'], csrf=False)
+    def get_day_bundle(self, **kwargs):
+        """
+        The driver's active route plan for a day (`date`, ISO, defaults to
+        today) with its ordered jobs, their parcels and contacts.
+        """
+        auth_ok, error_data, status_code = self._check_authentication()
+        if not auth_ok:
+            return self._json_response(error_data, status_code)
+
+        try:
+            day = date.fromisoformat(kwargs['date']) if kwargs.get('date') \
+                else fields.Date.context_today(request.env.user)
+        except ValueError:
+            return self._json_response({'error': 'Invalid date'}, 400)
+
+        try:
+            route_plan = request.env['routy.route_plan'].search([
+                ('driver_id', '=', request.env.user.id),
+                ('date', '=', day),
+                ('state', '=', 'active'),
+            ], limit=1)
+
+            if not route_plan:
+                return self._json_response({'error': 'No active route plan'}, 404)
+
+            bundle = route_plan._get_day_bundle()
+            bundle['success'] = True
+            return self._cacheable_json_response(bundle)
+
+        except Exception as e:
+            _logger.error('Error fetching day bundle: %s', str(e))
+            return self._json_response({'error': str(e)}, 500)
+
+    @http.route('/api/v1/routy/jobs/<int:job_id>/accept', type='http', auth='routy_token', methods=['POST'], csrf=False)
     def accept_job(self, job_id, **kwargs):
         """Accept a job"""
         auth_ok, error_data, status_code = self._check_authentication()
@@ -108,7 +538,7 @@ class RoutyMobileAPI(http.Controller):
             _logger.error('Error accepting job: %s', str(e))
             return self._json_response({'error': str(e)}, 500)
 
-    @http.route('/api/v1/routy/jobs/<int:job_id>/start', type='http', auth='user', methods=['POST'], csrf=False)
+    @http.route('/api/v1/routy/jobs/<int:job_id>/start', type='http', auth='routy_token', methods=['POST'], csrf=False)
     def start_job(self, job_id, **kwargs):
         """Start a job"""
         auth_ok, error_data, status_code = self._check_authentication()
@@ -131,14 +561,14 @@ class RoutyMobileAPI(http.Controller):
                 'message': 'Job started successfully',
                 'job_id': job.id,
                 'state': job.state,
-                'started_at': job.started_at.isoformat() if job.started_at else None
+                'started_at': job.started_at or None
             })
 
         except Exception as e:
             _logger.error('Error starting job: %s', str(e))
             return self._json_response({'error': str(e)}, 500)
 
-    @http.route('/api/v1/routy/jobs/<int:job_id>/complete', type='http', auth='user', methods=['POST'], csrf=False)
+    @http.route('/api/v1/routy/jobs/<int:job_id>/complete', type='http', auth='routy_token', methods=['POST'], csrf=False)
     def complete_job(self, job_id, **kwargs):
         """Complete a job"""
         auth_ok, error_data, status_code = self._check_authentication()
@@ -167,7 +597,73 @@ class RoutyMobileAPI(http.Controller):
             _logger.error('Error completing job: %s', str(e))
             return self._json_response({'error': str(e)}, 500)
 
-    @http.route('/api/v1/routy/gps/update', type='json', auth='user', methods=['POST'], csrf=False)
+    @http.route('/api/v1/routy/jobs/bulk', type='json', auth='routy_token', methods=['POST'], csrf=False)
+    def bulk_job_actions(self, **kwargs):
+        """Apply a list of accept/start/complete/fail actions to the driver's jobs"""
+        auth_ok, error_data, status_code = self._check_authentication()
+        if not auth_ok:
+            return error_data
+
+        try:
+            data = request.jsonrequest
+            items = data.get('items')
+
+            if not isinstance(items, list) or not items:
+                return {'error': 'Missing required field: items'}
+
+            if len(items) > JOBS_BULK_MAX_ITEMS:
+                return {'error': f'Too many items (maximum {JOBS_BULK_MAX_ITEMS} per call)'}
+
+            results = request.env['routy.job'].apply_bulk_actions(
+                items, driver_id=request.env.user.id
+            )
+            succeeded = sum(1 for result in results if result['success'])
+
+            return {
+                'success': True,
+                'succeeded': succeeded,
+                'failed': len(results) - succeeded,
+                'results': results,
+            }
+
+        except Exception as e:
+            _logger.error('Error applying bulk job actions: %s', str(e))
+            return {'error': str(e)}
+
+    @http.route('/api/v1/routy/replay', type='json', auth='routy_token', methods=['POST'], csrf=False)
+    def replay_journal(self, **kwargs):
+        """Apply the actions a driver app journaled while offline, once per idempotency key"""
+        auth_ok, error_data, status_code = self._check_authentication()
+        if not auth_ok:
+            return error_data
+
+        try:
+            data = request.jsonrequest
+            entries = data.get('entries')
+
+            if not isinstance(entries, list) or not entries:
+                return {'error': 'Missing required field: entries'}
+
+            if len(entries) > REPLAY_MAX_ENTRIES:
+                return {'error': f'Too many entries (maximum {REPLAY_MAX_ENTRIES} per replay)'}
+
+            results = request.env['routy.idempotency.key'].replay(
+                entries, driver_id=request.env.user.id
+            )
+            succeeded = sum(1 for result in results if result['success'])
+
+            return {
+                'success': True,
+                'succeeded': succeeded,
+                'failed': len(results) - succeeded,
+                'results': results,
+            }
+
+        except Exception as e:
+            _logger.error('Error replaying journal: %s', str(e))
+            return {'error': str(e)}
+
+    @http.route('/api/v1/routy/gps/update', type='json', auth='routy_token', methods=['POST'], csrf=False)
     def update_gps(self, **kwargs):
         """Update GPS location for current job"""
         auth_ok, error_data, status_code = self._check_authentication()
@@ -182,40 +678,104 @@ class RoutyMobileAPI(http.Controller):
                 if field not in data:
                     return {'error': f'Missing required field: {field}'}
 
-            job_id = data.get('job_id')
-            job = request.env['routy.job'].browse(job_id)
+            result = request.env['routy.gps.log'].ingest_points(
+                [data], driver_id=request.env.user.id
+            )[0]
 
-            if not job.exists():
-                return {'error': 'Job not found'}
-
-            if job.driver_id.id != request.env.user.id:
-                return {'error': 'Not authorized'}
-
-            # Create GPS log
-            gps_log = request.env['routy.gps.log'].create({
-                'job_id': job_id,
-                'driver_id': request.env.user.id,
-                'latitude': data.get('latitude'),
-                'longitude': data.get('longitude'),
-                'accuracy': data.get('accuracy', 0),
-                'speed': data.get('speed', 0),
-                'heading': data.get('heading', 0),
-                'altitude': data.get('altitude', 0),
-                'battery_level': data.get('battery_level', 0),
-                'network_type': data.get('network_type', ''),
-            })
+            if result['status'] == 'rejected':
+                return {'error': result['reason']}
 
             return {
                 'success': True,
                 'message': 'GPS location updated',
-                'log_id': gps_log.id
+                'log_id': result.get('log_id', False),
+                'duplicate': result.get('duplicate', False),
             }
 
         except Exception as e:
             _logger.error('Error updating GPS: %s', str(e))
             return {'error': str(e)}
 
-    @http.route('/api/v1/routy/parcels/<int:parcel_id>/deliver', type='json', auth='user', methods=['POST'], csrf=False)
+    @http.route('/api/v1/routy/gps/batch', type='json', auth='routy_token', methods=['POST'], csrf=False)
+    def update_gps_batch(self, **kwargs):
+        """Store a buffer of GPS fixes, possibly spanning several jobs"""
+        auth_ok, error_data, status_code = self._check_authentication()
+        if not auth_ok:
+            return error_data
+
+        try:
+            data = request.jsonrequest
+            points = data.get('points')
+
+            if not isinstance(points, list) or not points:
+                return {'error': 'Missing required field: points'}
+
+            if len(points) > GPS_BATCH_MAX_POINTS:
+                return {'error': f'Too many points (maximum {GPS_BATCH_MAX_POINTS} per batch)'}
+
+            results = request.env['routy.gps.log'].ingest_points(
+                points, driver_id=request.env.user.id
+            )
+            accepted = sum(1 for result in results if result['status'] == 'accepted')
+
+            return {
+                'success': True,
+                'accepted': accepted,
+                'rejected': len(results) - accepted,
+                'results': results,
+            }
+
+        except Exception as e:
+            _logger.error('Error updating GPS batch: %s', str(e))
+            return {'error': str(e)}
+
+    @http.route('/api/v1/routy/gps/binary', type='http', auth='routy_token', methods=['POST'], csrf=False)
+    def update_gps_binary(self, **kwargs):
+        """Store GPS fixes sent in the compact binary frame format"""
+        auth_ok, error_data, status_code = self._check_authentication()
+        if not auth_ok:
+            return self._json_response(error_data, status_code)
+
+        if request.httprequest.mimetype != GPS_BINARY_CONTENT_TYPE:
+            return self._json_response(
+                {'error': f'Content type must be {GPS_BINARY_CONTENT_TYPE}'}, 415
+            )
+
+        content_length = request.httprequest.content_length
+        if not content_length:
+            return self._json_response({'error': 'Content-Length required'}, 411)
+        if content_length > GPS_BINARY_MAX_BYTES:
+            return self._json_response({'error': 'Payload too large'}, 413)
+
+        try:
+            # Never more than the limit is read, whatever the body really holds
+            payload = request.httprequest.stream.read(GPS_BINARY_MAX_BYTES + 1)
+            if len(payload) > GPS_BINARY_MAX_BYTES:
+                return self._json_response({'error': 'Payload too large'}, 413)
+            points = gps_codec.decode_frames(payload, max_points=GPS_BATCH_MAX_POINTS)
+        except gps_codec.FrameError as e:
+            return self._json_response({'error': str(e)}, 400)
+
+        try:
+            results = request.env['routy.gps.log'].ingest_points(
+                points, driver_id=request.env.user.id
+            )
+            rejected = [
+                {'index': result['index'], 'reason': result['reason']}
+                for result in results if result['status'] == 'rejected'
+            ]
+
+            return self._json_response({
+                'success': True,
+                'accepted': len(results) - len(rejected),
+                'rejected': rejected,
+            })
+
+        except Exception as e:
+            _logger.error('Error updating GPS from binary frames: %s', str(e))
+            return self._json_response({'error': str(e)}, 500)
+
+    @http.route('/api/v1/routy/parcels/<int:parcel_id>/deliver', type='json', auth='routy_token', methods=['POST'], csrf=False)
     def deliver_parcel(self, parcel_id, **kwargs):
         """Mark parcel as delivered with POD"""
         auth_ok, error_data, status_code = self._check_authentication()
@@ -234,22 +794,7 @@ class RoutyMobileAPI(http.Controller):
                 return {'error': 'Not authorized'}
 
             # Update parcel with POD
-            update_vals = {
-                'state': 'delivered',
-                'delivered_at': request.env['ir.fields'].Datetime.now(),
-                'recipient_name': data.get('recipient_name', ''),
-                'pod_notes': data.get('notes', ''),
-            }
-
-            # Handle signature (base64)
-            if data.get('signature'):
-                update_vals['pod_signature'] = base64.b64decode(data['signature'])
-
-            # Handle photo (base64)
-            if data.get('photo'):
-                update_vals['pod_photo'] = base64.b64decode(data['photo'])
-
-            parcel.write(update_vals)
+            parcel._deliver_with_pod(data)
 
             return {
                 'success': True,
@@ -262,14 +807,90 @@ class RoutyMobileAPI(http.Controller):
             _logger.error('Error delivering parcel: %s', str(e))
             return {'error': str(e)}
 
-    @http.route('/api/v1/routy/parcels/<int:parcel_id>', type='http', auth='user', methods=['GET'], csrf=False)
+    @http.route('/api/v1/routy/parcels/<int:parcel_id>/pod/<string:kind>', type='http', auth='routy_token', methods=['POST'], csrf=False,
+                routy_max_body=POD_UPLOAD_MAX_BYTES)
+    def upload_pod(self, parcel_id, kind, **kwargs):
+        """
+        Upload the POD photo or signature of a parcel, either as the raw
+        request body (image content type) or as the `file` part of a
+        multipart form. The image is streamed to the attachment store.
+        The body size is checked before the dispatcher parses a form (see
+        the routy_max_body routing option), and the image type from the
+        content itself, not only from its declared type.
+        """
+        auth_ok, error_data, status_code = self._check_authentication()
+        if not auth_ok:
+            return self._json_response(error_data, status_code)
+
+        if kind not in POD_UPLOAD_FIELDS:
+            return self._json_response({'error': 'Unknown POD kind'}, 404)
+
+        # Checked before anything reads the body
+        content_length = request.httprequest.content_length
+        if not content_length:
+            return self._json_response({'error': 'Content-Length required'}, 411)
+        if content_length > POD_UPLOAD_MAX_BYTES:
+            return self._json_response({'error': 'Payload too large'}, 413)
+
+        try:
+            parcel = request.env['routy.parcel'].browse(parcel_id)
+
+            if not parcel.exists():
+                return self._json_response({'error': 'Parcel not found'}, 404)
+
+            if parcel.assigned_driver_id.id != request.env.user.id:
+                return self._json_response({'error': 'Not authorized'}, 403)
+
+            if request.httprequest.mimetype == 'multipart/form-data':
+                upload = request.httprequest.files.get('file')
+                if not upload:
+                    return self._json_response({'error': 'Missing required field: file'}, 400)
+                stream, mimetype = upload.stream, upload.mimetype
+            else:
+                stream, mimetype = request.httprequest.stream, request.httprequest.mimetype
+
+            if mimetype not in POD_UPLOAD_MIMETYPES:
+                return self._json_response(
+                    {'error': 'Content type must be one of %s' % ', '.join(POD_UPLOAD_MIMETYPES)}, 415
+                )
+            head = stream.read(POD_UPLOAD_SIGNATURE_LENGTH)
+            if not _matches_signature(head, mimetype):
+                return self._json_response({'error': 'Content is not a %s image' % mimetype}, 415)
+            stream = _PrefixedStream(head, stream)
+
+            try:
+                attachment = parcel._attach_pod_stream(
+                    POD_UPLOAD_FIELDS[kind], stream, mimetype, POD_UPLOAD_MAX_BYTES
+                )
+            except ValueError:
+                return self._json_response({'error': 'Payload too large'}, 413)
+
+            return self._json_response({
+                'success': True,
+                'parcel_id': parcel.id,
+                'field': POD_UPLOAD_FIELDS[kind],
+                'attachment_id': attachment.id,
+                'checksum': attachment.checksum,
+                'file_size': attachment.file_size,
+            })
+
+        except Exception as e:
+            _logger.error('Error uploading POD: %s', str(e))
+            return self._json_response({'error': str(e)}, 500)
+
+    @http.route('/api/v1/routy/parcels/<int:parcel_id>', type='http', auth='routy_token', methods=['GET'], csrf=False)
     def get_parcel_details(self, parcel_id, **kwargs):
-        """Get parcel details"""
+        """Get parcel details, or 304 when the ETag in If-None-Match still matches"""
         auth_ok, error_data, status_code = self._check_authentication()
         if not auth_ok:
             return self._json_response(error_data, status_code)
 
         try:
+            etag = self._result_set_etag('routy.parcel', [('id', '=', parcel_id)], kwargs)
+            headers = self._etag_headers(etag)
+            if self._etag_matches(etag):
+                return self._not_modified(headers)
+
             parcel = request.env['routy.parcel'].browse(parcel_id)
 
             if not parcel.exists():
@@ -287,7 +908,7 @@ class RoutyMobileAPI(http.Controller):
                     'service_request': parcel.service_request_id.name,
                     'customer': parcel.customer_id.name if parcel.customer_id else '',
                 }
-            })
+            }, headers=headers)
 
         except Exception as e:
             _logger.error('Error fetching parcel: %s', str(e))
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import threading
+import time
+
+from odoo import http
+from odoo.http import request, Response
+from odoo.tools.lru import LRU
+
+# Seconds a driver's position snapshot is served from memory
+TRACKING_SNAPSHOT_TTL = 15
+
+# Driver position snapshots a worker keeps in memory
+TRACKING_SNAPSHOT_CACHE_SIZE = 4096
+
+# {(dbname, driver_id): (expires_at, position or None)}
+_snapshot_cache = LRU(TRACKING_SNAPSHOT_CACHE_SIZE)
+_snapshot_lock = threading.Lock()
+
+
+class RoutyTracking(http.Controller):
+    """Public, signed tracking links for customers"""
+
+    def _get_driver_snapshot(self, driver_id):
+        """
+        Last known position of a driver, read at most once per
+        TRACKING_SNAPSHOT_TTL seconds per worker however many customers
+        are refreshing the same delivery.
+        """
+        key = (request.db, driver_id)
+        cached = _snapshot_cache.get(key)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+        with _snapshot_lock:
+            cached = _snapshot_cache.get(key)
+            if cached and cached[0] > time.monotonic():
+                return cached[1]
+            positions = request.env['routy.driver.position'].sudo().get_positions([driver_id])
+            snapshot = positions[0] if positions else None
+            _snapshot_cache[key] = (time.monotonic() + TRACKING_SNAPSHOT_TTL, snapshot)
+            return snapshot
+
+    def _get_tracking(self, request_id, expires, token):
+        """Return (service_request, tracking data, etag), or None for an invalid link"""
+        service_request = request.env['routy.service_request'].sudo().browse(request_id).exists()
+        if not service_request or not service_request._check_tracking_token(expires, token):
+            return None
+        # The position is only read while a delivery is on the way, for its driver
+        driver = service_request._get_tracking_job().driver_id
+        position = self._get_driver_snapshot(driver.id) if driver else None
+        data = service_request._get_tracking_data(position)
+        etag = '"%s"' % hashlib.sha1(json.dumps(data, sort_keys=True).encode()).hexdigest()
+        return service_request, data, etag
+
+    def _not_modified(self, etag):
+        """Return a 304 response when the client already has this version"""
+        if etag in request.httprequest.headers.get('If-None-Match', ''):
+            return Response(status=304, headers=[('ETag', etag), ('Cache-Control', 'no-cache')])
+        return None
+
+    @http.route('/routy/track/<int:request_id>/<int:expires>/<string:token>',
+                type='http', auth='public', methods=['GET'], csrf=False)
+    def tracking_page(self, request_id, expires, token, **kwargs):
+        """Tracking page shown to the customer"""
+        tracking = self._get_tracking(request_id, expires, token)
+        if not tracking:
+            return request.not_found()
+        service_request, data, etag = tracking
+        response = self._not_modified(etag)
+        if response:
+            return response
+        response = request.render('routy.tracking_page', {
+            'service_request': service_request,
+            'tracking': data,
+        })
+        response.headers['ETag'] = etag
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    @http.route('/routy/track/<int:request_id>/<int:expires>/<string:token>/json',
+                type='http', auth='public', methods=['GET'], csrf=False)
+    def tracking_json(self, request_id, expires, token, **kwargs):
+        """Tracking status as JSON, for polling clients"""
+        tracking = self._get_tracking(request_id, expires, token)
+        if not tracking:
+            return Response(json.dumps({'error': 'Invalid or expired link'}), status=404,
+                            mimetype='application/json')
+        service_request, data, etag = tracking
+        response = self._not_modified(etag)
+        if response:
+            return response
+        return Response(
+            json.dumps(data),
+            mimetype='application/json',
+            headers=[('ETag', etag), ('Cache-Control', 'no-cache')],
+        )
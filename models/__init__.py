@@ -8,6 +8,17 @@ from . import linehaul
 from . import route_plan
 from . import payment_record
 from . import gps_log
+from . import driver_position
+from . import gps_spool
+from . import gps_stop
+from . import geofence
+from . import ir_websocket
+from . import ir_attachment
+from . import ir_http
+from . import api_token
+from . import res_users
+from . import sync_tombstone
+from . import idempotency_key
 from . import partner_contract
 from . import incident
 from . import dashboard
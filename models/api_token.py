@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import secrets
+from datetime import timedelta
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+
+from ..tools.signaled_cache import SignaledCache
+
+# Days a new device token stays valid
+API_TOKEN_VALIDITY_DAYS = 90
+
+# Characters of the token kept in clear to tell tokens apart in the backend
+API_TOKEN_PREFIX_LENGTH = 8
+
+# Token lookups a worker keeps cached
+API_TOKEN_CACHE_SIZE = 1024
+
+# {token_hash: (user_id, expires_at) or None}, apart from the registry caches
+# so that issuing or revoking a token does not clear those
+_token_cache = SignaledCache('routy_api_token_signaling', API_TOKEN_CACHE_SIZE)
+
+
+def invalidate_tokens(cr):
+    """Drop the cached token lookups, in every worker"""
+    _token_cache.signal(cr)
+
+
+def hash_token(token):
+    """SHA-256 of a token; tokens are random, so a fast hash is enough"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class ApiToken(models.Model):
+    _name = 'routy.api.token'
+    _description = 'Driver App API Token'
+    _order = 'create_date desc'
+
+    name = fields.Char(
+        string='Device',
+        required=True,
+        help='Name of the device the token was issued to'
+    )
+    user_id = fields.Many2one(
+        'res.users',
+        string='User',
+        required=True,
+        ondelete='cascade',
+        index=True
+    )
+    token_hash = fields.Char(
+        string='Token Hash',
+        required=True,
+        readonly=True,
+        copy=False,
+        groups='base.group_system'
+    )
+    token_prefix = fields.Char(
+        string='Token',
+        readonly=True,
+        copy=False,
+        help='First characters of the token'
+    )
+    expires_at = fields.Datetime(
+        string='Expires At',
+        required=True,
+        readonly=True
+    )
+    active = fields.Boolean(
+        string='Active',
+        default=True,
+        help='Revoked tokens are archived'
+    )
+
+    _sql_constraints = [
+        ('token_hash_unique', 'UNIQUE(token_hash)', 'API token hashes must be unique!')
+    ]
+
+    def init(self):
+        """Create the sequence signaling token changes to the other workers"""
+        _token_cache.setup(self.env.cr)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        """Override create to clear the token cache"""
+        tokens = super(ApiToken, self).create(vals_list)
+        invalidate_tokens(self.env.cr)
+        return tokens
+
+    def write(self, vals):
+        """Override write to clear the token cache"""
+        result = super(ApiToken, self).write(vals)
+        invalidate_tokens(self.env.cr)
+        return result
+
+    def unlink(self):
+        """Override unlink to clear the token cache"""
+        result = super(ApiToken, self).unlink()
+        invalidate_tokens(self.env.cr)
+        return result
+
+    @api.model
+    def _generate(self, name, user=None, days=API_TOKEN_VALIDITY_DAYS):
+        """Issue a token for a device of `user`; returns (record, token). Only the hash is stored."""
+        user = user or self.env.user
+        token = secrets.token_urlsafe(32)
+        record = self.sudo().create({
+            'name': name,
+            'user_id': user.id,
+            'token_hash': hash_token(token),
+            'token_prefix': token[:API_TOKEN_PREFIX_LENGTH],
+            'expires_at': fields.Datetime.now() + timedelta(days=days),
+        })
+        return record, token
+
+    @api.model
+    def _lookup(self, token_hash):
+        """(user_id, expires_at) of an active token of an active user, None if unknown"""
+        cr = self.env.cr
+        _token_cache.check(cr)
+        found = _token_cache.get(cr.dbname, token_hash, False)
+        if found is False:
+            found = self._lookup_uncached(token_hash)
+            _token_cache.set(cr.dbname, token_hash, found)
+        return found
+
+    @api.model
+    def _lookup_uncached(self, token_hash):
+        self.env.cr.execute(f"""
+            SELECT token.user_id, token.expires_at
+            FROM "{self._table}" token
+            JOIN res_users users ON users.id = token.user_id
+            WHERE token.token_hash = %s AND token.active AND users.active
+        """, (token_hash,))
+        row = self.env.cr.fetchone()
+        return tuple(row) if row else None
+
+    @api.model
+    def _resolve(self, token):
+        """Id of the user a token authenticates, None when it is unknown, revoked or expired"""
+        found = self._lookup(hash_token(token))
+        if not found or found[1] <= fields.Datetime.now():
+            return None
+        return found[0]
+
+    def action_revoke(self):
+        """Revoke the tokens"""
+        if self.filtered(lambda t: not t.active):
+            raise UserError(_('Only active tokens can be revoked.'))
+        self.write({'active': False})
+        return True
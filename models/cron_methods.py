@@ -12,22 +12,34 @@ class GPSLog(models.Model):
 
     @api.model
     def _cron_clean_old_logs(self):
-        """Clean GPS logs older than 90 days"""
+        """Drop GPS log partitions older than 90 days"""
         try:
             days_to_keep = 90
-            cutoff_date = fields.Datetime.now() - timedelta(days=days_to_keep)
-
-            old_logs = self.search([
-                ('timestamp', '<', cutoff_date)
-            ])
-
-            count = len(old_logs)
-            old_logs.unlink()
-
-            _logger.info(f'Cleaned {count} GPS logs older than {days_to_keep} days')
+            cutoff_date = fields.Date.today() - timedelta(days=days_to_keep)
+
+            if self._is_partitioned():
+                dropped = self._drop_expired_partitions(cutoff_date)
+                _logger.info(f'Dropped {len(dropped)} GPS log partitions older than {days_to_keep} days')
+            else:
+                self.env.cr.execute(
+                    f'DELETE FROM "{self._table}" WHERE date < %s', (cutoff_date,)
+                )
+                self.invalidate_model()
+                _logger.info(f'Cleaned {self.env.cr.rowcount} GPS logs older than {days_to_keep} days')
         except Exception as e:
             _logger.error(f'Error cleaning old GPS logs: {str(e)}')
 
+    @api.model
+    def _cron_create_partitions(self):
+        """Create the GPS log partitions for the coming months"""
+        try:
+            if not self._is_partitioned():
+                return
+            created = self._create_partitions(fields.Date.today())
+            _logger.info(f'Created {len(created)} GPS log partitions')
+        except Exception as e:
+            _logger.error(f'Error creating GPS log partitions: {str(e)}')
+
 
 class ServiceRequest(models.Model):
     _inherit = 'routy.service_request'
@@ -135,6 +147,25 @@ class Job(models.Model):
             _logger.error(f'Error sending driver reminders: {str(e)}')
 
 
+    @api.model
+    def _cron_backfill_odometer(self, batch_size=200):
+        """Measure the odometer of completed jobs that predate it, one chunk per run"""
+        try:
+            domain = [
+                ('state', '=', 'completed'),
+                ('odometer_updated_at', '=', False),
+            ]
+            jobs = self.search(domain, limit=batch_size, order='id')
+            jobs._update_odometer()
+            remaining = self.search_count(domain)
+
+            # Re-triggers the cron right away while jobs remain
+            self.env['ir.cron']._notify_progress(done=len(jobs), remaining=remaining)
+            _logger.info(f'Odometer backfilled for {len(jobs)} jobs, {remaining} remaining')
+        except Exception as e:
+            _logger.error(f'Error backfilling job odometer: {str(e)}')
+
+
 class Incident(models.Model):
     _inherit = 'routy.incident'
 
@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+
+import logging
+from datetime import timedelta
+
+from odoo import models, fields, api, tools
+
+from ..tools import geo
+
+_logger = logging.getLogger(__name__)
+
+# Positions older than this are not considered when looking for nearby drivers
+NEARBY_DRIVER_MAX_AGE_MINUTES = 15
+
+# Bus channel (per company) and notification type of the live fleet feed
+FLEET_CHANNEL = 'routy_fleet'
+FLEET_NOTIFICATION = 'routy_fleet/positions'
+
+# System parameter: minimum seconds between two pushes of a driver's position
+FLEET_PUSH_INTERVAL_PARAM = 'routy.fleet_push_interval'
+FLEET_PUSH_DEFAULT_INTERVAL = 5
+
+# Positions older than this are left out of the fleet map snapshot
+FLEET_SNAPSHOT_MAX_AGE_HOURS = 12
+
+
+class DriverPosition(models.Model):
+    _name = 'routy.driver.position'
+    _description = 'Driver Last Known Position'
+    _order = 'timestamp desc'
+    _rec_name = 'driver_id'
+
+    driver_id = fields.Many2one(
+        'res.users',
+        string='Driver',
+        required=True,
+        ondelete='cascade',
+        index=True
+    )
+    job_id = fields.Many2one(
+        'routy.job',
+        string='Job',
+        ondelete='set null',
+        help='Job the last fix was reported for'
+    )
+
+    # Location
+    latitude = fields.Float(
+        string='Latitude',
+        required=True,
+        digits=(10, 7)
+    )
+    longitude = fields.Float(
+        string='Longitude',
+        required=True,
+        digits=(10, 7)
+    )
+    geohash = fields.Char(
+        string='Geohash',
+        help='Geohash cell of the position, used for spatial lookups'
+    )
+    accuracy = fields.Float(
+        string='Accuracy (m)',
+        help='GPS accuracy in meters'
+    )
+    speed = fields.Float(
+        string='Speed (km/h)',
+        help='Speed in kilometers per hour'
+    )
+    heading = fields.Float(
+        string='Heading (degrees)',
+        help='Direction in degrees (0-360)'
+    )
+    timestamp = fields.Datetime(
+        string='Timestamp',
+        required=True,
+        help='Time of the newest fix received for this driver'
+    )
+
+    # Company
+    company_id = fields.Many2one(
+        'res.company',
+        string='Company'
+    )
+    published_at = fields.Datetime(
+        string='Published At',
+        readonly=True,
+        help='When the position was last pushed to the live fleet feed'
+    )
+    published_timestamp = fields.Datetime(
+        string='Published Fix Time',
+        readonly=True,
+        help='Timestamp of the fix last pushed to the live fleet feed'
+    )
+
+    _sql_constraints = [
+        ('driver_unique',
+         'UNIQUE(driver_id)',
+         'A driver can only have one current position!')
+    ]
+
+    def init(self):
+        """Index geohash prefixes and seed positions from the GPS history"""
+        tools.create_index(
+            self.env.cr, 'routy_driver_position_geohash_prefix_index',
+            self._table, ['geohash varchar_pattern_ops']
+        )
+        self.env.cr.execute(f'SELECT 1 FROM "{self._table}" LIMIT 1')
+        if self.env.cr.fetchone():
+            return
+        self.env.cr.execute(f"""
+            INSERT INTO "{self._table}" (
+                driver_id, job_id, latitude, longitude, geohash, accuracy, speed, heading,
+                timestamp, company_id, create_uid, create_date, write_uid, write_date
+            )
+            SELECT DISTINCT ON (driver_id)
+                driver_id, job_id, latitude, longitude, geohash, accuracy, speed, heading,
+                timestamp, company_id, %s, now() at time zone 'UTC', %s, now() at time zone 'UTC'
+            FROM routy_gps_log
+            ORDER BY driver_id, timestamp DESC
+        """, (self.env.uid, self.env.uid))
+        # Older GPS logs have no geohash
+        self.env.cr.execute(f'SELECT id, latitude, longitude FROM "{self._table}" WHERE geohash IS NULL')
+        for position_id, latitude, longitude in self.env.cr.fetchall():
+            self.env.cr.execute(
+                f'UPDATE "{self._table}" SET geohash = %s WHERE id = %s',
+                (geo.geohash_encode(latitude, longitude), position_id)
+            )
+
+    @api.model
+    def _upsert_positions(self, fixes):
+        """
+        Record the newest fix of each driver. `fixes` is a list of dicts with
+        the keys driver_id, job_id, latitude, longitude, accuracy, speed,
+        heading, timestamp and company_id. A stored position is only replaced
+        by a strictly newer fix, so late uploads never move a driver back;
+        only the drivers whose position moved are published.
+        """
+        latest = {}
+        for fix in fixes:
+            current = latest.get(fix['driver_id'])
+            if not current or fix['timestamp'] > current['timestamp']:
+                latest[fix['driver_id']] = fix
+        if not latest:
+            return
+
+        now = fields.Datetime.now()
+        rows = [(
+            fix['driver_id'], fix['job_id'] or None, fix['latitude'], fix['longitude'],
+            geo.geohash_encode(fix['latitude'], fix['longitude']), fix['accuracy'] or 0.0, fix['speed'] or 0.0, fix['heading'] or 0.0,
+            fix['timestamp'], fix['company_id'] or None,
+            self.env.uid, now, self.env.uid, now,
+        ) for fix in latest.values()]
+        self.env.cr.execute(f"""
+            INSERT INTO "{self._table}" (
+                driver_id, job_id, latitude, longitude, geohash, accuracy, speed, heading,
+                timestamp, company_id, create_uid, create_date, write_uid, write_date
+            )
+            VALUES {', '.join(['%s'] * len(rows))}
+            ON CONFLICT (driver_id) DO UPDATE SET
+                job_id = EXCLUDED.job_id,
+                latitude = EXCLUDED.latitude,
+                longitude = EXCLUDED.longitude,
+                geohash = EXCLUDED.geohash,
+                accuracy = EXCLUDED.accuracy,
+                speed = EXCLUDED.speed,
+                heading = EXCLUDED.heading,
+                timestamp = EXCLUDED.timestamp,
+                company_id = EXCLUDED.company_id,
+                write_uid = EXCLUDED.write_uid,
+                write_date = EXCLUDED.write_date
+            WHERE "{self._table}".timestamp < EXCLUDED.timestamp
+            RETURNING driver_id
+        """, rows)
+        moved = [driver_id for driver_id, in self.env.cr.fetchall()]
+        self.invalidate_model()
+        # Late fixes leave the position as it was: nothing new to push
+        self._publish_positions(moved)
+
+    @api.model
+    def _publish_positions(self, driver_ids):
+        """
+        Push the current position of the given drivers on the fleet bus
+        channel of their company. A driver is pushed at most once per push
+        interval: the UPDATE claims the slot, so concurrent workers never
+        publish the same driver twice. One message is sent per company,
+        whatever the number of dispatchers watching. The fixes of throttled
+        drivers are pushed by _cron_publish_pending once the interval is over.
+        """
+        if not driver_ids:
+            return
+        interval = int(self.env['ir.config_parameter'].sudo().get_param(
+            FLEET_PUSH_INTERVAL_PARAM, FLEET_PUSH_DEFAULT_INTERVAL))
+        now = fields.Datetime.now()
+        self.env.cr.execute(f"""
+            UPDATE "{self._table}"
+            SET published_at = %s, published_timestamp = timestamp
+            WHERE driver_id IN %s
+              AND (published_at IS NULL OR published_at <= %s)
+            RETURNING id
+        """, (now, tuple(driver_ids), now - timedelta(seconds=interval)))
+        ids = [row[0] for row in self.env.cr.fetchall()]
+        if len(ids) < len(set(driver_ids)):
+            self._schedule_pending_publish(interval)
+        if not ids:
+            return
+        self.invalidate_model(['published_at', 'published_timestamp'])
+
+        positions = self.sudo().browse(ids)
+        for company in positions.company_id:
+            self.env['bus.bus']._sendone(
+                (company, FLEET_CHANNEL), FLEET_NOTIFICATION,
+                {'positions': positions.filtered(lambda p: p.company_id == company)._fleet_payload()},
+            )
+
+    @api.model
+    def _schedule_pending_publish(self, interval):
+        """
+        Trigger the publish cron at the end of the current push interval, so
+        the last fix of a throttled driver still reaches the fleet map.
+        Trigger times are aligned on the interval: a burst adds only one.
+        """
+        cron = self.env.ref('routy.cron_publish_fleet_positions', raise_if_not_found=False)
+        if not cron:
+            return
+        interval = max(interval, 1)
+        now = fields.Datetime.now()
+        call_at = now + timedelta(seconds=interval - (now.minute * 60 + now.second) % interval)
+        if not self.env['ir.cron.trigger'].sudo().search_count([
+            ('cron_id', '=', cron.id), ('call_at', '=', call_at),
+        ], limit=1):
+            cron.sudo()._trigger(call_at)
+
+    @api.model
+    def _cron_publish_pending(self):
+        """Push the positions received since the last push of their driver"""
+        try:
+            self.env.cr.execute(f"""
+                SELECT driver_id FROM "{self._table}"
+                WHERE timestamp > published_timestamp
+            """)
+            self._publish_positions([row[0] for row in self.env.cr.fetchall()])
+        except Exception as e:
+            _logger.error(f'Error publishing pending fleet positions: {str(e)}')
+
+    def _fleet_payload(self):
+        """Serialize positions for the live fleet map"""
+        return [{
+            'driver_id': position.driver_id.id,
+            'driver_name': position.driver_id.name,
+            'job_id': position.job_id.id,
+            'job_name': position.job_id.name or False,
+            'lat': position.latitude,
+            'lng': position.longitude,
+            'speed': position.speed,
+            'heading': position.heading,
+            'timestamp': position.timestamp.isoformat(),
+        } for position in self.sudo()]
+
+    @api.model
+    def get_fleet_positions(self):
+        """Recent positions of the current companies' drivers, to seed the fleet map"""
+        return self.search([
+            ('company_id', 'in', self.env.companies.ids),
+            ('timestamp', '>=', fields.Datetime.now() - timedelta(hours=FLEET_SNAPSHOT_MAX_AGE_HOURS)),
+        ])._fleet_payload()
+
+    @api.model
+    def get_positions(self, driver_ids):
+        """
+        Get the last known position of several drivers in one read.
+        Returns a list of dicts, one per driver having a known position.
+        """
+        positions = self.search_read(
+            [('driver_id', 'in', list(driver_ids))],
+            ['driver_id', 'job_id', 'latitude', 'longitude', 'speed', 'accuracy', 'heading', 'timestamp'],
+        )
+        return [{
+            'driver_id': position['driver_id'][0],
+            'job_id': position['job_id'][0] if position['job_id'] else False,
+            'lat': position['latitude'],
+            'lng': position['longitude'],
+            'timestamp': position['timestamp'].isoformat(),
+            'speed': position['speed'],
+            'accuracy': position['accuracy'],
+            'heading': position['heading'],
+        } for position in positions]
+
+    @api.model
+    def nearest_drivers(self, lat, lng, radius=5.0, limit=10, only_available=True):
+        """
+        Find the drivers closest to a point.
+        Only the geohash cell containing the point and its 8 neighbors are
+        read, using a prefix index, so the cost depends on the drivers around
+        the point rather than on the fleet size.
+        `radius` is in kilometers. Returns up to `limit` dicts sorted by distance.
+        """
+        radius_m = radius * 1000.0
+        precision = geo.geohash_precision_for_radius(radius_m, lat)
+        center = geo.geohash_encode(lat, lng, precision)
+        cells = [center] + geo.geohash_neighbors(center)
+
+        domain = ['|'] * (len(cells) - 1) + [('geohash', '=like', cell + '%') for cell in cells]
+        domain.append((
+            'timestamp', '>=',
+            fields.Datetime.now() - timedelta(minutes=NEARBY_DRIVER_MAX_AGE_MINUTES)
+        ))
+        positions = self.search_read(
+            domain, ['driver_id', 'job_id', 'latitude', 'longitude', 'timestamp']
+        )
+
+        busy_driver_ids = set()
+        if only_available and positions:
+            busy_jobs = self.env['routy.job']._read_group([
+                ('driver_id', 'in', [p['driver_id'][0] for p in positions]),
+                ('state', '=', 'in_progress'),
+            ], ['driver_id'])
+            busy_driver_ids = {driver.id for driver, in busy_jobs}
+
+        drivers = []
+        for position in positions:
+            if position['driver_id'][0] in busy_driver_ids:
+                continue
+            distance_m = geo.haversine_m(lat, lng, position['latitude'], position['longitude'])
+            if distance_m > radius_m:
+                continue
+            drivers.append({
+                'driver_id': position['driver_id'][0],
+                'driver_name': position['driver_id'][1],
+                'distance_km': round(distance_m / 1000.0, 3),
+                'lat': position['latitude'],
+                'lng': position['longitude'],
+                'timestamp': position['timestamp'].isoformat(),
+                'job_id': position['job_id'][0] if position['job_id'] else False,
+            })
+        drivers.sort(key=lambda driver: driver['distance_km'])
+        return drivers[:limit]
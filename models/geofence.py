@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+from odoo import models, fields, api, tools
+from odoo.exceptions import UserError
+
+from ..tools import geo
+from ..tools.signaled_cache import SignaledCache
+
+_logger = logging.getLogger(__name__)
+
+# System parameters configuring the geofences
+GEOFENCE_RADIUS_PARAM = 'routy.geofence_radius_m'
+GEOFENCE_AUTO_START_PARAM = 'routy.geofence_auto_start'
+GEOFENCE_DEFAULT_RADIUS_M = 100
+
+# A driver leaves a geofence only beyond radius * GEOFENCE_EXIT_FACTOR,
+# so GPS jitter around the edge does not produce enter/exit flapping
+GEOFENCE_EXIT_FACTOR = 1.5
+
+# Drivers whose open jobs a worker keeps cached
+GEOFENCE_CACHE_SIZE = 2048
+
+# Hub geohash indexes (one per precision) a worker keeps cached
+GEOFENCE_HUB_INDEX_SIZE = 8
+
+GEOFENCE_JOB_STATES = ('assigned', 'accepted', 'in_progress')
+
+# {driver_id: [(job_id, latitude, longitude)]}
+_driver_jobs_cache = SignaledCache('routy_geofence_jobs_signaling', GEOFENCE_CACHE_SIZE)
+# {'hubs': {hub_id: (hub_id, latitude, longitude, company_id)}}
+# and {precision: {geohash cell: [(hub_id, latitude, longitude, company_id)]}}
+_hubs_cache = SignaledCache('routy_geofence_hubs_signaling', GEOFENCE_HUB_INDEX_SIZE + 1)
+
+
+def invalidate_driver_jobs(cr, driver_ids):
+    """Drop the cached open jobs of the given drivers, in every worker"""
+    _driver_jobs_cache.signal(cr, [driver_id for driver_id in driver_ids if driver_id])
+
+
+def invalidate_hubs(cr):
+    """Drop the cached hub locations, in every worker"""
+    _hubs_cache.signal(cr)
+
+
+class GeofenceEvent(models.Model):
+    _name = 'routy.geofence.event'
+    _description = 'Geofence Event'
+    _order = 'timestamp desc, id desc'
+    _rec_name = 'event_type'
+
+    driver_id = fields.Many2one(
+        'res.users',
+        string='Driver',
+        required=True,
+        ondelete='cascade',
+        index=True
+    )
+    job_id = fields.Many2one(
+        'routy.job',
+        string='Job',
+        ondelete='cascade',
+        index='btree_not_null'
+    )
+    hub_id = fields.Many2one(
+        'routy.hub',
+        string='Hub',
+        ondelete='cascade',
+        index='btree_not_null'
+    )
+    event_type = fields.Selection([
+        ('enter', 'Enter'),
+        ('exit', 'Exit')
+    ], string='Event', required=True)
+    timestamp = fields.Datetime(
+        string='Timestamp',
+        required=True,
+        help='Time of the GPS fix that crossed the geofence'
+    )
+    latitude = fields.Float(string='Latitude', digits=(10, 7))
+    longitude = fields.Float(string='Longitude', digits=(10, 7))
+    distance = fields.Float(
+        string='Distance (m)',
+        help='Distance between the fix and the geofence center'
+    )
+    is_open = fields.Boolean(
+        string='Inside',
+        help='Set on an enter event while the driver has not left the geofence yet'
+    )
+    company_id = fields.Many2one('res.company', string='Company')
+
+    def init(self):
+        """Index the open enter events looked up on every ingest"""
+        tools.create_index(
+            self.env.cr, 'routy_geofence_event_open_index',
+            self._table, ['driver_id'], where='is_open'
+        )
+        _driver_jobs_cache.setup(self.env.cr)
+        _hubs_cache.setup(self.env.cr)
+
+    @api.model
+    def _get_driver_jobs(self, driver_id):
+        """Open jobs of a driver with a location, as (job_id, latitude, longitude)"""
+        dbname = self.env.cr.dbname
+        cached = _driver_jobs_cache.get(dbname, driver_id)
+        if cached is not None:
+            return cached
+        jobs = self.env['routy.job'].sudo().search_read([
+            ('driver_id', '=', driver_id),
+            ('state', 'in', GEOFENCE_JOB_STATES),
+        ], ['location_lat', 'location_lng'])
+        targets = [
+            (job['id'], job['location_lat'], job['location_lng'])
+            for job in jobs if job['location_lat'] or job['location_lng']
+        ]
+        _driver_jobs_cache.set(dbname, driver_id, targets)
+        return targets
+
+    @api.model
+    def _get_hubs(self):
+        """Active hubs with a location, as {hub_id: (hub_id, latitude, longitude, company_id)}"""
+        dbname = self.env.cr.dbname
+        cached = _hubs_cache.get(dbname, 'hubs')
+        if cached is not None:
+            return cached
+        hubs = self.env['routy.hub'].sudo().search_read(
+            [('is_active', '=', True)], ['latitude', 'longitude', 'company_id'])
+        targets = {
+            hub['id']: (hub['id'], hub['latitude'], hub['longitude'], hub['company_id'] and hub['company_id'][0])
+            for hub in hubs if hub['latitude'] or hub['longitude']
+        }
+        _hubs_cache.set(dbname, 'hubs', targets)
+        return targets
+
+    @api.model
+    def _get_hub_index(self, precision):
+        """Active hubs grouped by their geohash cell of the given precision"""
+        dbname = self.env.cr.dbname
+        cached = _hubs_cache.get(dbname, precision)
+        if cached is not None:
+            return cached
+        index = {}
+        for hub in self._get_hubs().values():
+            index.setdefault(geo.geohash_encode(hub[1], hub[2], precision), []).append(hub)
+        _hubs_cache.set(dbname, precision, index)
+        return index
+
+    @api.model
+    def _get_nearby_hubs(self, latitude, longitude, radius):
+        """
+        Hubs that may lie within radius of a point: those in its geohash
+        cell and the 8 cells around it, cells being at least radius wide
+        """
+        precision = geo.geohash_precision_for_radius(radius, latitude)
+        index = self._get_hub_index(precision)
+        center = geo.geohash_encode(latitude, longitude, precision)
+        return [hub for cell in [center] + geo.geohash_neighbors(center) for hub in index.get(cell, ())]
+
+    @api.model
+    def _evaluate(self, rows):
+        """
+        Check accepted GPS fixes against the geofences of their driver's
+        open jobs and of the hubs, and record enter/exit events. `rows` are
+        the ingest row dicts (driver_id, latitude, longitude, timestamp,
+        company_id). Work per fix is proportional to the driver's open jobs
+        and the hubs near the fix. Returns the created events.
+        """
+        if not rows:
+            return self.browse()
+        _driver_jobs_cache.check(self.env.cr)
+        _hubs_cache.check(self.env.cr)
+        params = self.env['ir.config_parameter'].sudo()
+        radius = float(params.get_param(GEOFENCE_RADIUS_PARAM, GEOFENCE_DEFAULT_RADIUS_M))
+        exit_radius = radius * GEOFENCE_EXIT_FACTOR
+
+        rows_by_driver = {}
+        for row in rows:
+            rows_by_driver.setdefault(row['driver_id'], []).append(row)
+
+        open_events = self.sudo().search([
+            ('driver_id', 'in', list(rows_by_driver)),
+            ('is_open', '=', True),
+        ])
+        inside = {(event.driver_id.id, event.job_id.id, event.hub_id.id): event for event in open_events}
+
+        hubs = self._get_hubs()
+        vals_list = []
+        closed = self.browse()
+        for driver_id, driver_rows in rows_by_driver.items():
+            jobs = self._get_driver_jobs(driver_id)
+            # Jobs closed or reassigned since the driver entered no longer have a geofence
+            open_job_ids = {job_id for job_id, _lat, _lng in jobs}
+            for key in [k for k in inside if k[0] == driver_id and k[1] and k[1] not in open_job_ids]:
+                closed |= inside.pop(key)
+            for row in sorted(driver_rows, key=lambda r: r['timestamp']):
+                targets = [(job_id, False, lat, lng) for job_id, lat, lng in jobs]
+                nearby = {
+                    hub_id: (lat, lng)
+                    for hub_id, lat, lng, company_id in self._get_nearby_hubs(row['latitude'], row['longitude'], radius)
+                    if not company_id or company_id == row['company_id']
+                }
+                # Hubs the driver is inside are checked wherever the fix is, to see it leave
+                for key in inside:
+                    if key[0] == driver_id and key[2] and key[2] not in nearby and key[2] in hubs:
+                        nearby[key[2]] = hubs[key[2]][1:3]
+                targets += [(False, hub_id, lat, lng) for hub_id, (lat, lng) in nearby.items()]
+                for job_id, hub_id, lat, lng in targets:
+                    key = (driver_id, job_id, hub_id)
+                    distance = geo.haversine_m(row['latitude'], row['longitude'], lat, lng)
+                    if key not in inside and distance <= radius:
+                        event_type = 'enter'
+                    elif key in inside and distance > exit_radius:
+                        event_type = 'exit'
+                    else:
+                        continue
+                    vals_list.append({
+                        'driver_id': driver_id,
+                        'job_id': job_id,
+                        'hub_id': hub_id,
+                        'event_type': event_type,
+                        'timestamp': row['timestamp'],
+                        'latitude': row['latitude'],
+                        'longitude': row['longitude'],
+                        'distance': distance,
+                        'is_open': event_type == 'enter',
+                        'company_id': row['company_id'],
+                    })
+                    if event_type == 'enter':
+                        inside[key] = len(vals_list) - 1
+                    else:
+                        opened = inside.pop(key)
+                        if isinstance(opened, int):
+                            # Entered and left within the same batch
+                            vals_list[opened]['is_open'] = False
+                        else:
+                            closed |= opened
+
+        # Cached targets may briefly outlive a job or hub deleted by another worker
+        existing_jobs = set(self.env['routy.job'].sudo().browse(
+            {vals['job_id'] for vals in vals_list if vals['job_id']}).exists().ids)
+        existing_hubs = set(self.env['routy.hub'].sudo().browse(
+            {vals['hub_id'] for vals in vals_list if vals['hub_id']}).exists().ids)
+        vals_list = [
+            vals for vals in vals_list
+            if vals['job_id'] in existing_jobs or vals['hub_id'] in existing_hubs
+        ]
+
+        closed.write({'is_open': False})
+        events = self.sudo().create(vals_list)
+
+        if params.get_param(GEOFENCE_AUTO_START_PARAM) == 'True':
+            self._auto_start_jobs(events)
+        return events
+
+    @api.model
+    def _auto_start_jobs(self, events):
+        """Start the jobs a driver just arrived at, dating the start from the arrival fix"""
+        for event in events.filtered(lambda e: e.event_type == 'enter' and e.job_id):
+            job = event.job_id
+            if job.state not in ('assigned', 'accepted'):
+                continue
+            try:
+                with self.env.cr.savepoint():
+                    job.action_start()
+                    job.write({'started_at': event.timestamp})
+            except UserError as e:
+                _logger.warning(f'Geofence could not start job {job.name}: {str(e)}')
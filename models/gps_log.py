@@ -1,8 +1,46 @@
 # -*- coding: utf-8 -*-
 
-from odoo import models, fields, api, _
+import json
+import logging
+import re
+from datetime import date, datetime, timedelta, timezone
+
+from dateutil.relativedelta import relativedelta
+
+from odoo import models, fields, api, tools, _
 from odoo.exceptions import ValidationError
 
+from ..tools import geo, gps_validation
+
+_logger = logging.getLogger(__name__)
+
+# Maximum number of fixes accepted by a single batch ingest call
+GPS_BATCH_MAX_POINTS = 500
+
+# Optional telemetry keys copied from an incoming fix, with their defaults
+GPS_OPTIONAL_FIELDS = {
+    'accuracy': 0,
+    'speed': 0,
+    'heading': 0,
+    'altitude': 0,
+    'battery_level': 0,
+    'network_type': '',
+}
+
+# Number of monthly partitions kept ready ahead of the current month
+GPS_PARTITION_MONTHS_AHEAD = 3
+
+# Rows fetched per round-trip when streaming an export
+GPS_EXPORT_CHUNK_SIZE = 2000
+
+# Columns written for each point of an export
+GPS_EXPORT_COLUMNS = (
+    'id', 'driver_id', 'job_id', 'latitude', 'longitude', 'timestamp',
+    'speed', 'heading', 'accuracy', 'altitude', 'battery_level',
+)
+
+_PARTITION_UPPER_BOUND_RE = re.compile(r"TO \('(\d{4}-\d{2}-\d{2})'\)")
+
 
 class GPSLog(models.Model):
     _name = 'routy.gps.log'
@@ -37,6 +75,14 @@ class GPSLog(models.Model):
         digits=(10, 7)
     )
 
+    # Set when a fix is stored; not computed, so adding the column does not
+    # rewrite the whole history (logs stored before it was added have none)
+    geohash = fields.Char(
+        string='Geohash',
+        readonly=True,
+        help='Geohash cell of the fix, used for spatial lookups'
+    )
+
     # Accuracy & Speed
     accuracy = fields.Float(
         string='Accuracy (m)',
@@ -66,8 +112,9 @@ class GPSLog(models.Model):
         string='Date',
         compute='_compute_date',
         store=True,
+        required=True,
         index=True,
-        help='Date extracted from timestamp for faster queries'
+        help='Date extracted from timestamp; the table is range-partitioned on it'
     )
 
     # Battery & Network
@@ -88,6 +135,84 @@ class GPSLog(models.Model):
         store=True
     )
 
+    def init(self):
+        """Partition the GPS log table and make fixes unique per driver and time"""
+        self._partition_table()
+        self._create_fix_unique_index()
+        self._create_ingest_txid_column()
+
+    @api.model
+    def _create_ingest_txid_column(self):
+        """
+        Add the ingest_txid column, stamped with the id of the transaction
+        that stored each fix. It is not an ORM field: readers following new
+        fixes (stop detection) use it to read them in commit order, as ids
+        are taken before the transaction commits and may commit out of order.
+        Fixes stored before the column was added get 0.
+        """
+        cr = self.env.cr
+        if not tools.column_exists(cr, self._table, 'ingest_txid'):
+            cr.execute(f'ALTER TABLE "{self._table}" ADD COLUMN ingest_txid bigint NOT NULL DEFAULT 0')
+            cr.execute(f'ALTER TABLE "{self._table}" ALTER COLUMN ingest_txid SET DEFAULT txid_current()')
+        index_name = '%s_ingest_txid_index' % self._table
+        if not tools.index_exists(cr, index_name):
+            tools.create_index(cr, index_name, self._table, ['ingest_txid', 'id'])
+
+    @api.model
+    def _create_fix_unique_index(self):
+        """
+        Create the unique index on (driver_id, timestamp) that lets ingest
+        drop duplicate fixes with ON CONFLICT DO NOTHING. The partition key
+        is part of the index as PostgreSQL requires; it is derived from the
+        timestamp so uniqueness is unchanged. Existing duplicates are
+        removed first, keeping the oldest row.
+        """
+        cr = self.env.cr
+        index_name = '%s_driver_timestamp_unique' % self._table
+        if tools.index_exists(cr, index_name):
+            return
+        cr.execute(f'''
+            DELETE FROM "{self._table}" duplicate
+            USING "{self._table}" original
+            WHERE duplicate.driver_id = original.driver_id
+              AND duplicate.timestamp = original.timestamp
+              AND duplicate.date = original.date
+              AND duplicate.id > original.id
+        ''')
+        tools.create_unique_index(cr, index_name, self._table, ['driver_id', 'timestamp', 'date'])
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        """Override create to send the partition key with the INSERT itself"""
+        for vals in vals_list:
+            timestamp = fields.Datetime.to_datetime(vals.get('timestamp')) or fields.Datetime.now()
+            vals['timestamp'] = timestamp
+            vals['date'] = timestamp.date()
+            if 'latitude' in vals and 'longitude' in vals:
+                vals['geohash'] = geo.geohash_encode(vals['latitude'], vals['longitude'])
+        logs = super(GPSLog, self).create(vals_list)
+        self.env['routy.driver.position']._upsert_positions([{
+            'driver_id': log.driver_id.id,
+            'job_id': log.job_id.id,
+            'latitude': log.latitude,
+            'longitude': log.longitude,
+            'accuracy': log.accuracy,
+            'speed': log.speed,
+            'heading': log.heading,
+            'timestamp': log.timestamp,
+            'company_id': log.company_id.id,
+        } for log in logs])
+        return logs
+
+    def write(self, vals):
+        """Override write to keep the geohash in step with corrected coordinates"""
+        if 'latitude' not in vals and 'longitude' not in vals:
+            return super(GPSLog, self).write(vals)
+        for log in self:
+            super(GPSLog, log).write(dict(vals, geohash=geo.geohash_encode(
+                vals.get('latitude', log.latitude), vals.get('longitude', log.longitude))))
+        return True
+
     @api.depends('timestamp')
     def _compute_date(self):
         """Extract date from timestamp for indexing"""
@@ -147,11 +272,379 @@ class GPSLog(models.Model):
         return self.create(vals)
 
     @api.model
-    def get_job_track(self, job_id):
-        """Get all GPS logs for a specific job"""
+    def _parse_fix_timestamp(self, value):
+        """
+        Convert a client timestamp to a naive UTC datetime, keeping its
+        fraction of a second: fixes sent more than once a second are distinct
+        fixes, not duplicates. Accepts epoch seconds or an ISO 8601 string;
+        returns None if invalid.
+        """
+        try:
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                parsed = datetime.fromtimestamp(value, tz=timezone.utc)
+            elif isinstance(value, str):
+                parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+            else:
+                return None
+            if parsed.tzinfo:
+                parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+            return parsed
+        except (ValueError, OverflowError, OSError):
+            pass
+        return None
+
+    @api.model
+    def ingest_points(self, points, driver_id=None):
+        """
+        Validate and store a batch of GPS fixes sent by a driver app.
+
+        Job ownership is checked once per distinct job_id, the numeric
+        columns of the whole batch are validated in one pass (see
+        tools.gps_validation) and all accepted fixes are inserted with a
+        single multi-row create. Out-of-range telemetry is corrected rather
+        than rejected and reported in the result's 'warnings' list.
+        Returns one result per input point, in input order:
+            {'index': int, 'status': 'accepted', 'log_id': int[, 'warnings': [str]]}
+            {'index': int, 'status': 'rejected', 'reason': str}
+        """
+        driver_id = driver_id or self.env.user.id
+        results = [None] * len(points)
+
+        job_ids = {
+            point.get('job_id') for point in points
+            if isinstance(point, dict) and isinstance(point.get('job_id'), int)
+        }
+        jobs = self.env['routy.job'].sudo().browse(job_ids).exists()
+        owned_job_ids = set(jobs.filtered(lambda j: j.driver_id.id == driver_id).ids)
+        existing_job_ids = set(jobs.ids)
+
+        company_by_job = {job.id: job.company_id.id for job in jobs}
+        now = fields.Datetime.now()
+
+        # Structural and ownership checks, then one columnar pass for the numbers
+        candidates = []
+        for index, point in enumerate(points):
+            reason = None
+            if not isinstance(point, dict):
+                reason = 'Invalid point'
+            else:
+                reason = next((
+                    'Missing required field: %s' % field
+                    for field in ('job_id', 'latitude', 'longitude')
+                    if field not in point
+                ), None)
+            if not reason:
+                job_id = point['job_id']
+                if job_id not in existing_job_ids:
+                    reason = 'Job not found'
+                elif job_id not in owned_job_ids:
+                    reason = 'Not authorized'
+            if not reason:
+                timestamp = now
+                if point.get('timestamp') is not None:
+                    timestamp = self._parse_fix_timestamp(point['timestamp'])
+                    if not timestamp:
+                        reason = 'Invalid timestamp'
+            if reason:
+                results[index] = {'index': index, 'status': 'rejected', 'reason': reason}
+                continue
+            candidates.append((index, point, timestamp))
+
+        columns, reasons, warnings = gps_validation.validate_fixes([point for _i, point, _t in candidates])
+
+        rows = []
+        for position, (index, point, timestamp) in enumerate(candidates):
+            if reasons[position]:
+                results[index] = {'index': index, 'status': 'rejected', 'reason': reasons[position]}
+                continue
+            row = {
+                'index': index,
+                'job_id': point['job_id'],
+                'driver_id': driver_id,
+                'latitude': columns['latitude'][position],
+                'longitude': columns['longitude'][position],
+                'timestamp': timestamp,
+                'company_id': company_by_job[point['job_id']],
+                'network_type': point.get('network_type') or GPS_OPTIONAL_FIELDS['network_type'],
+                'warnings': warnings[position],
+            }
+            for field in gps_validation.TELEMETRY_COLUMNS:
+                row[field] = columns[field][position]
+            rows.append(row)
+
+        Spool = self.env['routy.gps.spool']
+        if Spool._is_enabled():
+            # Write-behind: acknowledged once durably spooled, flushed by cron
+            Spool._spool_fixes(rows)
+            for row in rows:
+                results[row['index']] = {'index': row['index'], 'status': 'accepted', 'queued': True}
+        else:
+            inserted = self._insert_fixes(rows)
+            for row in rows:
+                log_id = inserted.pop((row['driver_id'], row['timestamp']), None)
+                if log_id:
+                    results[row['index']] = {'index': row['index'], 'status': 'accepted', 'log_id': log_id}
+                else:
+                    # Already stored (e.g. a retried upload): acknowledged, not stored twice
+                    results[row['index']] = {'index': row['index'], 'status': 'accepted', 'duplicate': True}
+        self.env['routy.geofence.event']._evaluate([
+            row for row in rows if not results[row['index']].get('duplicate')
+        ])
+        for row in rows:
+            if row['warnings']:
+                results[row['index']]['warnings'] = row['warnings']
+        return results
+
+    @api.model
+    def _insert_fixes(self, rows):
+        """
+        Insert validated fixes with one multi-row INSERT ... ON CONFLICT DO
+        NOTHING, in timestamp order. Fixes already stored for the same driver
+        and timestamp are skipped, and so are repeats within `rows`. Each
+        row is a dict with the keys driver_id, job_id, latitude, longitude,
+        timestamp, company_id and the GPS_OPTIONAL_FIELDS keys.
+
+        Late fixes, older than the newest one stored, still go into the
+        history, but they never replace the driver's current position.
+        Returns {(driver_id, timestamp): log_id} for the rows inserted.
+        """
+        if not rows:
+            return {}
+        rows = sorted(rows, key=lambda row: row['timestamp'])
+        now = fields.Datetime.now()
+        values = [(
+            row['job_id'], row['driver_id'], row['latitude'], row['longitude'],
+            geo.geohash_encode(row['latitude'], row['longitude']),
+            row['accuracy'], row['speed'], row['heading'], row['altitude'],
+            row['battery_level'], row['network_type'],
+            row['timestamp'], row['timestamp'].date(), row['company_id'] or None,
+            self.env.uid, now, self.env.uid, now,
+        ) for row in rows]
+        self.env.cr.execute(f"""
+            INSERT INTO "{self._table}" (
+                job_id, driver_id, latitude, longitude, geohash,
+                accuracy, speed, heading, altitude, battery_level, network_type,
+                timestamp, date, company_id, create_uid, create_date, write_uid, write_date
+            )
+            VALUES {', '.join(['%s'] * len(values))}
+            ON CONFLICT DO NOTHING
+            RETURNING id, driver_id, timestamp
+        """, values)
+        inserted = {(driver_id, timestamp): log_id for log_id, driver_id, timestamp in self.env.cr.fetchall()}
+        self.env['routy.job'].invalidate_model(['gps_log_ids', 'gps_log_count'])
+
+        self.env['routy.driver.position']._upsert_positions([
+            row for row in rows if (row['driver_id'], row['timestamp']) in inserted
+        ])
+        return inserted
+
+    # ------------------------------------------------------------
+    # Partitioning
+    # ------------------------------------------------------------
+
+    @api.model
+    def _is_partitioned(self):
+        """Return True if the GPS log table is a partitioned table"""
+        self.env.cr.execute(
+            "SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (self._table,)
+        )
+        row = self.env.cr.fetchone()
+        return bool(row) and row[0] == 'p'
+
+    @api.model
+    def _partition_name(self, month_start):
+        """Name of the monthly partition starting at month_start"""
+        return '%s_y%04dm%02d' % (self._table, month_start.year, month_start.month)
+
+    @api.model
+    def _partition_table(self):
+        """
+        Convert the plain GPS log table into a table range-partitioned by
+        month on `date`. Existing rows are copied once; indexes and foreign
+        keys are recreated on the partitioned table. Since the primary key
+        becomes (id, date), no other table may hold a foreign key to it.
+        """
+        if self._is_partitioned():
+            return
+
+        cr = self.env.cr
+        table = self._table
+        legacy = '%s_unpartitioned' % table
+        _logger.info('Converting %s into a partitioned table', table)
+
+        cr.execute(f'UPDATE "{table}" SET date = timestamp::date WHERE date IS NULL')
+        cr.execute("""
+            SELECT indexname, indexdef FROM pg_indexes
+            WHERE schemaname = current_schema() AND tablename = %s AND indexname != %s
+        """, (table, '%s_pkey' % table))
+        indexes = cr.fetchall()
+        cr.execute("""
+            SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+            WHERE conrelid = to_regclass(%s) AND contype = 'f'
+        """, (table,))
+        foreign_keys = cr.fetchall()
+
+        for index_name, _definition in indexes:
+            cr.execute(f'DROP INDEX "{index_name}"')
+        cr.execute(f'ALTER TABLE "{table}" RENAME TO "{legacy}"')
+        cr.execute(f'ALTER TABLE "{legacy}" RENAME CONSTRAINT "{table}_pkey" TO "{legacy}_pkey"')
+        cr.execute(f'''
+            CREATE TABLE "{table}" (
+                LIKE "{legacy}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING COMMENTS
+            ) PARTITION BY RANGE (date)
+        ''')
+        cr.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{table}_pkey" PRIMARY KEY (id, date)')
+        cr.execute(f'ALTER SEQUENCE "{table}_id_seq" OWNED BY "{table}".id')
+
+        cr.execute(f'SELECT min(date) FROM "{legacy}"')
+        first_date = cr.fetchone()[0] or fields.Date.today()
+        self._create_partitions(first_date)
+        cr.execute(f'CREATE TABLE "{table}_default" PARTITION OF "{table}" DEFAULT')
+
+        cr.execute(f'INSERT INTO "{table}" SELECT * FROM "{legacy}"')
+        cr.execute(f'DROP TABLE "{legacy}"')
+
+        for _index_name, definition in indexes:
+            cr.execute(definition)
+        for constraint_name, definition in foreign_keys:
+            cr.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{constraint_name}" {definition}')
+
+    @api.model
+    def _create_partitions(self, date_from, date_to=None):
+        """
+        Create the monthly partitions covering date_from up to date_to
+        (default: GPS_PARTITION_MONTHS_AHEAD months after today).
+        Existing partitions are left untouched. Rows of a new partition's
+        month already stored in the default partition are moved into it.
+        """
+        cr = self.env.cr
+        default = '%s_default' % self._table
+        cr.execute("SELECT to_regclass(%s)", (default,))
+        has_default = bool(cr.fetchone()[0])
+        month = date_from.replace(day=1)
+        last_month = (date_to or fields.Date.today() + relativedelta(months=GPS_PARTITION_MONTHS_AHEAD)).replace(day=1)
+        created = []
+        while month <= last_month:
+            next_month = month + relativedelta(months=1)
+            name = self._partition_name(month)
+            cr.execute("SELECT to_regclass(%s)", (name,))
+            if not cr.fetchone()[0]:
+                stray_rows = False
+                if has_default:
+                    cr.execute(
+                        f'SELECT 1 FROM "{default}" WHERE date >= %s AND date < %s LIMIT 1',
+                        (month, next_month)
+                    )
+                    stray_rows = bool(cr.fetchone())
+                if stray_rows:
+                    self._create_partition_from_default(name, month, next_month)
+                else:
+                    cr.execute(
+                        f'CREATE TABLE "{name}" PARTITION OF "{self._table}" '
+                        f'FOR VALUES FROM (%s) TO (%s)',
+                        (month, next_month)
+                    )
+                created.append(name)
+            month = next_month
+        return created
+
+    @api.model
+    def _create_partition_from_default(self, name, month, next_month):
+        """
+        Create the partition `name` for [month, next_month) when the default
+        partition already holds rows of that range, which PostgreSQL refuses
+        to attach over: the default partition is detached, the new partition
+        created, the rows moved into it and the default partition attached
+        back, all in the current transaction.
+        """
+        cr = self.env.cr
+        table = self._table
+        default = '%s_default' % table
+        _logger.info('Moving GPS logs from %s into the new partition %s', default, name)
+        cr.execute(f'ALTER TABLE "{table}" DETACH PARTITION "{default}"')
+        cr.execute(
+            f'CREATE TABLE "{name}" PARTITION OF "{table}" FOR VALUES FROM (%s) TO (%s)',
+            (month, next_month)
+        )
+        cr.execute(f'''
+            WITH moved AS (
+                DELETE FROM "{default}" WHERE date >= %s AND date < %s RETURNING *
+            )
+            INSERT INTO "{table}" SELECT * FROM moved
+        ''', (month, next_month))
+        cr.execute(f'ALTER TABLE "{table}" ATTACH PARTITION "{default}" DEFAULT')
+
+    @api.model
+    def _get_partitions(self):
+        """Return [(partition_name, upper_bound_date)] for the monthly partitions"""
+        self.env.cr.execute("""
+            SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass(%s)
+        """, (self._table,))
+        partitions = []
+        for name, bound in self.env.cr.fetchall():
+            match = _PARTITION_UPPER_BOUND_RE.search(bound or '')
+            if match:
+                partitions.append((name, date.fromisoformat(match.group(1))))
+        return partitions
+
+    @api.model
+    def _drop_expired_partitions(self, cutoff_date):
+        """
+        Detach and drop every monthly partition that only holds rows older
+        than cutoff_date. Returns the names of the dropped partitions.
+        """
+        cr = self.env.cr
+        dropped = []
+        for name, upper_bound in self._get_partitions():
+            if upper_bound <= cutoff_date:
+                cr.execute(f'ALTER TABLE "{self._table}" DETACH PARTITION "{name}"')
+                cr.execute(f'DROP TABLE "{name}"')
+                dropped.append(name)
+        # Stray rows outside the monthly ranges end up in the default partition
+        cr.execute(f'DELETE FROM "{self._table}_default" WHERE date < %s', (cutoff_date,))
+        self.invalidate_model()
+        return dropped
+
+    @api.model
+    def _job_date_domain(self, job):
+        """
+        Date bounds of a job's GPS logs, used to prune partitions.
+        A day of slack on each side absorbs device clock skew.
+        """
+        if not job.exists():
+            return []
+        domain = [('date', '>=', job.create_date.date() - timedelta(days=1))]
+        if job.completed_at:
+            domain.append(('date', '<=', job.completed_at.date() + timedelta(days=1)))
+        return domain
+
+    @api.model
+    def get_job_track(self, job_id, tolerance=None, zoom=None):
+        """
+        Get the GPS track of a job.
+        Without tolerance/zoom, returns every raw point as a list of dicts.
+        With a tolerance (meters) or a map zoom level, returns the track
+        simplified server-side as an encoded polyline with its bounding box.
+        """
+        job = self.env['routy.job'].browse(job_id)
+        if job.exists():
+            job.check_access('read')
+        if tolerance is not None or zoom is not None:
+            if tolerance is None:
+                latitude = job.location_lat if job.exists() else 0.0
+                tolerance = geo.zoom_to_tolerance(zoom, latitude)
+            # Rounded so that nearby tolerances share a cache entry
+            tolerance = round(float(tolerance), 1)
+            if job.exists() and job.state == 'completed':
+                return self.sudo()._get_simplified_track(job_id, tolerance, self.sudo()._track_version(job))
+            return self._simplify_track(job_id, tolerance)
+
         logs = self.search([
             ('job_id', '=', job_id)
-        ], order='timestamp asc')
+        ] + self._job_date_domain(job), order='timestamp asc')
 
         return [{
             'lat': log.latitude,
@@ -161,19 +654,120 @@ class GPSLog(models.Model):
             'heading': log.heading,
         } for log in logs]
 
+    @api.model
+    def _track_version(self, job):
+        """
+        (count, last write date) of a job's GPS logs: it changes whenever
+        fixes are added to or removed from the track
+        """
+        [version] = self._read_group(
+            [('job_id', '=', job.id)] + self._job_date_domain(job),
+            aggregates=['__count', 'write_date:max'],
+        )
+        return version
+
+    @api.model
+    @tools.ormcache('job_id', 'tolerance', 'version')
+    def _get_simplified_track(self, job_id, tolerance, version):
+        """
+        Simplified track of a completed job. Callers check access to the job
+        and call this as superuser, so every user shares the cached body;
+        `version` is the job's _track_version(), so late fixes are not
+        hidden behind an outdated entry.
+        """
+        return self._simplify_track(job_id, tolerance)
+
+    @api.model
+    def _simplify_track(self, job_id, tolerance):
+        """Simplify a job's track without building records for its points"""
+        job = self.env['routy.job'].browse(job_id)
+        query = self._search([
+            ('job_id', '=', job_id)
+        ] + self._job_date_domain(job), order='timestamp asc')
+        self.env.cr.execute(query.select(
+            f'"{self._table}"."latitude"', f'"{self._table}"."longitude"'
+        ))
+        rows = self.env.cr.fetchall()
+        lats = [row[0] for row in rows]
+        lngs = [row[1] for row in rows]
+
+        kept = geo.simplify_track(lats, lngs, tolerance)
+        return {
+            'job_id': job_id,
+            'tolerance': tolerance,
+            'polyline': geo.encode_polyline([lats[i] for i in kept], [lngs[i] for i in kept]),
+            'bbox': geo.bounding_box(lats, lngs),
+            'point_count': len(rows),
+            'simplified_count': len(kept),
+        }
+
+    @api.model
+    def _export_stream(self, domain, export_format='ndjson', chunk_size=GPS_EXPORT_CHUNK_SIZE):
+        """
+        Return a generator streaming the GPS logs matching `domain` as NDJSON
+        lines or as a GeoJSON FeatureCollection, encoded as UTF-8 chunks.
+
+        The query (including record rules) is built right away, but rows are
+        only read when the generator is consumed: they come from a
+        server-side cursor on a dedicated database cursor, `chunk_size` rows
+        at a time, so memory use does not depend on the export size.
+        """
+        query = self._search(domain, order='timestamp asc, id asc')
+        sql = query.select(*[f'"{self._table}"."{column}"' for column in GPS_EXPORT_COLUMNS])
+        registry = self.env.registry
+
+        def _point(row):
+            point = dict(zip(GPS_EXPORT_COLUMNS, row))
+            point['timestamp'] = point['timestamp'].isoformat()
+            return point
+
+        def _ndjson_chunk(rows):
+            return ''.join(json.dumps(_point(row)) + '\n' for row in rows)
+
+        def _feature(row):
+            properties = _point(row)
+            coordinates = [properties.pop('longitude'), properties.pop('latitude')]
+            return json.dumps({
+                'type': 'Feature',
+                'geometry': {'type': 'Point', 'coordinates': coordinates},
+                'properties': properties,
+            })
+
+        def generate():
+            first_chunk = True
+            if export_format == 'geojson':
+                yield b'{"type": "FeatureCollection", "features": ['
+            with registry.cursor() as cr:
+                with cr._cnx.cursor('routy_gps_export') as server_cursor:
+                    server_cursor.execute(sql.code, sql.params)
+                    while True:
+                        rows = server_cursor.fetchmany(chunk_size)
+                        if not rows:
+                            break
+                        if export_format == 'geojson':
+                            chunk = ', '.join(_feature(row) for row in rows)
+                            if not first_chunk:
+                                chunk = ', ' + chunk
+                        else:
+                            chunk = _ndjson_chunk(rows)
+                        first_chunk = False
+                        yield chunk.encode()
+            if export_format == 'geojson':
+                yield b']}'
+
+        return generate()
+
     @api.model
     def get_driver_current_location(self, driver_id):
         """Get the most recent GPS location for a driver"""
-        log = self.search([
-            ('driver_id', '=', driver_id)
-        ], order='timestamp desc', limit=1)
-
-        if log:
+        positions = self.env['routy.driver.position'].get_positions([driver_id])
+        if positions:
+            position = positions[0]
             return {
-                'lat': log.latitude,
-                'lng': log.longitude,
-                'timestamp': log.timestamp.isoformat(),
-                'speed': log.speed,
-                'accuracy': log.accuracy,
+                'lat': position['lat'],
+                'lng': position['lng'],
+                'timestamp': position['timestamp'],
+                'speed': position['speed'],
+                'accuracy': position['accuracy'],
             }
         return False
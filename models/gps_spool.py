@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import time
+from datetime import timedelta
+
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+# System parameter switching GPS ingest to write-behind mode
+WRITE_BEHIND_PARAM = 'routy.gps_write_behind'
+
+# Spooled fixes moved to the GPS log per flush statement
+SPOOL_FLUSH_BATCH_SIZE = 5000
+
+# A flush cron run keeps draining the spool for this many seconds; once the
+# spool is empty the next run is scheduled SPOOL_FLUSH_INTERVAL seconds later
+SPOOL_FLUSH_WINDOW = 50
+SPOOL_FLUSH_INTERVAL = 5
+
+# System parameters that held the flush counters before routy.gps.spool.stats
+SPOOL_FLUSHED_PARAM = 'routy.gps_spool.flushed_count'
+SPOOL_DROPPED_PARAM = 'routy.gps_spool.dropped_count'
+SPOOL_LAST_FLUSH_PARAM = 'routy.gps_spool.last_flush'
+
+SPOOL_COLUMNS = (
+    'job_id', 'driver_id', 'latitude', 'longitude', 'accuracy', 'speed', 'heading',
+    'altitude', 'battery_level', 'network_type', 'timestamp', 'company_id',
+)
+
+
+class GPSSpool(models.Model):
+    _name = 'routy.gps.spool'
+    _description = 'GPS Write-Behind Spool'
+    _order = 'id'
+    _log_access = False
+
+    job_id = fields.Many2one(
+        'routy.job',
+        string='Job',
+        required=True,
+        ondelete='cascade'
+    )
+    driver_id = fields.Many2one(
+        'res.users',
+        string='Driver',
+        required=True,
+        ondelete='cascade'
+    )
+    latitude = fields.Float(string='Latitude', digits=(10, 7), required=True)
+    longitude = fields.Float(string='Longitude', digits=(10, 7), required=True)
+    accuracy = fields.Float(string='Accuracy (m)')
+    speed = fields.Float(string='Speed (km/h)')
+    heading = fields.Float(string='Heading (degrees)')
+    altitude = fields.Float(string='Altitude (m)')
+    battery_level = fields.Float(string='Battery Level (%)')
+    network_type = fields.Char(string='Network Type')
+    timestamp = fields.Datetime(string='Timestamp', required=True)
+    company_id = fields.Many2one('res.company', string='Company')
+    received_at = fields.Datetime(
+        string='Received At',
+        required=True,
+        help='When the fix was spooled; used to measure flush lag'
+    )
+
+    @api.model
+    def _is_enabled(self):
+        """Return True when GPS ingest runs in write-behind mode"""
+        return self.env['ir.config_parameter'].sudo().get_param(WRITE_BEHIND_PARAM) == 'True'
+
+    @api.model
+    def _spool_fixes(self, rows):
+        """
+        Append validated fixes to the spool with one multi-row INSERT.
+        The spool is a regular (logged) table, so every acknowledged fix
+        survives worker and database restarts until it is flushed.
+        """
+        if not rows:
+            return
+        now = fields.Datetime.now()
+        values = [tuple(row[column] for column in SPOOL_COLUMNS) + (now,) for row in rows]
+        self.env.cr.execute(f"""
+            INSERT INTO "{self._table}" ({', '.join(SPOOL_COLUMNS)}, received_at)
+            VALUES {', '.join(['%s'] * len(values))}
+        """, values)
+        # Keep dispatch boards live even before the fixes are flushed
+        self.env['routy.driver.position']._upsert_positions(rows)
+
+    @api.model
+    def _flush(self, limit=SPOOL_FLUSH_BATCH_SIZE):
+        """
+        Move up to `limit` spooled fixes into the GPS log. The rows are
+        deleted and inserted in the same transaction, and SKIP LOCKED lets
+        concurrent flushers work on separate rows.
+        Returns (flushed, dropped): dropped fixes were duplicates.
+        """
+        self.env.cr.execute(f"""
+            DELETE FROM "{self._table}"
+            WHERE id IN (
+                SELECT id FROM "{self._table}"
+                ORDER BY id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING {', '.join(SPOOL_COLUMNS)}
+        """, (limit,))
+        rows = [dict(zip(SPOOL_COLUMNS, values)) for values in self.env.cr.fetchall()]
+        if not rows:
+            return 0, 0
+        for row in rows:
+            row['network_type'] = row['network_type'] or ''
+        inserted = self.env['routy.gps.log']._insert_fixes(rows)
+        return len(rows), len(rows) - len(inserted)
+
+    @api.model
+    def _record_flush(self, flushed, dropped):
+        """Accumulate the flush counters exposed by get_spool_metrics"""
+        self.env['routy.gps.spool.stats']._add(flushed, dropped)
+
+    @api.model
+    def _cron_flush(self):
+        """
+        Drain the GPS spool into the GPS log for up to SPOOL_FLUSH_WINDOW
+        seconds. The run never waits for new fixes: once the spool is empty
+        it ends and schedules the next run SPOOL_FLUSH_INTERVAL seconds
+        later, and if the window runs out first the next run starts at once.
+        """
+        try:
+            if not self._is_enabled() and not self.search_count([], limit=1):
+                return
+            deadline = time.monotonic() + SPOOL_FLUSH_WINDOW
+            drained = False
+            while not drained and time.monotonic() < deadline:
+                flushed, dropped = self._flush()
+                if flushed:
+                    self._record_flush(flushed, dropped)
+                drained = flushed < SPOOL_FLUSH_BATCH_SIZE
+                self.env.cr.commit()
+            if drained and not self._is_enabled():
+                return
+            next_run = fields.Datetime.now()
+            if drained:
+                next_run += timedelta(seconds=SPOOL_FLUSH_INTERVAL)
+            self.env.ref('routy.cron_flush_gps_spool').sudo()._trigger(next_run)
+        except Exception as e:
+            _logger.error(f'Error flushing GPS spool: {str(e)}')
+
+    @api.model
+    def get_spool_metrics(self):
+        """
+        Health of the write-behind spool:
+        queue depth, age of the oldest spooled fix (flush lag) and the
+        cumulative flushed and dropped counters.
+        """
+        self.env.cr.execute(f'SELECT count(*), min(received_at) FROM "{self._table}"')
+        depth, oldest = self.env.cr.fetchone()
+        stats = self.env['routy.gps.spool.stats']._get()
+        return {
+            'enabled': self._is_enabled(),
+            'queue_depth': depth,
+            'flush_lag_seconds': (fields.Datetime.now() - oldest).total_seconds() if oldest else 0.0,
+            'flushed_count': stats['flushed_count'],
+            'dropped_count': stats['dropped_count'],
+            'last_flush': stats['last_flush'] and fields.Datetime.to_string(stats['last_flush']),
+        }
+
+
+class GPSSpoolStats(models.Model):
+    _name = 'routy.gps.spool.stats'
+    _description = 'GPS Spool Flush Counters'
+    _log_access = False
+
+    flushed_count = fields.Integer(string='Flushed Fixes', readonly=True)
+    dropped_count = fields.Integer(string='Dropped Duplicates', readonly=True)
+    last_flush = fields.Datetime(string='Last Flush', readonly=True)
+
+    def init(self):
+        """Create the single counters row, starting from the former system parameters"""
+        cr = self.env.cr
+        cr.execute(f'SELECT 1 FROM "{self._table}" LIMIT 1')
+        if cr.fetchone():
+            return
+        cr.execute("SELECT key, value FROM ir_config_parameter WHERE key IN %s",
+                   ((SPOOL_FLUSHED_PARAM, SPOOL_DROPPED_PARAM, SPOOL_LAST_FLUSH_PARAM),))
+        params = dict(cr.fetchall())
+        cr.execute(
+            f'INSERT INTO "{self._table}" (flushed_count, dropped_count, last_flush) VALUES (%s, %s, %s)',
+            (int(params.get(SPOOL_FLUSHED_PARAM) or 0), int(params.get(SPOOL_DROPPED_PARAM) or 0),
+             params.get(SPOOL_LAST_FLUSH_PARAM) or None)
+        )
+        cr.execute("DELETE FROM ir_config_parameter WHERE key IN %s",
+                   ((SPOOL_FLUSHED_PARAM, SPOOL_DROPPED_PARAM, SPOOL_LAST_FLUSH_PARAM),))
+
+    @api.model
+    def _add(self, flushed, dropped):
+        """
+        Add to the counters in a single UPDATE: increments made by
+        concurrent flushers are serialized by the row lock, never lost
+        """
+        self.env.cr.execute(f"""
+            UPDATE "{self._table}"
+            SET flushed_count = flushed_count + %s,
+                dropped_count = dropped_count + %s,
+                last_flush = %s
+        """, (flushed, dropped, fields.Datetime.now()))
+        self.invalidate_model()
+
+    @api.model
+    def _get(self):
+        """Current counters as a dict"""
+        self.env.cr.execute(f'SELECT flushed_count, dropped_count, last_flush FROM "{self._table}" LIMIT 1')
+        row = self.env.cr.fetchone() or (0, 0, None)
+        return dict(zip(('flushed_count', 'dropped_count', 'last_flush'), row))
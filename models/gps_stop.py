@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import time
+from datetime import timedelta
+
+from odoo import models, fields, api
+
+from ..tools import geo
+
+_logger = logging.getLogger(__name__)
+
+# A stop is a run of fixes staying within STOP_RADIUS_M of their centroid,
+# slower than STOP_MAX_SPEED_KMH, for at least STOP_MIN_DURATION seconds
+STOP_RADIUS_M = 50
+STOP_MAX_SPEED_KMH = 5
+STOP_MIN_DURATION = 120
+
+# A stop is linked to the nearest job location within this distance
+STOP_JOB_MATCH_RADIUS_M = 250
+
+# GPS fixes read per detection pass
+STOP_BATCH_SIZE = 20000
+
+# A detection cron run keeps processing batches for this many seconds
+STOP_DETECT_WINDOW = 50
+
+# Single-row table holding the (ingest_txid, id) of the last GPS fix processed
+STOP_CURSOR_TABLE = 'routy_gps_stop_cursor'
+
+# Former system parameter holding the id of the last GPS fix processed
+STOP_LAST_LOG_PARAM = 'routy.gps_stop.last_log_id'
+
+
+class GPSStop(models.Model):
+    _name = 'routy.gps.stop'
+    _description = 'Driver Stop'
+    _order = 'start_time desc'
+    _rec_name = 'driver_id'
+
+    driver_id = fields.Many2one(
+        'res.users',
+        string='Driver',
+        required=True,
+        ondelete='cascade',
+        index=True
+    )
+    job_id = fields.Many2one(
+        'routy.job',
+        string='Job',
+        ondelete='set null',
+        index=True,
+        help='Job whose location is nearest to the stop'
+    )
+    start_time = fields.Datetime(
+        string='Arrived At',
+        required=True,
+        index=True
+    )
+    end_time = fields.Datetime(
+        string='Left At',
+        required=True
+    )
+    duration = fields.Float(
+        string='Duration (min)',
+        help='Time spent at the stop in minutes'
+    )
+    latitude = fields.Float(
+        string='Latitude',
+        digits=(10, 7),
+        required=True
+    )
+    longitude = fields.Float(
+        string='Longitude',
+        digits=(10, 7),
+        required=True
+    )
+    point_count = fields.Integer(
+        string='GPS Points',
+        help='Number of GPS fixes recorded during the stop'
+    )
+    job_distance = fields.Float(
+        string='Distance to Job (m)',
+        help='Distance between the stop and the location of the linked job'
+    )
+    company_id = fields.Many2one(
+        'res.company',
+        string='Company',
+        default=lambda self: self.env.company
+    )
+
+    def init(self):
+        """Create the detection cursor row, starting from the former system parameter"""
+        cr = self.env.cr
+        cr.execute(f"""
+            CREATE TABLE IF NOT EXISTS "{STOP_CURSOR_TABLE}" (
+                last_txid bigint NOT NULL,
+                last_log_id integer NOT NULL
+            )
+        """)
+        cr.execute(f'SELECT 1 FROM "{STOP_CURSOR_TABLE}" LIMIT 1')
+        if cr.fetchone():
+            return
+        cr.execute("SELECT value FROM ir_config_parameter WHERE key = %s", (STOP_LAST_LOG_PARAM,))
+        row = cr.fetchone()
+        # Fixes stored before ingest_txid existed have 0, so they are read first
+        cr.execute(f'INSERT INTO "{STOP_CURSOR_TABLE}" (last_txid, last_log_id) VALUES (0, %s)',
+                   (int(row[0]) if row else 0,))
+        cr.execute("DELETE FROM ir_config_parameter WHERE key = %s", (STOP_LAST_LOG_PARAM,))
+
+    @api.model
+    def _get_cursor(self):
+        """
+        Position of the last GPS fix processed, as an (ingest_txid, id)
+        tuple. The row is locked until the transaction ends, so two
+        detection runs never process the same fixes.
+        """
+        self.env.cr.execute(f'SELECT last_txid, last_log_id FROM "{STOP_CURSOR_TABLE}" LIMIT 1 FOR UPDATE')
+        return self.env.cr.fetchone() or (0, 0)
+
+    @api.model
+    def _set_cursor(self, last_txid, last_log_id):
+        """Move the cursor past the given GPS fix"""
+        self.env.cr.execute(f'UPDATE "{STOP_CURSOR_TABLE}" SET last_txid = %s, last_log_id = %s',
+                            (last_txid, last_log_id))
+
+    @api.model
+    def _detect_stops(self, limit=STOP_BATCH_SIZE, horizon=None):
+        """
+        Run stop detection over the GPS fixes stored since the last
+        checkpoint, in commit order. Each driver's open stop candidate is
+        kept on its routy.gps.stop.checkpoint so stops spanning several runs
+        are detected whole. Returns the number of fixes processed.
+
+        Fixes are read by the transaction that stored them, and only from
+        transactions older than `horizon` (default: the oldest one still in
+        flight, which are all committed or rolled back), so a fix committed
+        after newer ones is never skipped, only read by a later run. A fix
+        whose own timestamp is older than the driver's last processed fix
+        (e.g. an upload from a device that was offline) is read but ignored
+        by the stop state machine: the stops around it are already closed.
+        """
+        GPSLog = self.env['routy.gps.log']
+        last_txid, last_log_id = self._get_cursor()
+        if horizon is None:
+            self.env.cr.execute('SELECT txid_snapshot_xmin(txid_current_snapshot())')
+            horizon = self.env.cr.fetchone()[0]
+        self.env.cr.execute(f"""
+            SELECT id, driver_id, job_id, latitude, longitude, speed, timestamp, company_id, ingest_txid
+            FROM "{GPSLog._table}"
+            WHERE (ingest_txid, id) > (%s, %s) AND ingest_txid < %s
+            ORDER BY ingest_txid, id
+            LIMIT %s
+        """, (last_txid, last_log_id, horizon, limit))
+        fixes = self.env.cr.fetchall()
+        if not fixes:
+            return 0
+
+        fixes_by_driver = {}
+        for fix in fixes:
+            fixes_by_driver.setdefault(fix[1], []).append(fix[:8])
+
+        Checkpoint = self.env['routy.gps.stop.checkpoint']
+        checkpoints = {
+            checkpoint.driver_id.id: checkpoint
+            for checkpoint in Checkpoint.search([('driver_id', 'in', list(fixes_by_driver))])
+        }
+        missing = [driver_id for driver_id in fixes_by_driver if driver_id not in checkpoints]
+        for checkpoint in Checkpoint.create([{'driver_id': driver_id} for driver_id in missing]):
+            checkpoints[checkpoint.driver_id.id] = checkpoint
+
+        stops = []
+        for driver_id, driver_fixes in fixes_by_driver.items():
+            driver_fixes.sort(key=lambda fix: fix[6])
+            stops.extend(checkpoints[driver_id]._consume(driver_fixes))
+
+        self._match_jobs(stops)
+        self.create(stops)
+        self._set_cursor(fixes[-1][8], fixes[-1][0])
+        return len(fixes)
+
+    @api.model
+    def _match_jobs(self, stops):
+        """Link each stop (a vals dict) to the nearest location of the driver's jobs"""
+        if not stops:
+            return
+        job_ids = {job_id for stop in stops for job_id in stop.pop('_job_ids')}
+        window_start = min(stop['start_time'] for stop in stops) - timedelta(days=1)
+        window_end = max(stop['end_time'] for stop in stops) + timedelta(days=1)
+        jobs = self.env['routy.job'].sudo().search([
+            ('driver_id', 'in', list({stop['driver_id'] for stop in stops})),
+            ('scheduled_time', '>=', window_start),
+            ('scheduled_time', '<=', window_end),
+        ]) | self.env['routy.job'].sudo().browse(job_ids).exists()
+
+        jobs_by_driver = {}
+        for job in jobs:
+            if job.location_lat or job.location_lng:
+                jobs_by_driver.setdefault(job.driver_id.id, []).append(job)
+
+        for stop in stops:
+            best_job, best_distance = False, STOP_JOB_MATCH_RADIUS_M
+            for job in jobs_by_driver.get(stop['driver_id'], []):
+                distance = geo.haversine_m(stop['latitude'], stop['longitude'],
+                                           job.location_lat, job.location_lng)
+                if distance <= best_distance:
+                    best_job, best_distance = job, distance
+            stop['job_id'] = best_job and best_job.id
+            stop['job_distance'] = best_job and best_distance
+
+    @api.model
+    def _cron_detect_stops(self):
+        """Detect driver stops from new GPS fixes for up to STOP_DETECT_WINDOW seconds"""
+        try:
+            deadline = time.monotonic() + STOP_DETECT_WINDOW
+            total = 0
+            while time.monotonic() < deadline:
+                processed = self._detect_stops()
+                total += processed
+                self.env.cr.commit()
+                if processed < STOP_BATCH_SIZE:
+                    break
+            _logger.info(f'Stop detection processed {total} GPS fixes')
+        except Exception as e:
+            _logger.error(f'Error detecting driver stops: {str(e)}')
+
+
+class GPSStopCheckpoint(models.Model):
+    _name = 'routy.gps.stop.checkpoint'
+    _description = 'Driver Stop Detection State'
+    _rec_name = 'driver_id'
+
+    driver_id = fields.Many2one(
+        'res.users',
+        string='Driver',
+        required=True,
+        ondelete='cascade'
+    )
+    last_timestamp = fields.Datetime(
+        string='Last Fix',
+        help='Timestamp of the newest fix processed; older fixes received late are ignored'
+    )
+
+    # Open stop candidate, carried over to the next run
+    candidate_start = fields.Datetime(string='Candidate Start')
+    candidate_end = fields.Datetime(string='Candidate End')
+    candidate_lat = fields.Float(string='Candidate Latitude', digits=(10, 7))
+    candidate_lng = fields.Float(string='Candidate Longitude', digits=(10, 7))
+    candidate_count = fields.Integer(string='Candidate Points')
+    candidate_job_id = fields.Many2one(
+        'routy.job',
+        string='Candidate Job',
+        ondelete='set null'
+    )
+    company_id = fields.Many2one('res.company', string='Company')
+
+    _sql_constraints = [
+        ('driver_unique', 'UNIQUE(driver_id)', 'Only one stop checkpoint per driver!')
+    ]
+
+    def _consume(self, fixes):
+        """
+        Feed the driver's new fixes, sorted by timestamp, through the stop
+        state machine and store the resulting state on the checkpoint.
+        Fixes are (id, driver_id, job_id, latitude, longitude, speed,
+        timestamp, company_id) tuples. Returns vals for the closed stops.
+        """
+        self.ensure_one()
+        state = {
+            'start': self.candidate_start,
+            'end': self.candidate_end,
+            'lat': self.candidate_lat,
+            'lng': self.candidate_lng,
+            'count': self.candidate_count,
+            'job_ids': {self.candidate_job_id.id} if self.candidate_job_id else set(),
+            'company_id': self.company_id.id,
+        }
+        last_timestamp = self.last_timestamp
+        stops = []
+
+        for _id, driver_id, job_id, latitude, longitude, speed, timestamp, company_id in fixes:
+            if last_timestamp and timestamp <= last_timestamp:
+                continue
+            last_timestamp = timestamp
+            slow = (speed or 0.0) <= STOP_MAX_SPEED_KMH
+            if state['count'] and slow and geo.haversine_m(
+                    state['lat'], state['lng'], latitude, longitude) <= STOP_RADIUS_M:
+                # Still at the stop: move the running centroid
+                state['count'] += 1
+                state['lat'] += (latitude - state['lat']) / state['count']
+                state['lng'] += (longitude - state['lng']) / state['count']
+                state['end'] = timestamp
+                if job_id:
+                    state['job_ids'].add(job_id)
+                continue
+
+            if state['count']:
+                stop = self._close_candidate(state)
+                if stop:
+                    stops.append(stop)
+            if slow:
+                state.update(start=timestamp, end=timestamp, lat=latitude, lng=longitude, count=1,
+                             job_ids={job_id} if job_id else set(), company_id=company_id)
+            else:
+                state.update(start=False, end=False, lat=0.0, lng=0.0, count=0, job_ids=set())
+
+        self.write({
+            'last_timestamp': last_timestamp,
+            'candidate_start': state['start'],
+            'candidate_end': state['end'],
+            'candidate_lat': state['lat'],
+            'candidate_lng': state['lng'],
+            'candidate_count': state['count'],
+            'candidate_job_id': max(state['job_ids']) if state['job_ids'] else False,
+            'company_id': state['company_id'],
+        })
+        return stops
+
+    def _close_candidate(self, state):
+        """Return stop vals for the candidate when it lasted long enough, else None"""
+        seconds = (state['end'] - state['start']).total_seconds()
+        if seconds < STOP_MIN_DURATION:
+            return None
+        return {
+            'driver_id': self.driver_id.id,
+            'start_time': state['start'],
+            'end_time': state['end'],
+            'duration': seconds / 60.0,
+            'latitude': state['lat'],
+            'longitude': state['lng'],
+            'point_count': state['count'],
+            'company_id': state['company_id'],
+            '_job_ids': set(state['job_ids']),
+        }
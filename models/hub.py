@@ -3,6 +3,9 @@
 from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError
 
+from ..tools import geo
+from .geofence import invalidate_hubs
+
 
 class Hub(models.Model):
     _name = 'routy.hub'
@@ -54,6 +57,13 @@ class Hub(models.Model):
         digits=(10, 7),
         help='GPS Longitude coordinate'
     )
+    geohash = fields.Char(
+        string='Geohash',
+        compute='_compute_geohash',
+        store=True,
+        index=True,
+        help='Geohash cell of the hub, used for spatial lookups'
+    )
 
     # Capacity
     max_capacity = fields.Integer(
@@ -132,6 +142,35 @@ class Hub(models.Model):
         ('code_unique', 'UNIQUE(code, company_id)', 'Hub code must be unique per company!')
     ]
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        """Override create to refresh the geofence cache"""
+        hubs = super(Hub, self).create(vals_list)
+        invalidate_hubs(self.env.cr)
+        return hubs
+
+    def write(self, vals):
+        """Override write to refresh the geofence cache"""
+        result = super(Hub, self).write(vals)
+        if {'latitude', 'longitude', 'is_active', 'company_id'}.intersection(vals):
+            invalidate_hubs(self.env.cr)
+        return result
+
+    def unlink(self):
+        """Override unlink to refresh the geofence cache"""
+        result = super(Hub, self).unlink()
+        invalidate_hubs(self.env.cr)
+        return result
+
+    @api.depends('latitude', 'longitude')
+    def _compute_geohash(self):
+        """Compute the geohash cell of the hub"""
+        for record in self:
+            if record.latitude or record.longitude:
+                record.geohash = geo.geohash_encode(record.latitude, record.longitude)
+            else:
+                record.geohash = False
+
     @api.depends('max_capacity')
     def _compute_current_load(self):
         """Calculate current load based on parcels in hub"""
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+
+import logging
+from datetime import timedelta
+
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+
+from .job import JOB_BULK_ACTIONS
+
+_logger = logging.getLogger(__name__)
+
+# Keys older than this are purged; a client must not replay a journal older than that
+IDEMPOTENCY_KEY_RETENTION_DAYS = 14
+
+IDEMPOTENCY_KEY_MAX_LENGTH = 64
+
+# Job states from which replaying an action is a no-op: the action, or a later
+# step of the job, was already applied
+REPLAY_JOB_REACHED_STATES = {
+    'accept': ('accepted', 'in_progress', 'completed', 'failed'),
+    'start': ('in_progress', 'completed', 'failed'),
+    'complete': ('completed',),
+    'fail': ('failed',),
+}
+
+# Journal action recording a parcel delivery with its proof of delivery
+REPLAY_DELIVER_ACTION = 'deliver'
+
+
+class IdempotencyKey(models.Model):
+    _name = 'routy.idempotency.key'
+    _description = 'Mobile Action Idempotency Key'
+    _order = 'id'
+    _rec_name = 'key'
+    _log_access = False
+
+    driver_id = fields.Many2one(
+        'res.users',
+        string='Driver',
+        required=True,
+        ondelete='cascade'
+    )
+    key = fields.Char(
+        string='Key',
+        required=True,
+        help='Idempotency key generated by the driver app for one journaled action'
+    )
+    applied_at = fields.Datetime(
+        string='Applied At',
+        required=True,
+        default=fields.Datetime.now,
+        index=True
+    )
+
+    _sql_constraints = [
+        ('driver_key_unique', 'UNIQUE(driver_id, key)', 'Idempotency keys must be unique per driver!')
+    ]
+
+    @api.model
+    def replay(self, entries, driver_id=None):
+        """
+        Apply a journal of actions recorded offline by a driver app. Each
+        entry is {'key', 'timestamp', 'action', 'job_id' | 'parcel_id',
+        'payload'}, where action is accept/start/complete/fail on a job or
+        deliver on a parcel (payload: recipient_name, notes, signature,
+        photo). Keys already applied short-circuit with one indexed lookup;
+        the other entries run in client timestamp order, each in its own
+        savepoint, dated from the entry timestamp (never later than now).
+        An action whose target state is already reached counts as applied.
+        Returns one result per entry, in input order:
+            {'index': int, 'key': str, 'success': True, 'status': 'applied' | 'already_applied' | 'duplicate'}
+            {'index': int, 'key': str, 'success': False, 'error': str}
+        """
+        driver_id = driver_id or self.env.user.id
+        GPSLog = self.env['routy.gps.log']
+        results = [None] * len(entries)
+
+        def failure(index, key, error):
+            return {'index': index, 'key': key, 'success': False, 'error': error}
+
+        # Structural checks
+        pending = []
+        for index, entry in enumerate(entries):
+            key = entry.get('key') if isinstance(entry, dict) else None
+            if not isinstance(key, str) or not key or len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+                results[index] = failure(index, None, 'Invalid key')
+                continue
+            action = entry.get('action')
+            target = 'parcel_id' if action == REPLAY_DELIVER_ACTION else 'job_id'
+            timestamp = GPSLog._parse_fix_timestamp(entry.get('timestamp'))
+            if action not in JOB_BULK_ACTIONS and action != REPLAY_DELIVER_ACTION:
+                results[index] = failure(index, key, 'Unknown action')
+            elif not isinstance(entry.get(target), int):
+                results[index] = failure(index, key, f'Missing required field: {target}')
+            elif not isinstance(entry.get('payload') or {}, dict):
+                results[index] = failure(index, key, 'Invalid payload')
+            elif not timestamp:
+                results[index] = failure(index, key, 'Invalid timestamp')
+            else:
+                pending.append((timestamp, index, entry))
+
+        # Keys applied by an earlier replay, in one indexed lookup
+        keys = list({entry['key'] for _timestamp, _index, entry in pending})
+        self.env.cr.execute(
+            f'SELECT key FROM "{self._table}" WHERE driver_id = %s AND key = ANY(%s)',
+            (driver_id, keys)
+        )
+        seen = {key for key, in self.env.cr.fetchall()}
+
+        # Ownership of the jobs and parcels still to apply, one query per
+        # model; a journal sent again reads none
+        unseen = [entry for _timestamp, _index, entry in pending if entry['key'] not in seen]
+        job_ids = [e['job_id'] for e in unseen if e['action'] != REPLAY_DELIVER_ACTION]
+        parcel_ids = [e['parcel_id'] for e in unseen if e['action'] == REPLAY_DELIVER_ACTION]
+        owners = {}
+        if job_ids:
+            jobs = self.env['routy.job'].sudo().search_fetch([('id', 'in', job_ids)], ['driver_id', 'state'])
+            owners.update({('job_id', job.id): job.driver_id.id for job in jobs})
+        if parcel_ids:
+            parcels = self.env['routy.parcel'].sudo().search_fetch(
+                [('id', 'in', parcel_ids)], ['assigned_driver_id', 'state'])
+            owners.update({('parcel_id', parcel.id): parcel.assigned_driver_id.id for parcel in parcels})
+
+        now = fields.Datetime.now()
+        applied_keys = []
+        for timestamp, index, entry in sorted(pending, key=lambda item: (item[0], item[1])):
+            key = entry['key']
+            if key in seen:
+                results[index] = {'index': index, 'key': key, 'success': True, 'status': 'duplicate'}
+                continue
+            target = 'parcel_id' if entry['action'] == REPLAY_DELIVER_ACTION else 'job_id'
+            owner = owners.get((target, entry[target]))
+            if owner is None:
+                results[index] = failure(index, key, 'Job not found' if target == 'job_id' else 'Parcel not found')
+                continue
+            if owner != driver_id:
+                results[index] = failure(index, key, 'Not authorized')
+                continue
+            try:
+                with self.env.cr.savepoint():
+                    status = self._replay_entry(entry, min(timestamp.replace(microsecond=0), now))
+            except (UserError, ValueError, TypeError) as e:
+                # ValueError / TypeError: undecodable base64 in a delivery payload
+                results[index] = failure(index, key, str(e))
+                continue
+            results[index] = {'index': index, 'key': key, 'success': True, 'status': status}
+            seen.add(key)
+            applied_keys.append(key)
+
+        if applied_keys:
+            # A concurrent replay of the same journal may have stored some keys already
+            self.env.cr.execute(f"""
+                INSERT INTO "{self._table}" (driver_id, key, applied_at)
+                SELECT %s, unnest(%s::varchar[]), now() AT TIME ZONE 'UTC'
+                ON CONFLICT DO NOTHING
+            """, (driver_id, applied_keys))
+        return results
+
+    @api.model
+    def _replay_entry(self, entry, timestamp):
+        """Apply one journal entry as of `timestamp`, returning 'applied' or 'already_applied'"""
+        self = self.with_context(routy_action_time=timestamp)
+        if entry['action'] == REPLAY_DELIVER_ACTION:
+            parcel = self.env['routy.parcel'].browse(entry['parcel_id'])
+            if parcel.state == 'delivered':
+                return 'already_applied'
+            parcel._deliver_with_pod(entry.get('payload') or {})
+            return 'applied'
+
+        job = self.env['routy.job'].browse(entry['job_id'])
+        if job.state in REPLAY_JOB_REACHED_STATES[entry['action']]:
+            return 'already_applied'
+        job._apply_bulk_run(entry['action'], [entry])
+        return 'applied'
+
+    @api.model
+    def _cron_clean_keys(self):
+        """Purge idempotency keys older than IDEMPOTENCY_KEY_RETENTION_DAYS"""
+        try:
+            cutoff = fields.Datetime.now() - timedelta(days=IDEMPOTENCY_KEY_RETENTION_DAYS)
+            self.env.cr.execute(f'DELETE FROM "{self._table}" WHERE applied_at < %s', (cutoff,))
+            _logger.info(f'Deleted {self.env.cr.rowcount} idempotency keys')
+        except Exception as e:
+            _logger.error(f'Error cleaning idempotency keys: {str(e)}')
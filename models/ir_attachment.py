@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import os
+import tempfile
+
+from odoo import models, api
+
+# Bytes read from an upload stream at a time
+ATTACHMENT_STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class IrAttachment(models.Model):
+    _inherit = 'ir.attachment'
+
+    @api.model
+    def _file_write_stream(self, stream, max_bytes, chunk_size=ATTACHMENT_STREAM_CHUNK_SIZE):
+        """
+        Copy a binary stream into the filestore chunk by chunk, hashing it on
+        the way, so the content is never held in memory as a whole.
+        Returns (store_fname, checksum, file_size); raises ValueError when
+        the stream is longer than `max_bytes`.
+        """
+        root = self._full_path('')
+        os.makedirs(root, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix='.upload-', dir=root)
+        try:
+            sha = hashlib.sha1()
+            size = 0
+            with os.fdopen(fd, 'wb') as tmp:
+                while True:
+                    chunk = stream.read(chunk_size)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise ValueError('File too large')
+                    sha.update(chunk)
+                    tmp.write(chunk)
+
+            # Same layout as _file_write: files are named and deduplicated by checksum
+            checksum = sha.hexdigest()
+            fname = checksum[:2] + '/' + checksum
+            full_path = self._full_path(fname)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            if os.path.isfile(full_path):
+                os.unlink(tmp_path)
+            else:
+                os.replace(tmp_path, full_path)
+            self._mark_for_gc(fname)
+            return fname, checksum, size
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
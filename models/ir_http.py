@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+
+from werkzeug.exceptions import LengthRequired, RequestEntityTooLarge, Unauthorized
+
+from odoo import models
+from odoo.http import request
+
+
+class IrHttp(models.AbstractModel):
+    _inherit = 'ir.http'
+
+    @classmethod
+    def _auth_method_routy_token(cls):
+        """
+        Authenticate driver app requests with an `Authorization: Bearer`
+        routy.api.token, falling back to the session cookie without one
+        """
+        authorization = request.httprequest.headers.get('Authorization', '')
+        if not authorization.startswith('Bearer '):
+            return cls._auth_method_user()
+        user_id = request.env['routy.api.token'].sudo()._resolve(authorization[7:].strip())
+        if not user_id:
+            raise Unauthorized('Invalid or expired token')
+        request.update_env(user=user_id)
+
+    @classmethod
+    def _pre_dispatch(cls, rule, args):
+        """
+        Enforce the `routy_max_body` routing option (bytes) before the
+        dispatcher reads the request: multipart forms are parsed before the
+        endpoint runs, so the endpoint itself would check their size too late
+        """
+        max_body = rule.endpoint.routing.get('routy_max_body')
+        if max_body:
+            content_length = request.httprequest.content_length
+            if not content_length:
+                raise LengthRequired()
+            if content_length > max_body:
+                raise RequestEntityTooLarge()
+        super(IrHttp, cls)._pre_dispatch(rule, args)
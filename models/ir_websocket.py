@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models
+
+from .driver_position import FLEET_CHANNEL
+
+
+class IrWebsocket(models.AbstractModel):
+    _inherit = 'ir.websocket'
+
+    def _build_bus_channel_list(self, channels):
+        """Subscribe dispatchers to the live fleet feed of their companies"""
+        channels = super()._build_bus_channel_list(channels)
+        if self.env.uid and self.env.user.has_group('routy.group_dispatcher'):
+            channels = list(channels) + [(company, FLEET_CHANNEL) for company in self.env.user.company_ids]
+        return channels
@@ -1,8 +1,27 @@
 # -*- coding: utf-8 -*-
 
+from datetime import timedelta
+
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError, ValidationError
 
+from ..tools import geo
+from .geofence import invalidate_driver_jobs
+
+# Job fields cached by the geofence engine
+GEOFENCE_FIELDS = {'driver_id', 'state', 'location_lat', 'location_lng'}
+
+# Actions accepted by apply_bulk_actions, mapped to the job method they call
+JOB_BULK_ACTIONS = {
+    'accept': 'action_accept',
+    'start': 'action_start',
+    'complete': 'action_complete',
+    'fail': 'action_fail',
+}
+
+# Job fields a bulk action item may set through its payload
+JOB_BULK_PAYLOAD_FIELDS = ('notes', 'failure_reason')
+
 
 class Job(models.Model):
     _name = 'routy.job'
@@ -87,6 +106,41 @@ class Job(models.Model):
         help='Duration from start to completion'
     )
 
+    # Odometer (measured from GPS logs)
+    distance_km = fields.Float(
+        string='Distance (km)',
+        digits=(10, 2),
+        readonly=True,
+        help='Distance driven, measured from GPS logs when the job completes'
+    )
+    moving_time = fields.Float(
+        string='Moving Time (Hours)',
+        readonly=True,
+        help='Time spent driving, measured from GPS logs'
+    )
+    idle_time = fields.Float(
+        string='Idle Time (Hours)',
+        readonly=True,
+        help='Time spent stationary, measured from GPS logs'
+    )
+    odometer_updated_at = fields.Datetime(
+        string='Odometer Updated At',
+        readonly=True,
+        copy=False
+    )
+    stop_ids = fields.One2many(
+        'routy.gps.stop',
+        'job_id',
+        string='Stops',
+        readonly=True
+    )
+    dwell_time = fields.Float(
+        string='Dwell Time (Hours)',
+        compute='_compute_dwell_time',
+        store=True,
+        help='Time spent at stops linked to this job, detected from GPS logs'
+    )
+
     # Relations
     gps_log_ids = fields.One2many(
         'routy.gps.log',
@@ -141,6 +195,12 @@ class Job(models.Model):
         for record in self:
             record.gps_log_count = len(record.gps_log_ids)
 
+    @api.depends('stop_ids.duration')
+    def _compute_dwell_time(self):
+        """Sum the duration of the job's stops"""
+        for record in self:
+            record.dwell_time = sum(record.stop_ids.mapped('duration')) / 60.0
+
     @api.depends('parcel_ids')
     def _compute_parcel_count(self):
         """Compute parcel count"""
@@ -164,7 +224,41 @@ class Job(models.Model):
             vals['name'] = self.env['ir.sequence'].next_by_code(
                 'routy.job'
             ) or 'New'
-        return super(Job, self).create(vals)
+        job = super(Job, self).create(vals)
+        if job.driver_id:
+            invalidate_driver_jobs(self.env.cr, job.driver_id.ids)
+        return job
+
+    def write(self, vals):
+        """
+        Override write to refresh the geofence cache of the drivers
+        and to leave sync tombstones for drivers a job is taken from
+        """
+        if not GEOFENCE_FIELDS.intersection(vals):
+            return super(Job, self).write(vals)
+        driver_ids = set(self.mapped('driver_id').ids)
+        if 'driver_id' in vals:
+            driver_ids.add(vals['driver_id'])
+            self.env['routy.sync.tombstone']._record(self._name, [
+                (job.driver_id.id, job.id) for job in self
+                if job.driver_id and job.driver_id.id != vals['driver_id']
+            ])
+        result = super(Job, self).write(vals)
+        invalidate_driver_jobs(self.env.cr, driver_ids)
+        return result
+
+    def unlink(self):
+        """
+        Override unlink to refresh the geofence cache of the drivers
+        and to leave sync tombstones for them
+        """
+        self.env['routy.sync.tombstone']._record(self._name, [
+            (job.driver_id.id, job.id) for job in self if job.driver_id
+        ])
+        driver_ids = self.mapped('driver_id').ids
+        result = super(Job, self).unlink()
+        invalidate_driver_jobs(self.env.cr, driver_ids)
+        return result
 
     @api.onchange('service_request_id', 'job_type')
     def _onchange_service_request_job_type(self):
@@ -184,72 +278,196 @@ class Job(models.Model):
                 self.contact_name = sr.delivery_contact
                 self.contact_phone = sr.delivery_phone
 
+    def _action_time(self):
+        """
+        When an action happened: the client time of an action replayed from
+        an offline journal (context key routy_action_time), else now
+        """
+        return self.env.context.get('routy_action_time') or fields.Datetime.now()
+
     def action_accept(self):
-        """Driver accepts the job"""
-        for record in self:
-            if record.state != 'assigned':
-                raise UserError(_('Only assigned jobs can be accepted.'))
-            record.write({'state': 'accepted'})
+        """Driver accepts the jobs"""
+        if self.filtered(lambda r: r.state != 'assigned'):
+            raise UserError(_('Only assigned jobs can be accepted.'))
+        self.write({'state': 'accepted'})
         return True
 
     def action_start(self):
-        """Start the job"""
-        for record in self:
-            if record.state not in ['accepted', 'assigned']:
-                raise UserError(_('Only accepted or assigned jobs can be started.'))
-            record.write({
-                'state': 'in_progress',
-                'started_at': fields.Datetime.now()
-            })
-            # Update service request state
-            if record.service_request_id.state == 'assigned':
-                record.service_request_id.write({'state': 'in_progress'})
+        """Start the jobs"""
+        if self.filtered(lambda r: r.state not in ['accepted', 'assigned']):
+            raise UserError(_('Only accepted or assigned jobs can be started.'))
+        self.write({
+            'state': 'in_progress',
+            'started_at': self._action_time()
+        })
+        # Update service request state
+        self.service_request_id.filtered(lambda sr: sr.state == 'assigned').write({'state': 'in_progress'})
         return True
 
     def action_complete(self):
-        """Complete the job"""
-        for record in self:
-            if record.state != 'in_progress':
-                raise UserError(_('Only in-progress jobs can be completed.'))
-
-            # Update parcels
-            if record.job_type == 'pickup':
-                record.parcel_ids.action_mark_picked()
-                record.service_request_id.write({
-                    'actual_pickup_date': fields.Datetime.now()
-                })
-            elif record.job_type == 'delivery':
-                # Check if all parcels have POD
-                parcels_without_pod = record.parcel_ids.filtered(
-                    lambda p: not p.pod_signature and not p.pod_photo
-                )
-                if parcels_without_pod:
-                    raise UserError(_(
-                        'Please provide proof of delivery for all parcels before completing the job.'
-                    ))
+        """Complete the jobs"""
+        if self.filtered(lambda r: r.state != 'in_progress'):
+            raise UserError(_('Only in-progress jobs can be completed.'))
 
-            record.write({
-                'state': 'completed',
-                'completed_at': fields.Datetime.now()
-            })
+        # Check if all parcels of the deliveries have POD
+        deliveries = self.filtered(lambda r: r.job_type == 'delivery')
+        if deliveries.parcel_ids.filtered(lambda p: not p.pod_signature and not p.pod_photo):
+            raise UserError(_(
+                'Please provide proof of delivery for all parcels before completing the job.'
+            ))
+
+        # Update parcels
+        now = self._action_time()
+        pickups = self.filtered(lambda r: r.job_type == 'pickup')
+        pickups.parcel_ids.action_mark_picked()
+        pickups.service_request_id.write({'actual_pickup_date': now})
+
+        self.write({
+            'state': 'completed',
+            'completed_at': now
+        })
+        self._update_odometer()
         return True
 
     def action_fail(self):
-        """Mark job as failed"""
-        for record in self:
-            if record.state not in ['in_progress', 'accepted']:
-                raise UserError(_('Only accepted or in-progress jobs can be marked as failed.'))
-            if not record.failure_reason:
-                raise UserError(_('Please provide a failure reason.'))
+        """Mark the jobs as failed"""
+        if self.filtered(lambda r: r.state not in ['in_progress', 'accepted']):
+            raise UserError(_('Only accepted or in-progress jobs can be marked as failed.'))
+        if self.filtered(lambda r: not r.failure_reason):
+            raise UserError(_('Please provide a failure reason.'))
+
+        self.write({
+            'state': 'failed',
+            'completed_at': self._action_time()
+        })
+        # Mark parcels as failed
+        self.filtered(lambda r: r.job_type == 'delivery').parcel_ids.write({'state': 'failed'})
+        return True
 
+    @api.model
+    def apply_bulk_actions(self, items, driver_id=None):
+        """
+        Apply a list of {'job_id', 'action', 'payload'} items sent by a driver
+        app, in order. Ownership of every job is checked with one query.
+        Consecutive items with the same action run as one call of the job
+        method on the whole set inside a savepoint; when that fails, the
+        items are retried one by one in their own savepoints so only the
+        faulty ones are reported. Returns one result per item, in order:
+            {'index': int, 'job_id': int, 'success': True, 'state': str}
+            {'index': int, 'job_id': int, 'success': False, 'error': str}
+        """
+        driver_id = driver_id or self.env.user.id
+        results = [None] * len(items)
+
+        def failure(index, job_id, error):
+            return {'index': index, 'job_id': job_id, 'success': False, 'error': error}
+
+        job_ids = {
+            item.get('job_id') for item in items
+            if isinstance(item, dict) and isinstance(item.get('job_id'), int)
+        }
+        jobs = self.sudo().search_fetch([('id', 'in', list(job_ids))], ['driver_id'])
+        owned_job_ids = {job.id for job in jobs if job.driver_id.id == driver_id}
+        existing_job_ids = set(jobs.ids)
+
+        # Runs of consecutive valid items sharing an action, each job once per run
+        runs = []
+        for index, item in enumerate(items):
+            if not isinstance(item, dict) or not isinstance(item.get('job_id'), int):
+                results[index] = failure(index, None, 'Missing required field: job_id')
+                continue
+            error = None
+            if item.get('action') not in JOB_BULK_ACTIONS:
+                error = 'Unknown action'
+            elif not isinstance(item.get('payload') or {}, dict):
+                error = 'Invalid payload'
+            elif item['job_id'] not in existing_job_ids:
+                error = 'Job not found'
+            elif item['job_id'] not in owned_job_ids:
+                error = 'Not authorized'
+            if error:
+                results[index] = failure(index, item['job_id'], error)
+                continue
+            run = runs[-1] if runs else None
+            if not run or run[0] != item['action'] or any(
+                    items[i]['job_id'] == item['job_id'] for i in run[1]):
+                run = (item['action'], [])
+                runs.append(run)
+            run[1].append(index)
+
+        for action, indexes in runs:
+            try:
+                with self.env.cr.savepoint():
+                    self._apply_bulk_run(action, [items[i] for i in indexes])
+            except UserError as e:
+                if len(indexes) == 1:
+                    results[indexes[0]] = failure(indexes[0], items[indexes[0]]['job_id'], str(e))
+                else:
+                    # Find the faulty items, keeping the others applied
+                    for index in indexes:
+                        try:
+                            with self.env.cr.savepoint():
+                                self._apply_bulk_run(action, [items[index]])
+                        except UserError as e:
+                            results[index] = failure(index, items[index]['job_id'], str(e))
+            for index in indexes:
+                if results[index] is None:
+                    job = self.browse(items[index]['job_id'])
+                    results[index] = {
+                        'index': index,
+                        'job_id': job.id,
+                        'success': True,
+                        'state': job.state,
+                    }
+        return results
+
+    def _apply_bulk_run(self, action, items):
+        """Write the items' payloads, then call the action once on all their jobs"""
+        jobs = self.browse([item['job_id'] for item in items])
+        for item in items:
+            payload = {
+                name: value for name, value in (item.get('payload') or {}).items()
+                if name in JOB_BULK_PAYLOAD_FIELDS
+            }
+            if payload:
+                self.browse(item['job_id']).write(payload)
+        getattr(jobs, JOB_BULK_ACTIONS[action])()
+
+    def _update_odometer(self):
+        """Measure distance, moving time and idle time from the jobs' GPS logs"""
+        if not self:
+            return
+        GPSLog = self.env['routy.gps.log']
+        first_date = min(self.mapped('create_date')).date() - timedelta(days=1)
+        query = GPSLog._search([
+            ('job_id', 'in', self.ids),
+            ('date', '>=', first_date),
+        ], order='job_id, timestamp asc')
+        self.env.cr.execute(query.select(
+            f'"{GPSLog._table}"."job_id"',
+            f'"{GPSLog._table}"."latitude"',
+            f'"{GPSLog._table}"."longitude"',
+            f'extract(epoch from "{GPSLog._table}"."timestamp")',
+            f'"{GPSLog._table}"."accuracy"',
+        ))
+
+        tracks = {job_id: ([], [], [], []) for job_id in self.ids}
+        for job_id, latitude, longitude, epoch, accuracy in self.env.cr.fetchall():
+            lats, lngs, timestamps, accuracies = tracks[job_id]
+            lats.append(latitude)
+            lngs.append(longitude)
+            timestamps.append(float(epoch))
+            accuracies.append(accuracy)
+
+        now = fields.Datetime.now()
+        for record in self:
+            distance_m, moving_s, idle_s = geo.track_metrics(*tracks[record.id])
             record.write({
-                'state': 'failed',
-                'completed_at': fields.Datetime.now()
+                'distance_km': distance_m / 1000.0,
+                'moving_time': moving_s / 3600.0,
+                'idle_time': idle_s / 3600.0,
+                'odometer_updated_at': now,
             })
-            # Mark parcels as failed
-            if record.job_type == 'delivery':
-                record.parcel_ids.write({'state': 'failed'})
-        return True
 
     def action_view_gps_logs(self):
         """Smart button to view GPS logs"""
@@ -3,6 +3,8 @@
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError, ValidationError
 
+from ..tools import geo
+
 
 class Linehaul(models.Model):
     _name = 'routy.linehaul'
@@ -100,6 +102,12 @@ class Linehaul(models.Model):
         digits=(10, 2),
         help='Distance in kilometers'
     )
+    actual_distance_km = fields.Float(
+        string='Actual Distance (km)',
+        digits=(10, 2),
+        readonly=True,
+        help="Distance driven, measured from the driver's GPS logs on arrival"
+    )
     duration_hours = fields.Float(
         string='Duration (Hours)',
         compute='_compute_duration',
@@ -235,8 +243,37 @@ class Linehaul(models.Model):
                 'state': 'arrived',
                 'actual_arrival': fields.Datetime.now()
             })
+        self._update_odometer()
         return True
 
+    def _update_odometer(self):
+        """Measure the distance driven between departure and arrival from GPS logs"""
+        GPSLog = self.env['routy.gps.log']
+        for record in self:
+            if not (record.driver_id and record.actual_departure and record.actual_arrival):
+                continue
+            query = GPSLog._search([
+                ('driver_id', '=', record.driver_id.id),
+                ('date', '>=', record.actual_departure.date()),
+                ('date', '<=', record.actual_arrival.date()),
+                ('timestamp', '>=', record.actual_departure),
+                ('timestamp', '<=', record.actual_arrival),
+            ], order='timestamp asc')
+            self.env.cr.execute(query.select(
+                f'"{GPSLog._table}"."latitude"',
+                f'"{GPSLog._table}"."longitude"',
+                f'extract(epoch from "{GPSLog._table}"."timestamp")',
+                f'"{GPSLog._table}"."accuracy"',
+            ))
+            rows = self.env.cr.fetchall()
+            distance_m, _moving_s, _idle_s = geo.track_metrics(
+                [row[0] for row in rows],
+                [row[1] for row in rows],
+                [float(row[2]) for row in rows],
+                [row[3] for row in rows],
+            )
+            record.write({'actual_distance_km': distance_m / 1000.0})
+
     def action_cancel(self):
         """Cancel the linehaul"""
         for record in self:
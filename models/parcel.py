@@ -1,8 +1,24 @@
 # -*- coding: utf-8 -*-
 
+import base64
+import logging
+
+import pytz
+
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError, ValidationError
 
+from ..tools import pod_image
+
+_logger = logging.getLogger(__name__)
+
+# Parcels whose POD photo is processed per cron run
+POD_IMAGE_BATCH_SIZE = 50
+
+# Photo fields written by the POD image processing, shared between parcels with identical photos
+POD_PHOTO_FILE_FIELDS = ('pod_photo', 'pod_photo_thumbnail', 'pod_photo_print')
+POD_PHOTO_EXIF_FIELDS = ('pod_photo_taken_at', 'pod_photo_latitude', 'pod_photo_longitude')
+
 
 class Parcel(models.Model):
     _name = 'routy.parcel'
@@ -103,6 +119,51 @@ class Parcel(models.Model):
         help='Photo proof of delivery',
         attachment=True
     )
+    pod_photo_thumbnail = fields.Binary(
+        string='Delivery Photo Thumbnail',
+        help='Small version of the delivery photo shown in the backend',
+        attachment=True,
+        readonly=True,
+        copy=False
+    )
+    pod_photo_print = fields.Binary(
+        string='Delivery Photo (Print)',
+        help='Print resolution JPEG of the delivery photo used by the delivery note',
+        attachment=True,
+        readonly=True,
+        copy=False
+    )
+    pod_image_state = fields.Selection([
+        ('pending', 'Pending'),
+        ('done', 'Processed'),
+        ('failed', 'Failed')
+    ], string='Photo Processing', readonly=True, copy=False, index='btree_not_null')
+    pod_photo_checksum = fields.Char(
+        string='Photo Checksum',
+        readonly=True,
+        copy=False,
+        index='btree_not_null',
+        help='SHA-1 of the photo as uploaded; identical photos reuse the processed files'
+    )
+    pod_photo_taken_at = fields.Datetime(
+        string='Photo Taken At',
+        readonly=True,
+        copy=False,
+        help='Capture time recorded by the camera'
+    )
+    pod_photo_latitude = fields.Float(
+        string='Photo Latitude',
+        digits=(10, 7),
+        readonly=True,
+        copy=False,
+        help='Position recorded by the camera'
+    )
+    pod_photo_longitude = fields.Float(
+        string='Photo Longitude',
+        digits=(10, 7),
+        readonly=True,
+        copy=False
+    )
     pod_notes = fields.Text(
         string='Delivery Notes',
         help='Notes from delivery'
@@ -165,7 +226,25 @@ class Parcel(models.Model):
             vals['name'] = self.env['ir.sequence'].next_by_code(
                 'routy.parcel'
             ) or 'New'
-        return super(Parcel, self).create(vals)
+        if vals.get('pod_photo'):
+            vals['pod_image_state'] = 'pending'
+        parcel = super(Parcel, self).create(vals)
+        if parcel.pod_image_state == 'pending':
+            parcel._queue_pod_processing()
+        return parcel
+
+    def write(self, vals):
+        """Override write to queue new POD photos for processing"""
+        if 'pod_photo' not in vals or self.env.context.get('routy_pod_processed'):
+            return super(Parcel, self).write(vals)
+        vals = dict(vals, pod_image_state='pending' if vals['pod_photo'] else False)
+        if not vals['pod_photo']:
+            vals.update({field_name: False for field_name in POD_PHOTO_FILE_FIELDS + POD_PHOTO_EXIF_FIELDS})
+            vals['pod_photo_checksum'] = False
+        result = super(Parcel, self).write(vals)
+        if vals['pod_image_state']:
+            self._queue_pod_processing()
+        return result
 
     def action_mark_picked(self):
         """Mark parcel as picked up"""
@@ -214,6 +293,163 @@ class Parcel(models.Model):
                 })
         return True
 
+    def _deliver_with_pod(self, data):
+        """
+        Record the delivery of the parcels from a driver app's POD `data`:
+        recipient_name, notes and base64 signature / photo. The delivery is
+        dated from the routy_action_time context key when it is replayed.
+        """
+        update_vals = {
+            'state': 'delivered',
+            'delivered_at': self.env.context.get('routy_action_time') or fields.Datetime.now(),
+            'recipient_name': data.get('recipient_name', ''),
+            'pod_notes': data.get('notes', ''),
+        }
+        if data.get('signature'):
+            update_vals['pod_signature'] = base64.b64decode(data['signature'])
+        if data.get('photo'):
+            update_vals['pod_photo'] = base64.b64decode(data['photo'])
+        self.write(update_vals)
+        return True
+
+    def _attach_pod_stream(self, field_name, stream, mimetype, max_bytes):
+        """
+        Store an uploaded POD image read from `stream` as the attachment
+        behind the binary field `field_name` (pod_photo or pod_signature),
+        replacing the previous one. With file storage the upload is
+        streamed to the filestore; raises ValueError past `max_bytes`.
+        """
+        self.ensure_one()
+        Attachment = self.env['ir.attachment'].sudo()
+        vals = {
+            'name': field_name,
+            'res_model': self._name,
+            'res_id': self.id,
+            'res_field': field_name,
+            'mimetype': mimetype,
+        }
+        if Attachment._storage() == 'file':
+            store_fname, checksum, file_size = Attachment._file_write_stream(stream, max_bytes)
+            vals.update(store_fname=store_fname, checksum=checksum, file_size=file_size)
+        else:
+            raw = stream.read(max_bytes + 1)
+            if len(raw) > max_bytes:
+                raise ValueError('File too large')
+            vals['raw'] = raw
+
+        Attachment.search([
+            ('res_model', '=', self._name),
+            ('res_id', '=', self.id),
+            ('res_field', '=', field_name),
+        ]).unlink()
+        attachment = Attachment.create(vals)
+        self.invalidate_recordset([field_name])
+        if field_name == 'pod_photo':
+            self.write({'pod_image_state': 'pending'})
+            self._queue_pod_processing()
+        return attachment
+
+    def _queue_pod_processing(self):
+        """Wake up the POD image processing cron"""
+        cron = self.env.ref('routy.cron_process_pod_images', raise_if_not_found=False)
+        if cron:
+            cron.sudo()._trigger()
+
+    def _get_pod_attachments(self, field_names):
+        """Attachments behind the given binary fields of the parcel, by field name"""
+        self.ensure_one()
+        attachments = self.env['ir.attachment'].sudo().search([
+            ('res_model', '=', self._name),
+            ('res_id', '=', self.id),
+            ('res_field', 'in', list(field_names)),
+        ])
+        return {attachment.res_field: attachment for attachment in attachments}
+
+    def _process_pod_image(self):
+        """
+        Produce the thumbnail and print variants of the POD photo, re-encode
+        the original without its metadata and keep the EXIF capture time
+        and position as fields. A photo identical to one already processed
+        for another parcel reuses that parcel's files.
+        """
+        self.ensure_one()
+        original = self._get_pod_attachments(['pod_photo']).get('pod_photo')
+        if not original:
+            self.write({'pod_image_state': False})
+            return
+
+        checksum = original.checksum
+        twin = self.search([
+            ('pod_photo_checksum', '=', checksum),
+            ('pod_image_state', '=', 'done'),
+            ('id', '!=', self.id),
+        ], limit=1)
+        if twin:
+            self._link_pod_files(twin)
+            vals = {field_name: twin[field_name] for field_name in POD_PHOTO_EXIF_FIELDS}
+        else:
+            result = pod_image.process_photo(original.raw)
+            vals = {
+                'pod_photo': base64.b64encode(result['original']),
+                'pod_photo_thumbnail': base64.b64encode(result['thumbnail']),
+                'pod_photo_print': base64.b64encode(result['print']),
+                'pod_photo_taken_at': self._pod_photo_utc(result['taken_at']),
+                'pod_photo_latitude': result['latitude'] or 0.0,
+                'pod_photo_longitude': result['longitude'] or 0.0,
+            }
+        vals.update(pod_photo_checksum=checksum, pod_image_state='done')
+        self.with_context(routy_pod_processed=True).write(vals)
+
+    def _link_pod_files(self, source):
+        """Point the photo fields of the parcel at the stored files of `source`"""
+        Attachment = self.env['ir.attachment'].sudo()
+        for attachment in self._get_pod_attachments(POD_PHOTO_FILE_FIELDS).values():
+            attachment.unlink()
+        for attachment in source._get_pod_attachments(POD_PHOTO_FILE_FIELDS).values():
+            if attachment.store_fname:
+                # Same file in the filestore, nothing is read or written
+                Attachment.create({
+                    'name': attachment.name,
+                    'res_model': self._name,
+                    'res_id': self.id,
+                    'res_field': attachment.res_field,
+                    'mimetype': attachment.mimetype,
+                    'store_fname': attachment.store_fname,
+                    'checksum': attachment.checksum,
+                    'file_size': attachment.file_size,
+                })
+            else:
+                attachment.copy({'res_id': self.id})
+        self.invalidate_recordset(list(POD_PHOTO_FILE_FIELDS))
+
+    def _pod_photo_utc(self, taken_at):
+        """UTC capture time of a photo; naive EXIF times are in the driver's timezone"""
+        if not taken_at:
+            return False
+        if not taken_at.tzinfo:
+            taken_at = pytz.timezone(self.assigned_driver_id.tz or 'UTC').localize(taken_at)
+        return taken_at.astimezone(pytz.utc).replace(tzinfo=None)
+
+    @api.model
+    def _cron_process_pod_images(self):
+        """Process the POD photos queued for processing"""
+        try:
+            parcels = self.search([('pod_image_state', '=', 'pending')], limit=POD_IMAGE_BATCH_SIZE)
+            for parcel in parcels:
+                try:
+                    with self.env.cr.savepoint():
+                        parcel._process_pod_image()
+                except Exception as e:
+                    _logger.warning(f'Could not process POD photo of parcel {parcel.name}: {str(e)}')
+                    parcel.write({'pod_image_state': 'failed'})
+                if not self.env.registry.in_test_mode():
+                    self.env.cr.commit()
+            if len(parcels) == POD_IMAGE_BATCH_SIZE:
+                self._queue_pod_processing()
+            _logger.info(f'Processed {len(parcels)} POD photos')
+        except Exception as e:
+            _logger.error(f'Error processing POD photos: {str(e)}')
+
     def action_mark_failed(self):
         """Mark delivery as failed"""
         for record in self:
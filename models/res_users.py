@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models
+
+from .api_token import invalidate_tokens
+
+
+class ResUsers(models.Model):
+    _inherit = 'res.users'
+
+    def write(self, vals):
+        """Override write so archived users lose their cached API tokens"""
+        result = super().write(vals)
+        if 'active' in vals:
+            invalidate_tokens(self.env.cr)
+        return result
@@ -58,6 +58,13 @@ class RoutePlan(models.Model):
         digits=(10, 2),
         help='Total estimated distance for all jobs'
     )
+    actual_distance_km = fields.Float(
+        string='Actual Distance (km)',
+        digits=(10, 2),
+        compute='_compute_actual_distance',
+        store=True,
+        help='Distance driven for all jobs, measured from GPS logs'
+    )
     estimated_duration = fields.Float(
         string='Estimated Duration (Hours)',
         help='Estimated total duration for route'
@@ -123,6 +130,12 @@ class RoutePlan(models.Model):
                 lambda j: j.state in ['assigned', 'accepted', 'in_progress']
             ))
 
+    @api.depends('job_ids.distance_km')
+    def _compute_actual_distance(self):
+        """Sum the measured distance of the route's jobs"""
+        for record in self:
+            record.actual_distance_km = sum(record.job_ids.mapped('distance_km'))
+
     @api.depends('job_count', 'completed_jobs')
     def _compute_completion_rate(self):
         """Calculate completion rate"""
@@ -141,6 +154,83 @@ class RoutePlan(models.Model):
             vals['name'] = _('Route - %s - %s') % (driver.name, date)
         return super(RoutePlan, self).create(vals)
 
+    def _get_day_bundle(self):
+        """
+        Everything the driver app needs to run the route: the plan, its jobs
+        in visiting order, their parcels and contacts. Built with a fixed
+        number of batched reads whatever the number of jobs and parcels.
+        """
+        self.ensure_one()
+        plan = self.read([
+            'name', 'date', 'state', 'job_count', 'completed_jobs', 'pending_jobs',
+            'total_distance_km', 'estimated_duration',
+        ])[0]
+        jobs = self.env['routy.job'].search_read(
+            [('route_plan_id', '=', self.id)],
+            ['name', 'job_type', 'state', 'service_request_id', 'customer_id', 'location_address',
+             'location_lat', 'location_lng', 'contact_name', 'contact_phone', 'scheduled_time',
+             'notes', 'parcel_ids'],
+            order='scheduled_time asc, id asc',
+        )
+        # The driver's jobs were checked above; their parcels and requests are read as is
+        parcels = {parcel['id']: parcel for parcel in self.env['routy.parcel'].sudo().browse(
+            sorted({parcel_id for job in jobs for parcel_id in job['parcel_ids']})
+        ).read(['name', 'description', 'weight', 'declared_value', 'state'])}
+        service_requests = {sr['id']: sr for sr in self.env['routy.service_request'].sudo().browse(
+            sorted({job['service_request_id'][0] for job in jobs})
+        ).read(['name', 'cod_amount'])}
+
+        job_list = []
+        for sequence, job in enumerate(jobs, 1):
+            service_request = service_requests[job['service_request_id'][0]]
+            job_list.append({
+                'id': job['id'],
+                'sequence': sequence,
+                'name': job['name'],
+                'job_type': job['job_type'],
+                'state': job['state'],
+                'scheduled_time': job['scheduled_time'] or None,
+                'customer_name': job['customer_id'][1] if job['customer_id'] else '',
+                'location': {
+                    'address': job['location_address'],
+                    'lat': job['location_lat'],
+                    'lng': job['location_lng'],
+                },
+                'contact': {
+                    'name': job['contact_name'] or '',
+                    'phone': job['contact_phone'] or '',
+                },
+                'service_request': {
+                    'id': service_request['id'],
+                    'name': service_request['name'],
+                },
+                'cod_amount': service_request['cod_amount'] if job['job_type'] == 'delivery' else 0.0,
+                'notes': job['notes'] or '',
+                'parcels': [{
+                    'id': parcel['id'],
+                    'tracking_number': parcel['name'],
+                    'description': parcel['description'] or '',
+                    'weight': parcel['weight'],
+                    'declared_value': parcel['declared_value'],
+                    'state': parcel['state'],
+                } for parcel in (parcels[parcel_id] for parcel_id in job['parcel_ids'])],
+            })
+
+        return {
+            'route_plan': {
+                'id': plan['id'],
+                'name': plan['name'],
+                'date': plan['date'],
+                'state': plan['state'],
+                'job_count': plan['job_count'],
+                'completed_jobs': plan['completed_jobs'],
+                'pending_jobs': plan['pending_jobs'],
+                'total_distance_km': plan['total_distance_km'],
+                'estimated_duration': plan['estimated_duration'],
+            },
+            'jobs': job_list,
+        }
+
     def action_activate(self):
         """Activate the route plan"""
         for record in self:
@@ -1,7 +1,21 @@
 # -*- coding: utf-8 -*-
 
+import time
+from datetime import datetime, timedelta
+
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError, ValidationError
+from odoo.tools import consteq
+from odoo.tools.misc import hmac
+
+from ..tools import geo
+
+# System parameter: hours a shared tracking link stays valid
+TRACKING_LINK_HOURS_PARAM = 'routy.tracking_link_hours'
+TRACKING_LINK_DEFAULT_HOURS = 48
+
+# Average urban speed used to estimate the arrival time
+TRACKING_AVERAGE_SPEED_KMH = 25
 
 
 class ServiceRequest(models.Model):
@@ -36,6 +50,12 @@ class ServiceRequest(models.Model):
     pickup_address = fields.Text(string='Pickup Address', required=True)
     pickup_lat = fields.Float(string='Pickup Latitude', digits=(10, 7))
     pickup_lng = fields.Float(string='Pickup Longitude', digits=(10, 7))
+    pickup_geohash = fields.Char(
+        string='Pickup Geohash',
+        compute='_compute_geohashes',
+        store=True,
+        index=True
+    )
     pickup_contact = fields.Char(string='Pickup Contact Name')
     pickup_phone = fields.Char(string='Pickup Phone', required=True)
 
@@ -43,6 +63,12 @@ class ServiceRequest(models.Model):
     delivery_address = fields.Text(string='Delivery Address', required=True)
     delivery_lat = fields.Float(string='Delivery Latitude', digits=(10, 7))
     delivery_lng = fields.Float(string='Delivery Longitude', digits=(10, 7))
+    delivery_geohash = fields.Char(
+        string='Delivery Geohash',
+        compute='_compute_geohashes',
+        store=True,
+        index=True
+    )
     delivery_contact = fields.Char(string='Delivery Contact Name')
     delivery_phone = fields.Char(string='Delivery Phone', required=True)
 
@@ -134,6 +160,100 @@ class ServiceRequest(models.Model):
         for record in self:
             record.parcel_count = len(record.parcel_ids)
 
+    @api.depends('pickup_lat', 'pickup_lng', 'delivery_lat', 'delivery_lng')
+    def _compute_geohashes(self):
+        """Compute the geohash cells of the pickup and delivery locations"""
+        for record in self:
+            if record.pickup_lat or record.pickup_lng:
+                record.pickup_geohash = geo.geohash_encode(record.pickup_lat, record.pickup_lng)
+            else:
+                record.pickup_geohash = False
+            if record.delivery_lat or record.delivery_lng:
+                record.delivery_geohash = geo.geohash_encode(record.delivery_lat, record.delivery_lng)
+            else:
+                record.delivery_geohash = False
+
+    def get_nearest_drivers(self, radius=5.0, limit=10):
+        """Get the available drivers closest to the pickup location"""
+        self.ensure_one()
+        if not (self.pickup_lat or self.pickup_lng):
+            return []
+        return self.env['routy.driver.position'].nearest_drivers(
+            self.pickup_lat, self.pickup_lng, radius=radius, limit=limit
+        )
+
+    def _get_tracking_token(self, expires):
+        """Signature of a tracking link valid until `expires` (epoch seconds)"""
+        self.ensure_one()
+        return hmac(self.env(su=True), 'routy-tracking', (self.id, int(expires)))
+
+    def _check_tracking_token(self, expires, token):
+        """Return True when `token` signs this request's link and the link has not expired"""
+        self.ensure_one()
+        return expires > time.time() and consteq(self._get_tracking_token(expires), token)
+
+    def _get_tracking_url(self):
+        """Build a signed, expiring public tracking URL"""
+        self.ensure_one()
+        hours = int(self.env['ir.config_parameter'].sudo().get_param(
+            TRACKING_LINK_HOURS_PARAM, TRACKING_LINK_DEFAULT_HOURS))
+        expires = int(time.time()) + hours * 3600
+        return '%s/routy/track/%s/%s/%s' % (
+            self.get_base_url(), self.id, expires, self._get_tracking_token(expires))
+
+    def _get_tracking_job(self):
+        """Delivery job in progress, whose driver is shown on the tracking page"""
+        self.ensure_one()
+        return self.job_ids.filtered(lambda j: j.job_type == 'delivery' and j.state == 'in_progress')[:1]
+
+    def _get_tracking_data(self, position):
+        """
+        Public tracking status of the request. `position` is the last known
+        position of the driver of the delivery job in progress (see
+        _get_tracking_job and routy.driver.position.get_positions) or None.
+        """
+        self.ensure_one()
+        data = {
+            'reference': self.name,
+            'state': self.state,
+            'driver': False,
+            'position': False,
+            'eta': False,
+        }
+        job = self._get_tracking_job()
+        if not job:
+            return data
+        data['driver'] = job.driver_id.name.split()[0] if job.driver_id.name else False
+        if not position:
+            return data
+        data['position'] = {
+            'lat': position['lat'],
+            'lng': position['lng'],
+            'timestamp': position['timestamp'],
+        }
+        if self.delivery_lat or self.delivery_lng:
+            distance_km = geo.haversine_m(
+                position['lat'], position['lng'], self.delivery_lat, self.delivery_lng) / 1000.0
+            eta = datetime.fromisoformat(position['timestamp']) \
+                + timedelta(hours=distance_km / TRACKING_AVERAGE_SPEED_KMH)
+            data['eta'] = eta.replace(second=0).isoformat()
+        return data
+
+    def action_share_tracking_link(self):
+        """Generate a public tracking link and log it on the request"""
+        self.ensure_one()
+        url = self._get_tracking_url()
+        self.message_post(body=_('Tracking link shared: %s', url))
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Tracking Link'),
+                'message': url,
+                'sticky': True,
+            }
+        }
+
     @api.model
     def create(self, vals):
         """Override create to generate sequence"""
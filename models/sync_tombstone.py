@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+import logging
+from datetime import timedelta
+
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+# Tombstones older than this are purged; sync cursors older than this are reset
+SYNC_TOMBSTONE_RETENTION_DAYS = 30
+
+
+class SyncTombstone(models.Model):
+    _name = 'routy.sync.tombstone'
+    _description = 'Mobile Sync Tombstone'
+    _order = 'id'
+    _log_access = False
+
+    driver_id = fields.Many2one(
+        'res.users',
+        string='Driver',
+        required=True,
+        ondelete='cascade',
+        index=True
+    )
+    res_model = fields.Char(
+        string='Model',
+        required=True,
+        help='Model of the record that left the driver\'s data set'
+    )
+    res_id = fields.Integer(
+        string='Record ID',
+        required=True
+    )
+    removed_at = fields.Datetime(
+        string='Removed At',
+        required=True,
+        default=fields.Datetime.now
+    )
+
+    @api.model
+    def _record(self, res_model, removals):
+        """Record that records left drivers' data sets; `removals` is [(driver_id, res_id)]"""
+        if removals:
+            self.sudo().create([{
+                'driver_id': driver_id,
+                'res_model': res_model,
+                'res_id': res_id,
+            } for driver_id, res_id in removals])
+
+    @api.model
+    def _get_last_id(self):
+        """Id of the newest tombstone, 0 when there is none"""
+        self.env.cr.execute(f'SELECT COALESCE(max(id), 0) FROM "{self._table}"')
+        return self.env.cr.fetchone()[0]
+
+    @api.model
+    def _cron_clean_tombstones(self):
+        """Purge tombstones older than SYNC_TOMBSTONE_RETENTION_DAYS"""
+        try:
+            cutoff = fields.Datetime.now() - timedelta(days=SYNC_TOMBSTONE_RETENTION_DAYS)
+            self.env.cr.execute(f'DELETE FROM "{self._table}" WHERE removed_at < %s', (cutoff,))
+            _logger.info(f'Deleted {self.env.cr.rowcount} sync tombstones')
+        except Exception as e:
+            _logger.error(f'Error cleaning sync tombstones: {str(e)}')
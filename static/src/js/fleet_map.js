@@ -0,0 +1,86 @@
+/** @odoo-module **/
+
+import { registry } from "@web/core/registry";
+import { Component, onWillStart, onWillUnmount, useState } from "@odoo/owl";
+import { useService } from "@web/core/utils/hooks";
+
+const MAP_WIDTH = 800;
+const MAP_HEIGHT = 500;
+const MAP_PADDING = 20;
+
+class RoutyFleetMap extends Component {
+    setup() {
+        this.orm = useService("orm");
+        this.busService = useService("bus_service");
+        this.state = useState({ positions: {} });
+        this.onPositions = (payload) => this.updatePositions(payload.positions);
+
+        onWillStart(async () => {
+            const positions = await this.orm.call(
+                "routy.driver.position",
+                "get_fleet_positions",
+                []
+            );
+            this.updatePositions(positions);
+            // Pushed by the server at most once per driver per interval
+            this.busService.subscribe("routy_fleet/positions", this.onPositions);
+        });
+
+        onWillUnmount(() => {
+            this.busService.unsubscribe("routy_fleet/positions", this.onPositions);
+        });
+    }
+
+    updatePositions(positions) {
+        for (const position of positions) {
+            const current = this.state.positions[position.driver_id];
+            if (!current || current.timestamp < position.timestamp) {
+                this.state.positions[position.driver_id] = position;
+            }
+        }
+    }
+
+    get drivers() {
+        return Object.values(this.state.positions).sort((a, b) =>
+            a.driver_name.localeCompare(b.driver_name)
+        );
+    }
+
+    get bounds() {
+        const drivers = this.drivers;
+        const lats = drivers.map((d) => d.lat);
+        const lngs = drivers.map((d) => d.lng);
+        return {
+            minLat: Math.min(...lats),
+            maxLat: Math.max(...lats),
+            minLng: Math.min(...lngs),
+            maxLng: Math.max(...lngs),
+        };
+    }
+
+    project(position, bounds) {
+        const { minLat, maxLat, minLng, maxLng } = bounds;
+        const width = MAP_WIDTH - 2 * MAP_PADDING;
+        const height = MAP_HEIGHT - 2 * MAP_PADDING;
+        const x = maxLng > minLng ? (position.lng - minLng) / (maxLng - minLng) : 0.5;
+        const y = maxLat > minLat ? (maxLat - position.lat) / (maxLat - minLat) : 0.5;
+        return {
+            x: MAP_PADDING + x * width,
+            y: MAP_PADDING + y * height,
+        };
+    }
+
+    get mapWidth() {
+        return MAP_WIDTH;
+    }
+
+    get mapHeight() {
+        return MAP_HEIGHT;
+    }
+}
+
+RoutyFleetMap.template = "routy.FleetMap";
+
+registry.category("actions").add("routy.fleet_map", RoutyFleetMap);
+
+export default RoutyFleetMap;
@@ -10,3 +10,4 @@ from . import test_payment_record
 from . import test_incident
 from . import test_wizards
 from . import test_mobile_api
+from . import test_gps_log
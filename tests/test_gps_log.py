@@ -0,0 +1,608 @@
+# -*- coding: utf-8 -*-
+
+from datetime import date, timedelta
+
+from odoo import fields
+from odoo.exceptions import AccessError
+from odoo.tests import tagged
+from odoo.addons.routy.models.geofence import _driver_jobs_cache
+from odoo.addons.routy.tools import gps_validation
+from .common import RoutyCommonCase
+
+
+@tagged('post_install', '-at_install', 'routy')
+class TestGPSLog(RoutyCommonCase):
+    """Test cases for GPS Log model"""
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestGPSLog, cls).setUpClass()
+        cls.other_driver = cls.env['res.users'].create({
+            'name': 'Other Driver',
+            'login': 'other_gps_driver',
+            'email': 'other_gps@test.com',
+            'groups_id': [(6, 0, [cls.group_driver.id])]
+        })
+
+    def _point(self, job, **kwargs):
+        """Helper to build an incoming GPS fix"""
+        point = {
+            'job_id': job.id,
+            'latitude': 30.0444,
+            'longitude': 31.2357,
+            'speed': 30.0,
+        }
+        point.update(kwargs)
+        return point
+
+    def _ingest_horizon(self):
+        """Stop detection horizon covering the fixes stored by the test transaction"""
+        self.env.cr.execute('SELECT txid_current() + 1')
+        return self.env.cr.fetchone()[0]
+
+    def test_01_ingest_batch_multiple_jobs(self):
+        """Test a batch spanning several jobs is stored in one call"""
+        sr = self._create_service_request()
+        job1 = self._create_job(sr)
+        job2 = self._create_job(sr, job_type='delivery')
+
+        results = self.env['routy.gps.log'].ingest_points([
+            self._point(job1, timestamp='2024-01-15T10:00:00Z'),
+            self._point(job1, timestamp='2024-01-15T10:00:05Z'),
+            self._point(job2, timestamp=1705312810),
+        ], driver_id=self.driver_user.id)
+
+        self.assertEqual([r['status'] for r in results], ['accepted'] * 3)
+        self.assertEqual(len(job1.gps_log_ids), 2)
+        self.assertEqual(len(job2.gps_log_ids), 1)
+        log = self.env['routy.gps.log'].browse(results[0]['log_id'])
+        self.assertEqual(str(log.timestamp), '2024-01-15 10:00:00')
+        self.assertEqual(log.driver_id, self.driver_user)
+
+    def test_02_ingest_rejects_per_point(self):
+        """Test invalid points are rejected without failing the batch"""
+        sr = self._create_service_request()
+        job = self._create_job(sr)
+        foreign_job = self._create_job(sr, driver=self.other_driver)
+
+        results = self.env['routy.gps.log'].ingest_points([
+            self._point(job),
+            self._point(foreign_job),
+            {'job_id': job.id, 'latitude': 30.0},
+            self._point(job, latitude=120.0),
+            self._point(job, heading='north'),
+            self._point(job, timestamp='yesterday'),
+            {'job_id': 999999, 'latitude': 30.0, 'longitude': 31.0},
+        ], driver_id=self.driver_user.id)
+
+        self.assertEqual(results[0]['status'], 'accepted')
+        self.assertEqual(
+            [r['reason'] for r in results[1:]],
+            ['Not authorized', 'Missing required field: longitude', 'Invalid coordinates',
+             'Invalid telemetry', 'Invalid timestamp', 'Job not found']
+        )
+        self.assertEqual(len(job.gps_log_ids), 1)
+
+    def test_03_table_is_partitioned(self):
+        """Test the GPS log table is range-partitioned by date"""
+        GPSLog = self.env['routy.gps.log']
+        self.assertTrue(GPSLog._is_partitioned())
+        sr = self._create_service_request()
+        job = self._create_job(sr)
+        log = GPSLog.create({
+            'job_id': job.id,
+            'driver_id': self.driver_user.id,
+            'latitude': 30.0,
+            'longitude': 31.0,
+            'timestamp': '2024-01-15 23:59:00',
+        })
+        self.assertEqual(log.date, date(2024, 1, 15))
+
+    def test_04_drop_expired_partitions(self):
+        """Test retention drops whole expired partitions"""
+        GPSLog = self.env['routy.gps.log']
+        created = GPSLog._create_partitions(date(2001, 1, 1), date(2001, 2, 1))
+        self.assertEqual(created, [GPSLog._partition_name(date(2001, 1, 1)),
+                                   GPSLog._partition_name(date(2001, 2, 1))])
+
+        sr = self._create_service_request()
+        job = self._create_job(sr)
+        GPSLog.create({
+            'job_id': job.id,
+            'driver_id': self.driver_user.id,
+            'latitude': 30.0,
+            'longitude': 31.0,
+            'timestamp': '2001-01-20 08:00:00',
+        })
+        GPSLog.flush_model()
+
+        dropped = GPSLog._drop_expired_partitions(date(2001, 2, 15))
+        self.assertIn(GPSLog._partition_name(date(2001, 1, 1)), dropped)
+        self.assertNotIn(GPSLog._partition_name(date(2001, 2, 1)), dropped)
+        self.assertFalse(GPSLog.search([('job_id', '=', job.id)]))
+
+    def test_05_driver_position_keeps_newest_fix(self):
+        """Test the driver position only moves forward in time"""
+        sr = self._create_service_request()
+        job = self._create_job(sr)
+        GPSLog = self.env['routy.gps.log']
+
+        GPSLog.ingest_points([
+            self._point(job, latitude=30.1, timestamp='2024-01-15T10:00:10Z'),
+            self._point(job, latitude=30.2, timestamp='2024-01-15T10:00:00Z'),
+        ], driver_id=self.driver_user.id)
+        location = GPSLog.get_driver_current_location(self.driver_user.id)
+        self.assertEqual(location['lat'], 30.1)
+
+        # A late upload of an older fix must not overwrite the position
+        GPSLog.ingest_points([
+            self._point(job, latitude=30.3, timestamp='2024-01-15T09:59:00Z'),
+        ], driver_id=self.driver_user.id)
+        location = GPSLog.get_driver_current_location(self.driver_user.id)
+        self.assertEqual(location['lat'], 30.1)
+
+    def test_06_get_positions_bulk(self):
+        """Test positions of several drivers are returned in one call"""
+        sr = self._create_service_request()
+        job1 = self._create_job(sr)
+        job2 = self._create_job(sr, driver=self.other_driver)
+        GPSLog = self.env['routy.gps.log']
+        GPSLog.ingest_points([self._point(job1)], driver_id=self.driver_user.id)
+        GPSLog.ingest_points([self._point(job2, latitude=31.0)], driver_id=self.other_driver.id)
+
+        positions = self.env['routy.driver.position'].get_positions(
+            [self.driver_user.id, self.other_driver.id, self.dispatcher_user.id]
+        )
+        by_driver = {p['driver_id']: p for p in positions}
+        self.assertEqual(set(by_driver), {self.driver_user.id, self.other_driver.id})
+        self.assertEqual(by_driver[self.other_driver.id]['lat'], 31.0)
+        self.assertEqual(by_driver[self.other_driver.id]['job_id'], job2.id)
+
+    def test_07_simplified_job_track(self):
+        """Test the simplified track drops collinear points"""
+        sr = self._create_service_request()
+        job = self._create_job(sr)
+        start = fields.Datetime.now().timestamp() - 3600
+        # A straight line east, then a turn north
+        points = [
+            self._point(job, latitude=30.0, longitude=31.0 + i * 0.001,
+                        timestamp=start + i * 5)
+            for i in range(10)
+        ]
+        points.append(self._point(job, latitude=30.01, longitude=31.009, timestamp=start + 100))
+        self.env['routy.gps.log'].ingest_points(points, driver_id=self.driver_user.id)
+
+        track = self.env['routy.gps.log'].get_job_track(job.id, tolerance=10)
+        self.assertEqual(track['point_count'], 11)
+        self.assertEqual(track['simplified_count'], 3)
+        self.assertEqual(track['bbox'], [30.0, 31.0, 30.01, 31.009])
+        self.assertTrue(track['polyline'])
+
+        # Without tolerance the raw points are still returned
+        self.assertEqual(len(self.env['routy.gps.log'].get_job_track(job.id)), 11)
+
+    def test_08_nearest_drivers(self):
+        """Test nearby drivers are found through the geohash cells"""
+        far_driver = self.env['res.users'].create({
+            'name': 'Far Driver',
+            'login': 'far_gps_driver',
+            'groups_id': [(6, 0, [self.group_driver.id])]
+        })
+        sr = self._create_service_request()
+        GPSLog = self.env['routy.gps.log']
+        GPSLog.ingest_points([self._point(self._create_job(sr), latitude=30.0450, longitude=31.2360)],
+                             driver_id=self.driver_user.id)
+        GPSLog.ingest_points([self._point(self._create_job(sr, driver=self.other_driver),
+                                          latitude=30.0600, longitude=31.2500)],
+                             driver_id=self.other_driver.id)
+        GPSLog.ingest_points([self._point(self._create_job(sr, driver=far_driver),
+                                          latitude=31.2001, longitude=29.9187)],
+                             driver_id=far_driver.id)
+
+        log = GPSLog.search([('driver_id', '=', self.driver_user.id)], limit=1)
+        self.assertEqual(log.geohash, 'stq4yv92g')
+
+        drivers = self.env['routy.driver.position'].nearest_drivers(30.0444, 31.2357, radius=5.0)
+        self.assertEqual([d['driver_id'] for d in drivers], [self.driver_user.id, self.other_driver.id])
+        self.assertLess(drivers[0]['distance_km'], 0.1)
+
+        # Drivers busy on an in-progress job are not suggested
+        self._create_job(sr, state='in_progress')
+        drivers = self.env['routy.driver.position'].nearest_drivers(30.0444, 31.2357, radius=5.0)
+        self.assertEqual([d['driver_id'] for d in drivers], [self.other_driver.id])
+
+    def test_09_ingest_drops_duplicates(self):
+        """Test retried uploads are acknowledged without storing duplicates"""
+        sr = self._create_service_request()
+        job = self._create_job(sr)
+        GPSLog = self.env['routy.gps.log']
+        batch = [
+            self._point(job, timestamp='2024-01-15T10:00:05Z'),
+            self._point(job, timestamp='2024-01-15T10:00:00Z'),
+            self._point(job, timestamp='2024-01-15T10:00:05Z'),
+        ]
+
+        results = GPSLog.ingest_points(batch, driver_id=self.driver_user.id)
+        self.assertTrue(results[0].get('log_id'))
+        self.assertTrue(results[1].get('log_id'))
+        self.assertTrue(results[2].get('duplicate'))
+        # Rows are inserted in timestamp order
+        self.assertLess(results[1]['log_id'], results[0]['log_id'])
+
+        results = GPSLog.ingest_points(batch, driver_id=self.driver_user.id)
+        self.assertEqual([r['status'] for r in results], ['accepted'] * 3)
+        self.assertTrue(all(r.get('duplicate') for r in results))
+        self.assertEqual(len(job.gps_log_ids), 2)
+
+        # Fixes within the same second are distinct fixes
+        results = GPSLog.ingest_points([
+            self._point(job, timestamp='2024-01-15T10:00:10.200Z'),
+            self._point(job, timestamp='2024-01-15T10:00:10.700Z'),
+        ], driver_id=self.driver_user.id)
+        self.assertTrue(all(r.get('log_id') for r in results))
+        self.assertEqual(len(job.gps_log_ids), 4)
+
+    def test_10_write_behind_spool(self):
+        """Test write-behind mode spools fixes and the flush stores them"""
+        self.env['ir.config_parameter'].sudo().set_param('routy.gps_write_behind', 'True')
+        sr = self._create_service_request()
+        job = self._create_job(sr)
+        GPSLog = self.env['routy.gps.log']
+        Spool = self.env['routy.gps.spool']
+
+        results = GPSLog.ingest_points([
+            self._point(job, timestamp='2024-01-15T10:00:00Z'),
+            self._point(job, timestamp='2024-01-15T10:00:05Z', latitude=30.05),
+        ], driver_id=self.driver_user.id)
+        self.assertTrue(all(r['queued'] for r in results))
+        self.assertFalse(job.gps_log_ids)
+        self.assertEqual(Spool.get_spool_metrics()['queue_depth'], 2)
+        # The current position is updated right away
+        self.assertEqual(GPSLog.get_driver_current_location(self.driver_user.id)['lat'], 30.05)
+
+        # A retried upload is spooled again, then dropped at flush
+        GPSLog.ingest_points([self._point(job, timestamp='2024-01-15T10:00:00Z')],
+                             driver_id=self.driver_user.id)
+
+        Spool._record_flush(*Spool._flush())
+        self.assertEqual(len(job.gps_log_ids), 2)
+        metrics = Spool.get_spool_metrics()
+        self.assertEqual(metrics['queue_depth'], 0)
+        self.assertEqual(metrics['flushed_count'], 3)
+        self.assertEqual(metrics['dropped_count'], 1)
+
+    def test_11_ingest_clamps_telemetry(self):
+        """Test out-of-range telemetry is corrected and flagged, not rejected"""
+        sr = self._create_service_request()
+        job = self._create_job(sr)
+
+        results = self.env['routy.gps.log'].ingest_points([
+            self._point(job, timestamp='2024-01-15T10:00:00Z', heading=400.0, battery_level=120),
+            self._point(job, timestamp='2024-01-15T10:00:05Z', speed=-2.0),
+            self._point(job, timestamp='2024-01-15T10:00:10Z'),
+        ], driver_id=self.driver_user.id)
+
+        self.assertEqual([r['status'] for r in results], ['accepted'] * 3)
+        self.assertEqual(results[0]['warnings'], ['heading_normalized', 'battery_clamped'])
+        self.assertEqual(results[1]['warnings'], ['speed_clamped'])
+        self.assertNotIn('warnings', results[2])
+        log = self.env['routy.gps.log'].browse(results[0]['log_id'])
+        self.assertEqual(log.heading, 40.0)
+        self.assertEqual(log.battery_level, 100.0)
+        self.assertEqual(self.env['routy.gps.log'].browse(results[1]['log_id']).speed, 0.0)
+
+    def test_12_detect_stops(self):
+        """Test stops are detected incrementally and linked to the nearest job"""
+        sr = self._create_service_request()
+        job = self._create_job(sr)
+        Stop = self.env['routy.gps.stop']
+        start = fields.Datetime.now().replace(microsecond=0) - timedelta(hours=1)
+
+        def fix(minutes, latitude, longitude, speed):
+            return self._point(job, latitude=latitude, longitude=longitude, speed=speed,
+                               timestamp=(start + timedelta(minutes=minutes)).isoformat())
+
+        # Drive in, wait five minutes at the pickup, drive off, then park elsewhere
+        points = [fix(0, 30.0300, 31.2200, 40.0)]
+        points += [fix(minute, 30.0444, 31.2357, 0.0) for minute in range(1, 7)]
+        points += [fix(8, 30.0600, 31.2500, 45.0)]
+        points += [fix(minute, 30.0700, 31.2600, 0.0) for minute in range(9, 12)]
+        self.env['routy.gps.log'].ingest_points(points, driver_id=self.driver_user.id)
+
+        Stop._detect_stops(horizon=self._ingest_horizon())
+        stops = Stop.search([('driver_id', '=', self.driver_user.id)])
+        self.assertEqual(len(stops), 1)
+        self.assertEqual(stops.job_id, job)
+        self.assertEqual(stops.duration, 5.0)
+        self.assertEqual(stops.point_count, 6)
+        self.assertEqual(job.dwell_time, 5.0 / 60)
+
+        # The second stop is still open: it is carried over, not stored
+        checkpoint = self.env['routy.gps.stop.checkpoint'].search([('driver_id', '=', self.driver_user.id)])
+        self.assertEqual(checkpoint.candidate_count, 3)
+
+        # The next run only reads new fixes and closes the open stop
+        self.env['routy.gps.log'].ingest_points([fix(12, 30.0800, 31.2700, 50.0)],
+                                                driver_id=self.driver_user.id)
+        Stop._detect_stops(horizon=self._ingest_horizon())
+        stops = Stop.search([('driver_id', '=', self.driver_user.id)])
+        self.assertEqual(len(stops), 2)
+        self.assertEqual(stops[0].duration, 2.0)
+        self.assertFalse(stops[0].job_id)
+
+    def test_13_geofence_events_and_auto_start(self):
+        """Test arriving at a job location records an enter event and starts the job"""
+        self.env['ir.config_parameter'].sudo().set_param('routy.geofence_auto_start', 'True')
+        sr = self._create_service_request()
+        job = self._create_job(sr)
+        Event = self.env['routy.geofence.event']
+        start = fields.Datetime.now().replace(microsecond=0) - timedelta(minutes=30)
+
+        def fix(minutes, latitude):
+            return self._point(job, latitude=latitude, longitude=31.2357,
+                               timestamp=(start + timedelta(minutes=minutes)).isoformat())
+
+        # Approach, then arrive about 30 m from the pickup
+        self.env['routy.gps.log'].ingest_points([fix(0, 30.0300), fix(5, 30.0447)],
+                                                driver_id=self.driver_user.id)
+        enter = Event.search([('job_id', '=', job.id)])
+        self.assertEqual(enter.mapped('event_type'), ['enter'])
+        self.assertTrue(enter.is_open)
+        self.assertEqual(job.state, 'in_progress')
+        self.assertEqual(job.started_at, start + timedelta(minutes=5))
+
+        # Jitter just outside the radius does not count as leaving
+        self.env['routy.gps.log'].ingest_points([fix(6, 30.0454)], driver_id=self.driver_user.id)
+        self.assertEqual(Event.search_count([('job_id', '=', job.id)]), 1)
+
+        self.env['routy.gps.log'].ingest_points([fix(10, 30.0600)], driver_id=self.driver_user.id)
+        events = Event.search([('job_id', '=', job.id)])
+        self.assertEqual(events.mapped('event_type'), ['exit', 'enter'])
+        self.assertFalse(enter.is_open)
+
+    def test_14_fleet_push_is_throttled(self):
+        """Test position pushes are coalesced per driver and sent on the company channel"""
+        sr = self._create_service_request()
+        job = self._create_job(sr)
+        GPSLog = self.env['routy.gps.log']
+        Bus = self.env['bus.bus']
+        domain = [('message', 'like', 'routy_fleet/positions')]
+        sent = Bus.search_count(domain)
+        now = fields.Datetime.now().replace(microsecond=0)
+
+        GPSLog.ingest_points([self._point(job, timestamp=(now - timedelta(seconds=2)).isoformat())],
+                             driver_id=self.driver_user.id)
+        GPSLog.ingest_points([self._point(job, timestamp=(now - timedelta(seconds=1)).isoformat())],
+                             driver_id=self.driver_user.id)
+        self.assertEqual(Bus.search_count(domain), sent + 1)
+
+        message = Bus.search(domain, order='id desc', limit=1)
+        self.assertIn('routy_fleet', message.channel)
+        self.assertIn(str(job.company_id.id), message.channel)
+        self.assertIn('"driver_id":%d' % self.driver_user.id, message.message)
+
+        # Once the interval has elapsed the next fix is pushed again
+        self.env['routy.driver.position'].search([('driver_id', '=', self.driver_user.id)]).write({
+            'published_at': now - timedelta(minutes=1),
+        })
+        GPSLog.ingest_points([self._point(job, timestamp=now.isoformat())], driver_id=self.driver_user.id)
+        self.assertEqual(Bus.search_count(domain), sent + 2)
+
+    def test_15_partition_created_over_default_rows(self):
+        """Test a new partition takes over the rows already in the default partition"""
+        GPSLog = self.env['routy.gps.log']
+        sr = self._create_service_request()
+        job = self._create_job(sr)
+        log = GPSLog.create({
+            'job_id': job.id,
+            'driver_id': self.driver_user.id,
+            'latitude': 30.0,
+            'longitude': 31.0,
+            'timestamp': '1999-05-10 08:00:00',
+        })
+        GPSLog.flush_model()
+
+        name = GPSLog._partition_name(date(1999, 5, 1))
+        self.assertEqual(GPSLog._create_partitions(date(1999, 5, 1), date(1999, 5, 1)), [name])
+        self.env.cr.execute(f'SELECT id FROM "{name}"')
+        self.assertEqual([row[0] for row in self.env.cr.fetchall()], [log.id])
+        self.env.cr.execute(f'SELECT count(*) FROM "{GPSLog._table}_default" WHERE id = %s', (log.id,))
+        self.assertEqual(self.env.cr.fetchone()[0], 0)
+
+    def test_16_cached_track_checks_access_and_follows_fixes(self):
+        """Test the cached track of a completed job is access-checked and refreshed by late fixes"""
+        sr = self._create_service_request()
+        job = self._create_job(sr)
+        GPSLog = self.env['routy.gps.log']
+        start = fields.Datetime.now().timestamp() - 3600
+        GPSLog.ingest_points([
+            self._point(job, latitude=30.0, longitude=31.0 + i * 0.001, timestamp=start + i * 5)
+            for i in range(5)
+        ], driver_id=self.driver_user.id)
+        job.write({'state': 'completed', 'completed_at': fields.Datetime.now()})
+
+        track = GPSLog.with_user(self.driver_user).get_job_track(job.id, tolerance=10)
+        self.assertEqual(track['point_count'], 5)
+
+        # A fix uploaded after completion is part of the next answer
+        GPSLog.ingest_points([self._point(job, latitude=30.01, longitude=31.004, timestamp=start + 30)],
+                             driver_id=self.driver_user.id)
+        track = GPSLog.with_user(self.driver_user).get_job_track(job.id, tolerance=10)
+        self.assertEqual(track['point_count'], 6)
+
+        with self.assertRaises(AccessError):
+            GPSLog.with_user(self.other_driver).get_job_track(job.id, tolerance=10)
+
+    def test_17_throttled_position_is_pushed_later(self):
+        """Test the last fix of a throttled driver is pushed once the interval is over"""
+        sr = self._create_service_request()
+        job = self._create_job(sr)
+        GPSLog = self.env['routy.gps.log']
+        Bus = self.env['bus.bus']
+        domain = [('message', 'like', 'routy_fleet/positions')]
+        now = fields.Datetime.now().replace(microsecond=0)
+        cron = self.env.ref('routy.cron_publish_fleet_positions')
+        Trigger = self.env['ir.cron.trigger'].sudo()
+        triggers = Trigger.search_count([('cron_id', '=', cron.id)])
+
+        GPSLog.ingest_points([self._point(job, latitude=30.1, timestamp=(now - timedelta(seconds=2)).isoformat())],
+                             driver_id=self.driver_user.id)
+        sent = Bus.search_count(domain)
+        GPSLog.ingest_points([self._point(job, latitude=30.2, timestamp=(now - timedelta(seconds=1)).isoformat())],
+                             driver_id=self.driver_user.id)
+        self.assertEqual(Bus.search_count(domain), sent)
+        self.assertEqual(Trigger.search_count([('cron_id', '=', cron.id)]), triggers + 1)
+
+        # Nothing to push while the interval is running
+        Position = self.env['routy.driver.position']
+        Position._cron_publish_pending()
+        self.assertEqual(Bus.search_count(domain), sent)
+
+        Position.search([('driver_id', '=', self.driver_user.id)]).write({
+            'published_at': now - timedelta(minutes=1),
+        })
+        Position._cron_publish_pending()
+        self.assertEqual(Bus.search_count(domain), sent + 1)
+        message = Bus.search(domain, order='id desc', limit=1)
+        self.assertIn('"lat":30.2', message.message)
+
+        # Once pushed, the position is no longer pending
+        Position.search([('driver_id', '=', self.driver_user.id)]).write({
+            'published_at': now - timedelta(minutes=1),
+        })
+        Position._cron_publish_pending()
+        self.assertEqual(Bus.search_count(domain), sent + 1)
+
+    def test_18_validation_paths_agree(self):
+        """Test the NumPy and Python validation paths give the same result"""
+        if gps_validation.np is None:
+            self.skipTest('NumPy is not installed')
+        points = [
+            {'latitude': 30.0, 'longitude': 31.0, 'heading': 400.0, 'battery_level': 120},
+            {'latitude': 30.0, 'longitude': 31.0, 'speed': -2.0, 'accuracy': -5.0},
+            {'latitude': 95.0, 'longitude': 31.0, 'heading': -10.0, 'speed': -1.0},
+            {'latitude': 30.0, 'longitude': 31.0, 'speed': 'fast', 'battery_level': 150},
+            {'latitude': 'north', 'longitude': 31.0, 'accuracy': -1.0},
+            {'latitude': 30.0, 'longitude': 31.0},
+        ]
+        raw = gps_validation._raw_columns(points)
+
+        def normalized(result):
+            # NaN never compares equal, map it to None
+            columns, reasons, warnings = result
+            columns = {c: [None if v != v else v for v in values] for c, values in columns.items()}
+            return columns, reasons, warnings
+
+        self.assertEqual(
+            normalized(gps_validation._validate_numpy(raw, len(points))),
+            normalized(gps_validation._validate_python(raw, len(points))),
+        )
+        reasons, warnings = gps_validation._validate_python(raw, len(points))[1:]
+        self.assertEqual(reasons, [None, None, 'Invalid coordinates', 'Invalid telemetry', 'Invalid coordinates', None])
+        self.assertEqual(warnings, [['heading_normalized', 'battery_clamped'],
+                                    ['speed_clamped', 'accuracy_clamped'], [], [], [], []])
+
+    def test_19_detect_stops_in_commit_order(self):
+        """Test fixes committed late are read by a later run, never skipped"""
+        sr = self._create_service_request()
+        job = self._create_job(sr)
+        Stop = self.env['routy.gps.stop']
+        GPSLog = self.env['routy.gps.log']
+        start = fields.Datetime.now().replace(microsecond=0) - timedelta(hours=1)
+
+        def fix(minutes, speed=0.0):
+            return self._point(job, speed=speed, timestamp=(start + timedelta(minutes=minutes)).isoformat())
+
+        results = GPSLog.ingest_points([fix(minute) for minute in range(0, 4)], driver_id=self.driver_user.id)
+        log_ids = [result['log_id'] for result in results]
+        horizon = self._ingest_horizon()
+        # The first fix got its id first but its transaction commits last
+        self.env.cr.execute(f'UPDATE "{GPSLog._table}" SET ingest_txid = %s WHERE id = %s',
+                            (horizon + 1, log_ids[0]))
+        self.env.cr.execute(f'UPDATE "{GPSLog._table}" SET ingest_txid = %s WHERE id IN %s',
+                            (horizon, tuple(log_ids[1:])))
+
+        # Nothing is read past a transaction still in flight
+        self.assertEqual(Stop._detect_stops(horizon=horizon), 0)
+        self.assertEqual(Stop._detect_stops(horizon=horizon + 1), 3)
+        self.assertEqual(Stop._detect_stops(horizon=horizon + 2), 1)
+        self.assertEqual(Stop._detect_stops(horizon=horizon + 2), 0)
+
+        # Its fix is older than the ones processed before, so the stop state
+        # machine ignores it: the open candidate only holds the later fixes
+        checkpoint = self.env['routy.gps.stop.checkpoint'].search([('driver_id', '=', self.driver_user.id)])
+        self.assertEqual(checkpoint.candidate_count, 3)
+        self.assertEqual(checkpoint.candidate_start, start + timedelta(minutes=1))
+
+    def test_20_hub_geofence_uses_nearby_cells(self):
+        """Test hub geofences are checked near the fix, and left wherever the driver goes"""
+        sr = self._create_service_request()
+        job = self._create_job(sr)
+        Event = self.env['routy.geofence.event']
+        start = fields.Datetime.now().replace(microsecond=0) - timedelta(minutes=30)
+
+        def fix(minutes, latitude, longitude):
+            return self._point(job, latitude=latitude, longitude=longitude,
+                               timestamp=(start + timedelta(minutes=minutes)).isoformat())
+
+        self.env['routy.gps.log'].ingest_points([fix(0, 30.0446, 31.2357)], driver_id=self.driver_user.id)
+        enter = Event.search([('driver_id', '=', self.driver_user.id), ('hub_id', '!=', False)])
+        self.assertEqual(enter.hub_id, self.hub_main)
+        self.assertTrue(enter.is_open)
+
+        # The next fix is far outside the cells around the hub
+        self.env['routy.gps.log'].ingest_points([fix(30, 30.4000, 31.6000)], driver_id=self.driver_user.id)
+        events = Event.search([('driver_id', '=', self.driver_user.id), ('hub_id', '!=', False)])
+        self.assertEqual(events.mapped('event_type'), ['exit', 'enter'])
+        self.assertEqual(events.hub_id, self.hub_main)
+        self.assertFalse(enter.is_open)
+
+    def test_21_job_change_invalidates_its_drivers_only(self):
+        """Test a job change drops the cached open jobs of its drivers, not of every driver"""
+        sr = self._create_service_request()
+        job = self._create_job(sr)
+        third_driver = self.env['res.users'].create({
+            'name': 'Third Driver',
+            'login': 'third_gps_driver',
+            'email': 'third_gps@test.com',
+            'groups_id': [(6, 0, [self.group_driver.id])]
+        })
+        Event = self.env['routy.geofence.event']
+        dbname = self.env.cr.dbname
+        drivers = (self.driver_user | self.other_driver | third_driver).ids
+
+        def cached():
+            return {driver_id for driver_id in drivers if _driver_jobs_cache.get(dbname, driver_id) is not None}
+
+        for driver_id in drivers:
+            Event._get_driver_jobs(driver_id)
+        job.write({'location_lat': 30.0500})
+        self.assertEqual(cached(), {self.other_driver.id, third_driver.id})
+
+        # Reassigning drops both the former and the new driver
+        for driver_id in drivers:
+            Event._get_driver_jobs(driver_id)
+        job.write({'driver_id': self.other_driver.id})
+        self.assertEqual(cached(), {third_driver.id})
+        self.assertEqual(Event._get_driver_jobs(self.other_driver.id), [(job.id, 30.05, job.location_lng)])
+
+    def test_22_late_fix_is_not_pushed(self):
+        """Test a fix older than the driver's position is not pushed on the fleet channel"""
+        sr = self._create_service_request()
+        job = self._create_job(sr)
+        GPSLog = self.env['routy.gps.log']
+        Bus = self.env['bus.bus']
+        domain = [('message', 'like', 'routy_fleet/positions')]
+        now = fields.Datetime.now().replace(microsecond=0)
+
+        GPSLog.ingest_points([self._point(job, latitude=30.1, timestamp=(now - timedelta(seconds=10)).isoformat())],
+                             driver_id=self.driver_user.id)
+        self.env['routy.driver.position'].search([('driver_id', '=', self.driver_user.id)]).write({
+            'published_at': now - timedelta(minutes=1),
+        })
+        sent = Bus.search_count(domain)
+
+        GPSLog.ingest_points([self._point(job, latitude=30.2, timestamp=(now - timedelta(seconds=20)).isoformat())],
+                             driver_id=self.driver_user.id)
+        self.assertEqual(Bus.search_count(domain), sent)
+        self.assertEqual(GPSLog.get_driver_current_location(self.driver_user.id)['lat'], 30.1)
@@ -232,3 +232,95 @@ class TestJob(RoutyCommonCase):
         job.action_start()
         with self.assertRaises(UserError):
             job.action_accept()
+
+    def test_19_odometer_on_completion(self):
+        """Test distance and moving time are measured from GPS logs on completion"""
+        sr = self._create_service_request()
+        job = self._create_job(sr)
+        route = self.env['routy.route_plan'].create({
+            'driver_id': self.driver_user.id,
+            'job_ids': [(6, 0, [job.id])],
+        })
+        start = fields.Datetime.now().timestamp() - 600
+        # Ten fixes ~100 m apart every 10 seconds, then a GPS jump
+        points = [{
+            'job_id': job.id,
+            'latitude': 30.0 + i * 0.0009,
+            'longitude': 31.0,
+            'accuracy': 5.0,
+            'timestamp': start + i * 10,
+        } for i in range(10)]
+        points.append({'job_id': job.id, 'latitude': 35.0, 'longitude': 31.0, 'timestamp': start + 100})
+        self.env['routy.gps.log'].ingest_points(points, driver_id=self.driver_user.id)
+
+        job.action_start()
+        job.action_complete()
+
+        self.assertAlmostEqual(job.distance_km, 0.9, places=1)
+        self.assertAlmostEqual(job.moving_time, 90 / 3600.0, places=4)
+        self.assertTrue(job.odometer_updated_at)
+        self.assertAlmostEqual(route.actual_distance_km, job.distance_km, places=2)
+
+    def test_20_bulk_actions(self):
+        """Test bulk actions apply per set and report the faulty items"""
+        sr = self._create_service_request()
+        jobs = self._create_job(sr) | self._create_job(sr) | self._create_job(sr)
+        other_job = self._create_job(sr, driver=self.dispatcher_user)
+        jobs[2].action_accept()
+
+        results = self.env['routy.job'].apply_bulk_actions([
+            {'job_id': jobs[0].id, 'action': 'accept'},
+            {'job_id': jobs[1].id, 'action': 'accept'},
+            {'job_id': jobs[2].id, 'action': 'accept'},
+            {'job_id': other_job.id, 'action': 'accept'},
+            {'job_id': jobs[0].id, 'action': 'start'},
+            {'job_id': jobs[0].id, 'action': 'fail', 'payload': {'failure_reason': 'Closed', 'state': 'completed'}},
+            {'job_id': jobs[1].id, 'action': 'teleport'},
+        ], driver_id=self.driver_user.id)
+
+        self.assertEqual([r['success'] for r in results], [True, True, False, False, True, True, False])
+        self.assertEqual(results[2]['error'], 'Only assigned jobs can be accepted.')
+        self.assertEqual(results[3]['error'], 'Not authorized')
+        self.assertEqual(results[6]['error'], 'Unknown action')
+        self.assertEqual(jobs[0].state, 'failed')
+        self.assertEqual(jobs[0].failure_reason, 'Closed')
+        self.assertEqual(jobs[1].state, 'accepted')
+        self.assertEqual(other_job.state, 'assigned')
+
+    def test_21_replay_journal(self):
+        """Test an offline journal replays in client order, once per idempotency key"""
+        sr = self._create_service_request(assigned_driver_id=self.driver_user.id)
+        parcel = self._create_parcel(sr)
+        garbled_parcel = self._create_parcel(sr)
+        job = self._create_job(sr)
+        job.action_accept()
+        signature = base64.b64encode(b'signature').decode()
+
+        Key = self.env['routy.idempotency.key']
+        journal = [
+            {'key': 'k-start', 'action': 'start', 'job_id': job.id, 'timestamp': '2024-01-15T10:05:00Z'},
+            {'key': 'k-accept', 'action': 'accept', 'job_id': job.id, 'timestamp': '2024-01-15T10:00:00Z'},
+            {'key': 'k-deliver', 'action': 'deliver', 'parcel_id': parcel.id, 'timestamp': '2024-01-15T10:20:00Z',
+             'payload': {'recipient_name': 'John', 'signature': signature}},
+            {'key': 'k-bad', 'action': 'complete', 'timestamp': '2024-01-15T10:30:00Z'},
+            {'key': 'k-garbled', 'action': 'deliver', 'parcel_id': garbled_parcel.id,
+             'timestamp': '2024-01-15T10:25:00Z', 'payload': {'signature': 'abc'}},
+        ]
+        results = Key.replay(journal, driver_id=self.driver_user.id)
+        self.assertEqual([r['success'] for r in results], [True, True, True, False, False])
+        self.assertEqual(results[0]['status'], 'applied')
+        self.assertEqual(results[1]['status'], 'already_applied')
+        self.assertEqual(job.state, 'in_progress')
+        self.assertEqual(parcel.state, 'delivered')
+        self.assertEqual(parcel.recipient_name, 'John')
+        self.assertNotEqual(garbled_parcel.state, 'delivered')
+        # Actions are dated from the journal, not from the replay
+        self.assertEqual(str(job.started_at), '2024-01-15 10:05:00')
+        self.assertEqual(str(parcel.delivered_at), '2024-01-15 10:20:00')
+
+        # The same journal sent again short-circuits on its keys: the key
+        # lookup is the only query, no job or parcel is read
+        with self.assertQueryCount(1):
+            results = Key.replay(journal[:3], driver_id=self.driver_user.id)
+        self.assertEqual([r['status'] for r in results], ['duplicate'] * 3)
+        self.assertEqual(Key.search_count([('driver_id', '=', self.driver_user.id)]), 3)
@@ -4,6 +4,9 @@ from odoo.tests import tagged, HttpCase
 from odoo.tests.common import get_db_name
 import json
 import base64
+import zlib
+
+from odoo.addons.routy.tools import gps_codec
 
 
 @tagged('post_install', '-at_install', 'routy')
@@ -273,3 +276,527 @@ class TestMobileAPI(HttpCase):
         response = self.url_open(f'/api/v1/routy/jobs/{job.id}/accept',
                                 data={})
         self.assertEqual(response.status_code, 403)
+
+    def test_11_gps_export_requires_dispatcher(self):
+        """Test drivers cannot export GPS tracks"""
+        response = self.url_open(f'/routy/gps/export?driver_id={self.driver_user.id}')
+        self.assertEqual(response.status_code, 403)
+
+    def test_12_gps_binary_upload(self):
+        """Test GPS fixes sent as compact binary frames are stored"""
+        sr = self.env['routy.service_request'].create({
+            'customer_id': self.customer.id,
+            'service_type': 'local',
+            'pickup_address': '123 Pickup St',
+            'pickup_phone': '+201111111111',
+            'delivery_address': '456 Delivery St',
+            'delivery_phone': '+202222222222',
+        })
+        job = self.env['routy.job'].create({
+            'job_type': 'pickup',
+            'service_request_id': sr.id,
+            'driver_id': self.driver_user.id,
+            'location_address': sr.pickup_address,
+        })
+        points = [{
+            'timestamp': 1705312800 + i * 5,
+            'latitude': 30.0444 + i * 0.0001,
+            'longitude': 31.2357,
+            'speed': 36.5,
+            'heading': 90.0,
+            'accuracy': 6.5,
+            'battery_level': 80,
+        } for i in range(20)]
+
+        response = self.url_open(
+            '/api/v1/routy/gps/binary',
+            data=gps_codec.encode_frame(job.id, points),
+            headers={'Content-Type': 'application/x-routy-gps'},
+        )
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertEqual(data['accepted'], 20)
+
+        logs = self.env['routy.gps.log'].search([('job_id', '=', job.id)], order='timestamp asc')
+        self.assertEqual(len(logs), 20)
+        self.assertAlmostEqual(logs[-1].latitude, 30.0463, places=6)
+        self.assertEqual(logs[0].speed, 36.5)
+
+        response = self.url_open(
+            '/api/v1/routy/gps/binary',
+            data=b'not a frame',
+            headers={'Content-Type': 'application/x-routy-gps'},
+        )
+        self.assertEqual(response.status_code, 400)
+
+        # A zero-point frame must not be inflated without bound
+        block = zlib.compress(b'\0' * 1000000)
+        response = self.url_open(
+            '/api/v1/routy/gps/binary',
+            data=gps_codec.HEADER.pack(gps_codec.MAGIC, gps_codec.VERSION, gps_codec.FLAG_ZLIB,
+                                       0, job.id, len(block), 0, 0, 0) + block,
+            headers={'Content-Type': 'application/x-routy-gps'},
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.content)['error'], 'Empty frame')
+
+    def test_13_public_tracking_link(self):
+        """Test the signed tracking link shows the driver position and honours ETags"""
+        sr = self.env['routy.service_request'].create({
+            'customer_id': self.customer.id,
+            'pickup_address': '123 Pickup St',
+            'pickup_phone': '+201111111111',
+            'delivery_address': '456 Delivery St',
+            'delivery_phone': '+202222222222',
+            'delivery_lat': 30.0600,
+            'delivery_lng': 31.2500,
+            'assigned_driver_id': self.driver_user.id,
+        })
+        job = self.env['routy.job'].create({
+            'job_type': 'delivery',
+            'service_request_id': sr.id,
+            'driver_id': self.driver_user.id,
+            'location_address': sr.delivery_address,
+            'state': 'in_progress',
+        })
+        self.env['routy.gps.log'].ingest_points(
+            [{'job_id': job.id, 'latitude': 30.0444, 'longitude': 31.2357}],
+            driver_id=self.driver_user.id,
+        )
+        path = sr._get_tracking_url().replace(sr.get_base_url(), '')
+        self.logout()
+
+        response = self.url_open(path + '/json')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertEqual(data['driver'], 'API')
+        self.assertEqual(data['position']['lat'], 30.0444)
+        self.assertTrue(data['eta'])
+        etag = response.headers['ETag']
+
+        response = self.url_open(path + '/json', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+        response = self.url_open(path)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'on the way', response.content)
+
+        response = self.url_open(path[:-1] + ('0' if path[-1] != '0' else '1') + '/json')
+        self.assertEqual(response.status_code, 404)
+
+    def test_14_delta_sync(self):
+        """Test the sync endpoint only returns changes since the cursor, plus removals"""
+        sr = self.env['routy.service_request'].create({
+            'customer_id': self.customer.id,
+            'pickup_address': '123 Pickup St',
+            'pickup_phone': '+201111111111',
+            'delivery_address': '456 Delivery St',
+            'delivery_phone': '+202222222222',
+        })
+        job = self.env['routy.job'].create({
+            'job_type': 'pickup',
+            'service_request_id': sr.id,
+            'driver_id': self.driver_user.id,
+            'location_address': sr.pickup_address,
+        })
+
+        # A change just made is sent again until it has settled
+        data = json.loads(self.url_open('/api/v1/routy/sync').content)
+        self.assertEqual([j['id'] for j in data['jobs']], [job.id])
+        data = json.loads(self.url_open('/api/v1/routy/sync?cursor=%s' % data['cursor']).content)
+        self.assertEqual([j['id'] for j in data['jobs']], [job.id])
+
+        self.env.flush_all()
+        self.env.cr.execute(
+            "UPDATE routy_job SET write_date = write_date - interval '10 minutes' WHERE id = %s", (job.id,))
+        self.env.invalidate_all()
+        data = json.loads(self.url_open('/api/v1/routy/sync').content)
+        self.assertTrue(data['reset'])
+        self.assertEqual([j['id'] for j in data['jobs']], [job.id])
+        self.assertEqual(data['jobs'][0]['service_request_id'], sr.id)
+        cursor = data['cursor']
+
+        data = json.loads(self.url_open('/api/v1/routy/sync?cursor=%s' % cursor).content)
+        self.assertFalse(data['reset'])
+        self.assertEqual(data['jobs'], [])
+        self.assertEqual(data['removed'], {'jobs': []})
+
+        other_driver = self.env['res.users'].create({
+            'name': 'Other Sync Driver',
+            'login': 'other_sync_driver',
+            'groups_id': [(6, 0, [self.group_driver.id])]
+        })
+        job.write({'driver_id': other_driver.id})
+        data = json.loads(self.url_open('/api/v1/routy/sync?cursor=%s' % data['cursor']).content)
+        self.assertEqual(data['jobs'], [])
+        self.assertEqual(data['removed'], {'jobs': [job.id]})
+
+        response = self.url_open('/api/v1/routy/sync?cursor=garbage')
+        self.assertEqual(response.status_code, 400)
+
+    def test_15_get_my_jobs_paging_and_fields(self):
+        """Test keyset paging, date windows and sparse fieldsets on the job list"""
+        sr = self.env['routy.service_request'].create({
+            'customer_id': self.customer.id,
+            'pickup_address': '123 Pickup St',
+            'pickup_phone': '+201111111111',
+            'delivery_address': '456 Delivery St',
+            'delivery_phone': '+202222222222',
+        })
+        jobs = self.env['routy.job'].create([{
+            'job_type': 'pickup',
+            'service_request_id': sr.id,
+            'driver_id': self.driver_user.id,
+            'location_address': sr.pickup_address,
+            'scheduled_time': '2024-01-%02d 09:00:00' % day,
+        } for day in (15, 15, 16, 17)])
+
+        response = self.url_open('/api/v1/routy/jobs/my?limit=3&fields=state,scheduled_time')
+        data = json.loads(response.content)
+        self.assertEqual([j['id'] for j in data['jobs']], jobs[:3].ids)
+        self.assertEqual(set(data['jobs'][0]), {'id', 'state', 'scheduled_time'})
+        self.assertTrue(data['next_cursor'])
+
+        response = self.url_open('/api/v1/routy/jobs/my?limit=3&cursor=%s' % data['next_cursor'])
+        data = json.loads(response.content)
+        self.assertEqual([j['id'] for j in data['jobs']], jobs[3:].ids)
+        self.assertEqual(data['jobs'][0]['customer_name'], 'API Test Customer')
+        self.assertIsNone(data['next_cursor'])
+
+        response = self.url_open('/api/v1/routy/jobs/my?date_from=2024-01-16&date_to=2024-01-16')
+        data = json.loads(response.content)
+        self.assertEqual([j['id'] for j in data['jobs']], jobs[2:3].ids)
+
+        response = self.url_open('/api/v1/routy/jobs/my?fields=id,password')
+        self.assertEqual(response.status_code, 400)
+
+    def test_16_day_bundle(self):
+        """Test the day bundle returns the active plan with ordered jobs and their parcels"""
+        sr = self.env['routy.service_request'].create({
+            'customer_id': self.customer.id,
+            'pickup_address': '123 Pickup St',
+            'pickup_phone': '+201111111111',
+            'delivery_address': '456 Delivery St',
+            'delivery_phone': '+202222222222',
+            'cod_amount': 150.0,
+        })
+        parcel = self.env['routy.parcel'].create({
+            'service_request_id': sr.id,
+            'description': 'Electronics',
+            'weight': 2.5,
+        })
+        plan = self.env['routy.route_plan'].create({
+            'driver_id': self.driver_user.id,
+            'date': '2024-01-15',
+        })
+        jobs = self.env['routy.job'].create([{
+            'job_type': job_type,
+            'service_request_id': sr.id,
+            'driver_id': self.driver_user.id,
+            'route_plan_id': plan.id,
+            'location_address': address,
+            'contact_phone': phone,
+            'scheduled_time': scheduled_time,
+            'parcel_ids': [(6, 0, parcel.ids)],
+            'notes': 'Call the customer on arrival, the doorbell is broken. ' * 10,
+        } for job_type, address, phone, scheduled_time in (
+            ('delivery', sr.delivery_address, sr.delivery_phone, '2024-01-15 14:00:00'),
+            ('pickup', sr.pickup_address, sr.pickup_phone, '2024-01-15 09:00:00'),
+        )])
+        plan.action_activate()
+
+        response = self.url_open('/api/v1/routy/day?date=2024-01-16')
+        self.assertEqual(response.status_code, 404)
+
+        response = self.url_open('/api/v1/routy/day?date=2024-01-15', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers.get('Content-Encoding'), 'gzip')
+        data = json.loads(response.content)
+        self.assertEqual(data['route_plan']['id'], plan.id)
+        self.assertEqual([j['id'] for j in data['jobs']], [jobs[1].id, jobs[0].id])
+        self.assertEqual(data['jobs'][0]['cod_amount'], 0.0)
+        self.assertEqual(data['jobs'][1]['cod_amount'], 150.0)
+        self.assertEqual(data['jobs'][1]['contact']['phone'], '+202222222222')
+        self.assertEqual(data['jobs'][1]['parcels'][0]['tracking_number'], parcel.name)
+        self.assertEqual(data['jobs'][1]['parcels'][0]['weight'], 2.5)
+
+        etag = response.headers['ETag']
+        response = self.url_open('/api/v1/routy/day?date=2024-01-15', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+        response = self.url_open('/api/v1/routy/day?date=garbage')
+        self.assertEqual(response.status_code, 400)
+
+    def test_17_conditional_get(self):
+        """Test unchanged jobs and parcels answer 304 to their ETag"""
+        sr = self.env['routy.service_request'].create({
+            'customer_id': self.customer.id,
+            'pickup_address': '123 Pickup St',
+            'pickup_phone': '+201111111111',
+            'delivery_address': '456 Delivery St',
+            'delivery_phone': '+202222222222',
+        })
+        job_vals = {
+            'job_type': 'pickup',
+            'service_request_id': sr.id,
+            'driver_id': self.driver_user.id,
+            'location_address': sr.pickup_address,
+        }
+        self.env['routy.job'].create(job_vals)
+
+        response = self.url_open('/api/v1/routy/jobs/my')
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers['ETag']
+
+        response = self.url_open('/api/v1/routy/jobs/my', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(response.content)
+        self.assertEqual(response.headers['Vary'], 'Accept-Encoding')
+
+        # If-None-Match is a list of whole tags, compared weakly
+        for header in ('"other", %s' % etag, etag[2:], '*'):
+            response = self.url_open('/api/v1/routy/jobs/my', headers={'If-None-Match': header})
+            self.assertEqual(response.status_code, 304, header)
+
+        # Other parameters shape another response
+        response = self.url_open('/api/v1/routy/jobs/my?state=accepted', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+
+        self.env['routy.job'].create(job_vals)
+        response = self.url_open('/api/v1/routy/jobs/my', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(response.content)['jobs']), 2)
+
+        parcel = self.env['routy.parcel'].create({
+            'service_request_id': sr.id,
+            'description': 'Electronics',
+            'weight': 2.5,
+        })
+        response = self.url_open(f'/api/v1/routy/parcels/{parcel.id}')
+        etag = response.headers['ETag']
+        response = self.url_open(f'/api/v1/routy/parcels/{parcel.id}', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers['Vary'], 'Accept-Encoding')
+
+    def test_18_pod_stream_upload(self):
+        """Test POD images uploaded as raw or multipart bodies land on the parcel"""
+        sr = self.env['routy.service_request'].create({
+            'customer_id': self.customer.id,
+            'pickup_address': '123 Pickup St',
+            'pickup_phone': '+201111111111',
+            'delivery_address': '456 Delivery St',
+            'delivery_phone': '+202222222222',
+            'assigned_driver_id': self.driver_user.id,
+        })
+        parcel = self.env['routy.parcel'].create({
+            'service_request_id': sr.id,
+            'description': 'Electronics',
+            'weight': 2.5,
+        })
+        photo = b'\x89PNG\r\n\x1a\n' + b'photo' * 50000
+
+        response = self.url_open(
+            f'/api/v1/routy/parcels/{parcel.id}/pod/photo',
+            data=photo,
+            headers={'Content-Type': 'image/png'},
+        )
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertEqual(data['file_size'], len(photo))
+        parcel.invalidate_recordset(['pod_photo'])
+        self.assertEqual(parcel.pod_photo, base64.b64encode(photo))
+
+        response = self.url_open(
+            f'/api/v1/routy/parcels/{parcel.id}/pod/signature',
+            files={'file': ('signature.png', b'\x89PNG\r\n\x1a\nsignature', 'image/png')},
+        )
+        self.assertEqual(response.status_code, 200)
+        parcel.invalidate_recordset(['pod_signature'])
+        self.assertEqual(base64.b64decode(parcel.pod_signature), b'\x89PNG\r\n\x1a\nsignature')
+
+        response = self.url_open(
+            f'/api/v1/routy/parcels/{parcel.id}/pod/photo',
+            data=b'<html></html>',
+            headers={'Content-Type': 'text/html'},
+        )
+        self.assertEqual(response.status_code, 415)
+
+        # The declared type must match the content
+        response = self.url_open(
+            f'/api/v1/routy/parcels/{parcel.id}/pod/photo',
+            data=b'<html></html>',
+            headers={'Content-Type': 'image/jpeg'},
+        )
+        self.assertEqual(response.status_code, 415)
+
+    def test_19_api_token_auth(self):
+        """Test driver app requests authenticate with a revocable bearer token"""
+        token_record, token = self.env['routy.api.token']._generate('Test Phone', user=self.driver_user)
+        self.assertNotEqual(token_record.sudo().token_hash, token)
+        self.logout()
+
+        headers = {'Authorization': 'Bearer %s' % token}
+        response = self.url_open('/api/v1/routy/jobs/my', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(json.loads(response.content)['success'])
+
+        response = self.url_open('/api/v1/routy/jobs/my', headers={'Authorization': 'Bearer wrong'})
+        self.assertEqual(response.status_code, 401)
+
+        token_record.action_revoke()
+        response = self.url_open('/api/v1/routy/jobs/my', headers=headers)
+        self.assertEqual(response.status_code, 401)
+
+        token_record, token = self.env['routy.api.token']._generate('Old Phone', user=self.driver_user, days=-1)
+        response = self.url_open('/api/v1/routy/jobs/my', headers={'Authorization': 'Bearer %s' % token})
+        self.assertEqual(response.status_code, 401)
+
+    def test_20_json_encoding_and_gzip(self):
+        """Test datetimes are encoded natively and only large bodies are gzipped"""
+        sr = self.env['routy.service_request'].create({
+            'customer_id': self.customer.id,
+            'pickup_address': '123 Pickup St',
+            'pickup_phone': '+201111111111',
+            'delivery_address': '456 Delivery St',
+            'delivery_phone': '+202222222222',
+        })
+        self.env['routy.job'].create({
+            'job_type': 'pickup',
+            'service_request_id': sr.id,
+            'driver_id': self.driver_user.id,
+            'location_address': sr.pickup_address,
+            'scheduled_time': '2024-01-15 09:00:00',
+        })
+
+        response = self.url_open('/api/v1/routy/jobs/my', headers={'Accept-Encoding': 'gzip'})
+        self.assertIsNone(response.headers.get('Content-Encoding'))
+        self.assertEqual(json.loads(response.content)['jobs'][0]['scheduled_time'], '2024-01-15T09:00:00')
+
+        self.env['routy.job'].create([{
+            'job_type': 'delivery',
+            'service_request_id': sr.id,
+            'driver_id': self.driver_user.id,
+            'location_address': sr.delivery_address,
+            'notes': 'Leave the parcel with the concierge if nobody answers.',
+        } for _i in range(20)])
+        response = self.url_open('/api/v1/routy/jobs/my', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers.get('Content-Encoding'), 'gzip')
+        self.assertEqual(len(json.loads(response.content)['jobs']), 21)
+
+        response = self.url_open('/api/v1/routy/jobs/my', headers={'Accept-Encoding': 'identity'})
+        self.assertIsNone(response.headers.get('Content-Encoding'))
+
+        # An explicit gzip coding overrides the wildcard, wherever it is listed
+        response = self.url_open('/api/v1/routy/jobs/my', headers={'Accept-Encoding': '*;q=0, gzip;q=0.5'})
+        self.assertEqual(response.headers.get('Content-Encoding'), 'gzip')
+        response = self.url_open('/api/v1/routy/jobs/my', headers={'Accept-Encoding': 'gzip;q=0.00, *'})
+        self.assertIsNone(response.headers.get('Content-Encoding'))
+
+    def test_21_gps_export_stream(self):
+        """Test GPS exports are valid NDJSON/GeoJSON, chunked and filtered by date"""
+        sr = self.env['routy.service_request'].create({
+            'customer_id': self.customer.id,
+            'pickup_address': '123 Pickup St',
+            'pickup_phone': '+201111111111',
+            'delivery_address': '456 Delivery St',
+            'delivery_phone': '+202222222222',
+        })
+        job = self.env['routy.job'].create({
+            'job_type': 'pickup',
+            'service_request_id': sr.id,
+            'driver_id': self.driver_user.id,
+            'location_address': sr.pickup_address,
+        })
+        GPSLog = self.env['routy.gps.log']
+        timestamps = ['2024-01-15 10:00:00', '2024-01-15 10:00:05', '2024-01-15 10:00:10',
+                      '2024-01-16 09:00:00', '2024-01-16 09:00:05']
+        logs = GPSLog.create([{
+            'job_id': job.id,
+            'driver_id': self.driver_user.id,
+            'latitude': 30.0 + index * 0.001,
+            'longitude': 31.0,
+            'speed': 20.0,
+            'timestamp': timestamp,
+        } for index, timestamp in enumerate(timestamps)])
+        GPSLog.flush_model()
+
+        # Rows are read chunk_size at a time; the output does not depend on it
+        domain = [('job_id', '=', job.id)]
+        chunks = list(GPSLog._export_stream(domain, 'ndjson', chunk_size=2))
+        self.assertEqual(len(chunks), 3)
+        points = [json.loads(line) for line in b''.join(chunks).decode().splitlines()]
+        self.assertEqual([point['id'] for point in points], logs.ids)
+        self.assertEqual(points[0]['timestamp'], '2024-01-15T10:00:00')
+        self.assertEqual(points[0]['latitude'], 30.0)
+        geojson = json.loads(b''.join(GPSLog._export_stream(domain, 'geojson', chunk_size=2)))
+        self.assertEqual(len(geojson['features']), 5)
+
+        dispatcher = self.env['res.users'].create({
+            'name': 'Export Dispatcher',
+            'login': 'export_dispatcher',
+            'password': 'export_dispatcher',
+            'groups_id': [(6, 0, [self.env.ref('routy.group_dispatcher').id])],
+        })
+        self.authenticate(dispatcher.login, 'export_dispatcher')
+
+        response = self.url_open(f'/routy/gps/export?job_id={job.id}&date_from=2024-01-16')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Content-Type'].split(';')[0], 'application/x-ndjson')
+        points = [json.loads(line) for line in response.content.decode().splitlines()]
+        self.assertEqual([point['id'] for point in points], logs[3:].ids)
+
+        response = self.url_open(f'/routy/gps/export?job_id={job.id}&date_to=2024-01-15&format=geojson')
+        self.assertEqual(response.status_code, 200)
+        collection = json.loads(response.content)
+        self.assertEqual(collection['type'], 'FeatureCollection')
+        self.assertEqual([feature['properties']['id'] for feature in collection['features']], logs[:3].ids)
+        feature = collection['features'][0]
+        self.assertEqual(feature['geometry'], {'type': 'Point', 'coordinates': [31.0, 30.0]})
+        self.assertNotIn('latitude', feature['properties'])
+
+    def test_22_tracking_follows_delivery_driver(self):
+        """Test the tracking link shows the position of the delivery job's driver"""
+        courier = self.env['res.users'].create({
+            'name': 'Courier Driver',
+            'login': 'courier_driver',
+            'email': 'courier@test.com',
+            'groups_id': [(6, 0, [self.group_driver.id])]
+        })
+        sr = self.env['routy.service_request'].create({
+            'customer_id': self.customer.id,
+            'pickup_address': '123 Pickup St',
+            'pickup_phone': '+201111111111',
+            'delivery_address': '456 Delivery St',
+            'delivery_phone': '+202222222222',
+            'assigned_driver_id': self.driver_user.id,
+        })
+        pickup = self.env['routy.job'].create({
+            'job_type': 'pickup',
+            'service_request_id': sr.id,
+            'driver_id': self.driver_user.id,
+            'location_address': sr.pickup_address,
+        })
+        delivery = self.env['routy.job'].create({
+            'job_type': 'delivery',
+            'service_request_id': sr.id,
+            'driver_id': courier.id,
+            'location_address': sr.delivery_address,
+        })
+        GPSLog = self.env['routy.gps.log']
+        GPSLog.ingest_points([{'job_id': pickup.id, 'latitude': 30.1, 'longitude': 31.2}],
+                             driver_id=self.driver_user.id)
+        GPSLog.ingest_points([{'job_id': delivery.id, 'latitude': 30.2, 'longitude': 31.3}],
+                             driver_id=courier.id)
+        path = sr._get_tracking_url().replace(sr.get_base_url(), '')
+        self.logout()
+
+        # No delivery on the way: no driver and no position
+        data = json.loads(self.url_open(path + '/json').content)
+        self.assertFalse(data['driver'])
+        self.assertFalse(data['position'])
+
+        delivery.write({'state': 'in_progress'})
+        self.env.flush_all()
+        data = json.loads(self.url_open(path + '/json').content)
+        self.assertEqual(data['driver'], 'Courier')
+        self.assertEqual(data['position']['lat'], 30.2)
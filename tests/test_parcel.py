@@ -3,7 +3,9 @@
 from odoo.tests import tagged
 from odoo.exceptions import UserError, ValidationError
 from .common import RoutyCommonCase
+from PIL import Image
 import base64
+import io
 
 
 @tagged('post_install', '-at_install', 'routy')
@@ -159,3 +161,41 @@ class TestParcel(RoutyCommonCase):
         # Cannot mark delivered from pending
         with self.assertRaises(UserError):
             parcel.action_mark_delivered()
+
+    def test_16_pod_photo_processing(self):
+        """Test POD photos are queued, downscaled, stripped of EXIF and deduplicated"""
+        image = Image.new('RGB', (3000, 2000), 'red')
+        exif = Image.Exif()
+        exif[0x0132] = '2024:01:15 10:30:00'
+        output = io.BytesIO()
+        image.save(output, format='JPEG', exif=exif)
+        photo = base64.b64encode(output.getvalue())
+
+        sr = self._create_service_request()
+        parcel = self._create_parcel(sr)
+        twin = self._create_parcel(sr)
+        parcel.write({'pod_photo': photo})
+        twin.write({'pod_photo': photo})
+        self.assertEqual(parcel.pod_image_state, 'pending')
+
+        self.env['routy.parcel']._cron_process_pod_images()
+        self.assertEqual((parcel | twin).mapped('pod_image_state'), ['done', 'done'])
+
+        thumbnail = Image.open(io.BytesIO(base64.b64decode(parcel.pod_photo_thumbnail)))
+        self.assertEqual(max(thumbnail.size), 256)
+        printed = Image.open(io.BytesIO(base64.b64decode(parcel.pod_photo_print)))
+        self.assertEqual(max(printed.size), 1200)
+        original = Image.open(io.BytesIO(base64.b64decode(parcel.pod_photo)))
+        self.assertEqual(original.size, (3000, 2000))
+        self.assertFalse(original.getexif())
+        self.assertEqual(str(parcel.pod_photo_taken_at), '2024-01-15 10:30:00')
+
+        # The identical photo shares the processed files
+        attachments = self.env['ir.attachment'].search([
+            ('res_model', '=', 'routy.parcel'),
+            ('res_field', '=', 'pod_photo_print'),
+            ('res_id', 'in', (parcel | twin).ids),
+        ])
+        self.assertEqual(len(attachments), 2)
+        self.assertEqual(len(set(attachments.mapped('checksum'))), 1)
+        self.assertEqual(twin.pod_photo_taken_at, parcel.pod_photo_taken_at)
@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+
+from . import geo
+from . import gps_codec
+from . import gps_validation
+from . import pod_image
+from . import json_codec
+from . import signaled_cache
@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+"""
+Geographic helpers shared by the GPS tracking models.
+
+NumPy is used for the array maths when it is installed; every helper falls
+back to plain Python so the module works without it.
+"""
+
+import math
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+EARTH_RADIUS_M = 6371008.8
+
+# Ground resolution (meters per pixel) of a 256px web mercator tile at zoom 0
+ZOOM0_METERS_PER_PIXEL = 156543.03392
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    """Great-circle distance in meters between two points"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def zoom_to_tolerance(zoom, latitude=0.0):
+    """Simplification tolerance (meters) matching one screen pixel at a map zoom level"""
+    return ZOOM0_METERS_PER_PIXEL * math.cos(math.radians(latitude)) / (2 ** float(zoom))
+
+
+def bounding_box(lats, lngs):
+    """Return [min_lat, min_lng, max_lat, max_lng], or None for an empty track"""
+    if not len(lats):
+        return None
+    return [min(lats), min(lngs), max(lats), max(lngs)]
+
+
+def _project(lats, lngs):
+    """Project coordinates to local planar meters (equirectangular around the track)"""
+    lat0 = math.radians(sum(lats) / len(lats))
+    scale = EARTH_RADIUS_M * math.pi / 180.0
+    if np is not None:
+        xs = np.asarray(lngs, dtype=float) * scale * math.cos(lat0)
+        ys = np.asarray(lats, dtype=float) * scale
+        return xs, ys
+    xs = [lng * scale * math.cos(lat0) for lng in lngs]
+    ys = [lat * scale for lat in lats]
+    return xs, ys
+
+
+def _farthest_point(xs, ys, first, last):
+    """Index and distance of the point farthest from the segment [first, last]"""
+    x1, y1, x2, y2 = xs[first], ys[first], xs[last], ys[last]
+    dx, dy = x2 - x1, y2 - y1
+    length_sq = dx * dx + dy * dy
+    if np is not None:
+        px = xs[first + 1:last] - x1
+        py = ys[first + 1:last] - y1
+        if length_sq:
+            t = np.clip((px * dx + py * dy) / length_sq, 0.0, 1.0)
+            px = px - t * dx
+            py = py - t * dy
+        distances = px * px + py * py
+        offset = int(np.argmax(distances))
+        return first + 1 + offset, math.sqrt(float(distances[offset]))
+
+    best_index, best_distance = first, -1.0
+    for index in range(first + 1, last):
+        px, py = xs[index] - x1, ys[index] - y1
+        if length_sq:
+            t = min(1.0, max(0.0, (px * dx + py * dy) / length_sq))
+            px, py = px - t * dx, py - t * dy
+        distance = px * px + py * py
+        if distance > best_distance:
+            best_index, best_distance = index, distance
+    return best_index, math.sqrt(best_distance)
+
+
+def simplify_track(lats, lngs, tolerance_m):
+    """
+    Douglas-Peucker simplification of a track.
+    Returns the sorted indexes of the points to keep; the first and last
+    points are always kept.
+    """
+    count = len(lats)
+    if count <= 2 or tolerance_m <= 0:
+        return list(range(count))
+
+    xs, ys = _project(lats, lngs)
+    keep = [False] * count
+    keep[0] = keep[-1] = True
+    stack = [(0, count - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        index, distance = _farthest_point(xs, ys, first, last)
+        if distance > tolerance_m:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    return [index for index, kept in enumerate(keep) if kept]
+
+
+GEOHASH_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Stored geohash length (cells of about 4.8 m x 4.8 m)
+GEOHASH_PRECISION = 9
+
+# (height, width at the equator) of a geohash cell in meters, per precision
+GEOHASH_CELL_SIZES_M = {
+    1: (4992600.0, 5009400.0),
+    2: (624100.0, 1252300.0),
+    3: (156000.0, 156500.0),
+    4: (19500.0, 39100.0),
+    5: (4890.0, 4890.0),
+    6: (610.0, 1220.0),
+    7: (152.9, 152.9),
+    8: (19.1, 38.2),
+    9: (4.8, 4.8),
+}
+
+_GEOHASH_NEIGHBOR_OFFSETS = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+
+
+def geohash_encode(lat, lng, precision=GEOHASH_PRECISION):
+    """Encode a coordinate as a geohash string"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        value_range, value = (lng_range, lng) if even else (lat_range, lat)
+        middle = (value_range[0] + value_range[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            value_range[0] = middle
+        else:
+            value_range[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_BASE32[bits])
+            bits = bit_count = 0
+    return ''.join(chars)
+
+
+def geohash_decode(geohash):
+    """Return (lat, lng, lat_error, lng_error) of the center of a geohash cell"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        index = GEOHASH_BASE32.index(char)
+        for shift in range(4, -1, -1):
+            value_range = lng_range if even else lat_range
+            middle = (value_range[0] + value_range[1]) / 2
+            if (index >> shift) & 1:
+                value_range[0] = middle
+            else:
+                value_range[1] = middle
+            even = not even
+    return (
+        (lat_range[0] + lat_range[1]) / 2,
+        (lng_range[0] + lng_range[1]) / 2,
+        (lat_range[1] - lat_range[0]) / 2,
+        (lng_range[1] - lng_range[0]) / 2,
+    )
+
+
+def geohash_neighbors(geohash):
+    """Return the geohashes of the 8 cells surrounding a cell"""
+    lat, lng, lat_error, lng_error = geohash_decode(geohash)
+    neighbors = []
+    for dlat, dlng in _GEOHASH_NEIGHBOR_OFFSETS:
+        neighbor_lat = lat + dlat * 2 * lat_error
+        if not -90 <= neighbor_lat <= 90:
+            continue
+        neighbor_lng = (lng + dlng * 2 * lng_error + 180) % 360 - 180
+        neighbors.append(geohash_encode(neighbor_lat, neighbor_lng, len(geohash)))
+    return list(dict.fromkeys(neighbors))
+
+
+def geohash_precision_for_radius(radius_m, latitude=0.0):
+    """
+    Longest geohash precision whose cells are at least radius_m on each
+    side at this latitude, so that a cell and its 8 neighbors cover a
+    circle of that radius around any point of the center cell.
+    """
+    scale = max(math.cos(math.radians(latitude)), 0.01)
+    best = 1
+    for precision, (height, width) in sorted(GEOHASH_CELL_SIZES_M.items()):
+        if min(height, width * scale) >= radius_m:
+            best = precision
+    return best
+
+
+def _encode_value(value):
+    value = ~(value << 1) if value < 0 else value << 1
+    chunks = []
+    while value >= 0x20:
+        chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+        value >>= 5
+    chunks.append(chr(value + 63))
+    return ''.join(chunks)
+
+
+def encode_polyline(lats, lngs, precision=5):
+    """Encode coordinates with the Google encoded polyline algorithm"""
+    factor = 10 ** precision
+    result = []
+    prev_lat = prev_lng = 0
+    for lat, lng in zip(lats, lngs):
+        lat_i, lng_i = int(round(lat * factor)), int(round(lng * factor))
+        result.append(_encode_value(lat_i - prev_lat))
+        result.append(_encode_value(lng_i - prev_lng))
+        prev_lat, prev_lng = lat_i, lng_i
+    return ''.join(result)
+
+
+def _haversine_array(lats, lngs):
+    """Distances in meters between consecutive points of a track"""
+    if np is not None:
+        phi = np.radians(np.asarray(lats, dtype=float))
+        lmb = np.radians(np.asarray(lngs, dtype=float))
+        dphi = np.diff(phi)
+        dlmb = np.diff(lmb)
+        a = np.sin(dphi / 2) ** 2 + np.cos(phi[:-1]) * np.cos(phi[1:]) * np.sin(dlmb / 2) ** 2
+        return 2 * EARTH_RADIUS_M * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+    return [
+        haversine_m(lats[i], lngs[i], lats[i + 1], lngs[i + 1])
+        for i in range(len(lats) - 1)
+    ]
+
+
+def track_metrics(lats, lngs, timestamps, accuracies=None,
+                  max_accuracy_m=50.0, max_speed_kmh=200.0, idle_speed_kmh=3.0):
+    """
+    Measure a track given in timestamp order.
+
+    Fixes with an accuracy worse than max_accuracy_m are ignored (an accuracy
+    of 0 means unknown and is kept). Segments implying a speed above
+    max_speed_kmh are treated as GPS jumps and ignored. Segments slower than
+    idle_speed_kmh count as idle time and add no distance, so that jitter
+    around a stop does not inflate the odometer.
+
+    `timestamps` are epoch seconds. Returns (distance_m, moving_s, idle_s).
+    """
+    if accuracies is not None:
+        kept = [
+            i for i, accuracy in enumerate(accuracies)
+            if not accuracy or accuracy <= max_accuracy_m
+        ]
+        if len(kept) != len(lats):
+            lats = [lats[i] for i in kept]
+            lngs = [lngs[i] for i in kept]
+            timestamps = [timestamps[i] for i in kept]
+    if len(lats) < 2:
+        return 0.0, 0.0, 0.0
+
+    distances = _haversine_array(lats, lngs)
+    if np is not None:
+        durations = np.diff(np.asarray(timestamps, dtype=float))
+        valid = durations > 0
+        speeds = np.zeros_like(distances)
+        speeds[valid] = distances[valid] / durations[valid] * 3.6
+        valid &= speeds <= max_speed_kmh
+        moving = valid & (speeds >= idle_speed_kmh)
+        idle = valid & ~moving
+        return (
+            float(distances[moving].sum()),
+            float(durations[moving].sum()),
+            float(durations[idle].sum()),
+        )
+
+    distance_m = moving_s = idle_s = 0.0
+    for i, distance in enumerate(distances):
+        duration = timestamps[i + 1] - timestamps[i]
+        if duration <= 0:
+            continue
+        speed = distance / duration * 3.6
+        if speed > max_speed_kmh:
+            continue
+        if speed >= idle_speed_kmh:
+            distance_m += distance
+            moving_s += duration
+        else:
+            idle_s += duration
+    return distance_m, moving_s, idle_s
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+Compact binary encoding of GPS fixes for the mobile ingest endpoint.
+
+A request body is a sequence of frames. Every frame carries the fixes of
+one job and is laid out as (little-endian):
+
+    header  '<2sBBHIIqii' (30 bytes)
+        magic         b'RG'
+        version       uint8   (1)
+        flags         uint8   (bit 0: point block is zlib-compressed)
+        count         uint16  number of points
+        job_id        uint32
+        block_length  uint32  size in bytes of the point block as sent
+        base_ts       int64   epoch milliseconds
+        base_lat      int32   degrees * 1e7
+        base_lng      int32   degrees * 1e7
+
+    point block: `count` records of '<IiiHHHB' (19 bytes)
+        dt            uint32  ms since the previous point (first: since base_ts)
+        dlat          int32   delta from the previous latitude, degrees * 1e7
+        dlng          int32   delta from the previous longitude, degrees * 1e7
+        speed         uint16  km/h * 100
+        heading       uint16  degrees * 100
+        accuracy      uint16  meters * 10
+        battery       uint8   percent
+"""
+
+import struct
+import zlib
+from itertools import accumulate
+
+MAGIC = b'RG'
+VERSION = 1
+FLAG_ZLIB = 0x01
+
+HEADER = struct.Struct('<2sBBHIIqii')
+POINT = struct.Struct('<IiiHHHB')
+
+COORDINATE_SCALE = 1e7
+SPEED_SCALE = 100.0
+HEADING_SCALE = 100.0
+ACCURACY_SCALE = 10.0
+
+
+class FrameError(ValueError):
+    """Raised when a binary GPS payload cannot be decoded"""
+
+
+def decode_frames(payload, max_points=None):
+    """
+    Decode a payload made of one or more frames into a list of point dicts
+    with the keys job_id, latitude, longitude, timestamp (epoch seconds),
+    speed, heading, accuracy and battery_level.
+    """
+    points = []
+    offset = 0
+    while offset < len(payload):
+        if len(payload) - offset < HEADER.size:
+            raise FrameError('Truncated frame header')
+        (magic, version, flags, count, job_id, block_length,
+         base_ts, base_lat, base_lng) = HEADER.unpack_from(payload, offset)
+        if magic != MAGIC:
+            raise FrameError('Invalid frame magic')
+        if version != VERSION:
+            raise FrameError('Unsupported frame version: %s' % version)
+        if not count:
+            raise FrameError('Empty frame')
+        if max_points is not None and len(points) + count > max_points:
+            raise FrameError('Too many points (maximum %s)' % max_points)
+
+        offset += HEADER.size
+        block = payload[offset:offset + block_length]
+        if len(block) != block_length:
+            raise FrameError('Truncated point block')
+        offset += block_length
+
+        expected_length = count * POINT.size
+        if flags & FLAG_ZLIB:
+            decompressor = zlib.decompressobj()
+            try:
+                # Bounded so that a small payload cannot inflate without limit;
+                # count is at least 1 here, as a max_length of 0 means unbounded
+                block = decompressor.decompress(block, expected_length)
+            except zlib.error as e:
+                raise FrameError('Invalid compressed block: %s' % e)
+            if decompressor.unconsumed_tail or not decompressor.eof:
+                raise FrameError('Point block does not match the point count')
+        if len(block) != expected_length:
+            raise FrameError('Point block does not match the point count')
+
+        dts, dlats, dlngs, speeds, headings, accuracies, batteries = zip(
+            *POINT.iter_unpack(block)
+        )
+        timestamps = accumulate(dts, initial=base_ts)
+        lats = accumulate(dlats, initial=base_lat)
+        lngs = accumulate(dlngs, initial=base_lng)
+        next(timestamps), next(lats), next(lngs)
+
+        for timestamp, lat, lng, speed, heading, accuracy, battery in zip(
+                timestamps, lats, lngs, speeds, headings, accuracies, batteries):
+            points.append({
+                'job_id': job_id,
+                'latitude': lat / COORDINATE_SCALE,
+                'longitude': lng / COORDINATE_SCALE,
+                'timestamp': timestamp / 1000.0,
+                'speed': speed / SPEED_SCALE,
+                'heading': heading / HEADING_SCALE,
+                'accuracy': accuracy / ACCURACY_SCALE,
+                'battery_level': battery,
+            })
+    return points
+
+
+def encode_frame(job_id, points, compress=True):
+    """
+    Encode the fixes of one job as a frame. `points` are dicts with the same
+    keys as returned by decode_frames, in timestamp order; a frame holds at
+    least one point. Mainly used by tests and reference clients.
+    """
+    if not points:
+        raise FrameError('A frame holds at least one point')
+    base_ts = int(round(points[0]['timestamp'] * 1000))
+    base_lat = int(round(points[0]['latitude'] * COORDINATE_SCALE))
+    base_lng = int(round(points[0]['longitude'] * COORDINATE_SCALE))
+
+    records = []
+    prev_ts, prev_lat, prev_lng = base_ts, base_lat, base_lng
+    for point in points:
+        ts = int(round(point['timestamp'] * 1000))
+        lat = int(round(point['latitude'] * COORDINATE_SCALE))
+        lng = int(round(point['longitude'] * COORDINATE_SCALE))
+        records.append(POINT.pack(
+            ts - prev_ts, lat - prev_lat, lng - prev_lng,
+            int(round(point.get('speed', 0) * SPEED_SCALE)),
+            int(round(point.get('heading', 0) * HEADING_SCALE)),
+            int(round(point.get('accuracy', 0) * ACCURACY_SCALE)),
+            int(point.get('battery_level', 0)),
+        ))
+        prev_ts, prev_lat, prev_lng = ts, lat, lng
+
+    block = b''.join(records)
+    flags = 0
+    if compress:
+        block = zlib.compress(block)
+        flags |= FLAG_ZLIB
+    header = HEADER.pack(
+        MAGIC, VERSION, flags, len(points), job_id, len(block), base_ts, base_lat, base_lng
+    )
+    return header + block
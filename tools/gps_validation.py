@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+Batch validation of incoming GPS fixes.
+
+A whole upload is checked column by column instead of point by point:
+coordinates out of range reject their row, while out-of-range telemetry is
+clamped to a sane value and reported as a warning so a single glitchy sensor
+reading does not cost the driver the fix. The ORM constraints on
+``routy.gps.log`` stay authoritative for interactive writes.
+
+NumPy is used when it is installed, with a plain Python fallback.
+"""
+
+import math
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+REASON_INVALID_COORDINATES = 'Invalid coordinates'
+REASON_INVALID_TELEMETRY = 'Invalid telemetry'
+
+# Warning codes attached to a fix whose telemetry was corrected
+WARNING_HEADING_NORMALIZED = 'heading_normalized'
+WARNING_SPEED_CLAMPED = 'speed_clamped'
+WARNING_BATTERY_CLAMPED = 'battery_clamped'
+WARNING_ACCURACY_CLAMPED = 'accuracy_clamped'
+
+TELEMETRY_COLUMNS = ('accuracy', 'speed', 'heading', 'altitude', 'battery_level')
+
+
+def _to_float(value, default):
+    """Float value of a fix attribute, ``default`` when empty, NaN when not numeric"""
+    if value is None or value == '' or value is False:
+        return default
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float('nan')
+
+
+def validate_fixes(points):
+    """
+    Validate the numeric columns of a batch of fixes.
+
+    ``points`` is a list of dicts holding at least ``latitude`` and
+    ``longitude``. Returns ``(columns, reasons, warnings)`` where ``columns``
+    maps latitude, longitude and every telemetry column to a list of cleaned
+    floats, ``reasons`` holds a rejection reason or None per point and
+    ``warnings`` a (possibly empty) list of warning codes per point.
+    """
+    raw = _raw_columns(points)
+    if np is not None:
+        return _validate_numpy(raw, len(points))
+    return _validate_python(raw, len(points))
+
+
+def _raw_columns(points):
+    """Float columns of a batch of fixes, before any check"""
+    raw = {
+        'latitude': [_to_float(p.get('latitude'), float('nan')) for p in points],
+        'longitude': [_to_float(p.get('longitude'), float('nan')) for p in points],
+    }
+    for column in TELEMETRY_COLUMNS:
+        raw[column] = [_to_float(p.get(column), 0.0) for p in points]
+    return raw
+
+
+def _validate_numpy(raw, count):
+    arrays = {column: np.asarray(values, dtype=float) for column, values in raw.items()}
+    lats, lngs = arrays['latitude'], arrays['longitude']
+
+    with np.errstate(invalid='ignore'):
+        bad_coordinates = ~((np.abs(lats) <= 90) & (np.abs(lngs) <= 180))
+        bad_telemetry = ~np.isfinite(np.vstack([arrays[c] for c in TELEMETRY_COLUMNS])).all(axis=0)
+
+        # Rejected rows are left as they are and get no warnings, as in the
+        # Python path
+        accepted = ~(bad_coordinates | bad_telemetry)
+
+        heading = arrays['heading']
+        heading_flag = accepted & ((heading < 0) | (heading > 360))
+        arrays['heading'] = np.where(heading_flag, np.mod(heading, 360), heading)
+
+        speed_flag = accepted & (arrays['speed'] < 0)
+        arrays['speed'] = np.where(speed_flag, 0.0, arrays['speed'])
+
+        battery = arrays['battery_level']
+        battery_flag = accepted & ((battery < 0) | (battery > 100))
+        arrays['battery_level'] = np.where(battery_flag, np.clip(battery, 0, 100), battery)
+
+        accuracy_flag = accepted & (arrays['accuracy'] < 0)
+        arrays['accuracy'] = np.where(accuracy_flag, 0.0, arrays['accuracy'])
+
+    reasons = [None] * count
+    for index in np.flatnonzero(bad_telemetry):
+        reasons[index] = REASON_INVALID_TELEMETRY
+    for index in np.flatnonzero(bad_coordinates):
+        reasons[index] = REASON_INVALID_COORDINATES
+
+    warnings = [[] for _i in range(count)]
+    for flag, code in (
+        (heading_flag, WARNING_HEADING_NORMALIZED),
+        (speed_flag, WARNING_SPEED_CLAMPED),
+        (battery_flag, WARNING_BATTERY_CLAMPED),
+        (accuracy_flag, WARNING_ACCURACY_CLAMPED),
+    ):
+        for index in np.flatnonzero(flag):
+            warnings[index].append(code)
+
+    columns = {column: values.tolist() for column, values in arrays.items()}
+    return columns, reasons, warnings
+
+
+def _validate_python(raw, count):
+    columns = {column: list(values) for column, values in raw.items()}
+    reasons = [None] * count
+    warnings = [[] for _i in range(count)]
+    for index in range(count):
+        lat, lng = columns['latitude'][index], columns['longitude'][index]
+        if not (abs(lat) <= 90 and abs(lng) <= 180):
+            reasons[index] = REASON_INVALID_COORDINATES
+            continue
+        if not all(math.isfinite(columns[c][index]) for c in TELEMETRY_COLUMNS):
+            reasons[index] = REASON_INVALID_TELEMETRY
+            continue
+
+        heading = columns['heading'][index]
+        if not 0 <= heading <= 360:
+            columns['heading'][index] = heading % 360
+            warnings[index].append(WARNING_HEADING_NORMALIZED)
+        if columns['speed'][index] < 0:
+            columns['speed'][index] = 0.0
+            warnings[index].append(WARNING_SPEED_CLAMPED)
+        battery = columns['battery_level'][index]
+        if not 0 <= battery <= 100:
+            columns['battery_level'][index] = min(max(battery, 0.0), 100.0)
+            warnings[index].append(WARNING_BATTERY_CLAMPED)
+        if columns['accuracy'][index] < 0:
+            columns['accuracy'][index] = 0.0
+            warnings[index].append(WARNING_ACCURACY_CLAMPED)
+    return columns, reasons, warnings
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+JSON encoding of the mobile API responses.
+
+orjson is used when it is installed, with the standard library as fallback.
+Both produce the same compact output and write dates and datetimes as ISO
+8601 strings, so handlers can put ORM values in a response as they are.
+Responses above GZIP_MIN_BYTES are gzipped for clients accepting it; below
+that the gzip header costs more than it saves.
+"""
+
+import gzip
+import json
+from datetime import date
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Smallest body worth compressing
+GZIP_MIN_BYTES = 1024
+
+# Fast, light compression: API bodies are small and sent once
+GZIP_LEVEL = 5
+
+
+def _default(value):
+    """Encode the values the json module does not know"""
+    if isinstance(value, date):
+        # datetime is a date subclass; isoformat matches orjson's output
+        return value.isoformat()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def _orjson_default(value):
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError
+
+
+def dumps(data, sort_keys=False):
+    """Encode `data` to compact JSON bytes"""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(data, default=_orjson_default, option=option)
+    return json.dumps(
+        data, default=_default, sort_keys=sort_keys, separators=(',', ':'), ensure_ascii=False
+    ).encode()
+
+
+def _quality(params):
+    """q value of an Accept-Encoding coding's parameters (1 when absent, 0 when invalid)"""
+    for param in params.split(';'):
+        name, _sep, value = param.partition('=')
+        if name.strip().lower() == 'q':
+            try:
+                return float(value.strip())
+            except ValueError:
+                return 0.0
+    return 1.0
+
+
+def accepts_gzip(accept_encoding):
+    """
+    Whether an Accept-Encoding header value allows gzip: an explicit gzip
+    coding decides, whatever its position, else a '*' wildcard does
+    """
+    qualities = {}
+    for coding in (accept_encoding or '').split(','):
+        name, _sep, params = coding.strip().partition(';')
+        name = name.strip().lower()
+        if name in ('gzip', 'x-gzip', '*'):
+            qualities[name] = max(qualities.get(name, 0.0), _quality(params))
+    for name in ('gzip', 'x-gzip', '*'):
+        if name in qualities:
+            return qualities[name] > 0
+    return False
+
+
+def compress(body, accept_encoding, min_bytes=GZIP_MIN_BYTES):
+    """
+    Gzip `body` when it is large enough and the client accepts it.
+    Returns (body, content_encoding) where content_encoding is 'gzip' or None.
+    """
+    if len(body) < min_bytes or not accepts_gzip(accept_encoding):
+        return body, None
+    return gzip.compress(body, compresslevel=GZIP_LEVEL), 'gzip'
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+Proof of delivery photo processing.
+
+Phone photos are turned into a small thumbnail for the backend views and a
+print-resolution JPEG for the delivery note, and the full-size original is
+re-encoded without its metadata. The capture time and position recorded in
+the EXIF data are returned so they can be kept as plain fields.
+"""
+
+import io
+from datetime import datetime, timedelta, timezone
+
+from PIL import Image, ImageOps, features
+
+# Longest side, in pixels, of the generated variants
+THUMBNAIL_SIZE = 256
+PRINT_SIZE = 1200
+
+THUMBNAIL_QUALITY = 75
+PRINT_QUALITY = 85
+ORIGINAL_QUALITY = 92
+
+# EXIF tags and IFDs read from the photo
+EXIF_IFD = 0x8769
+GPS_IFD = 0x8825
+TAG_DATETIME = 0x0132
+TAG_DATETIME_ORIGINAL = 0x9003
+TAG_OFFSET_TIME_ORIGINAL = 0x9011
+GPS_LATITUDE_REF, GPS_LATITUDE = 1, 2
+GPS_LONGITUDE_REF, GPS_LONGITUDE = 3, 4
+
+
+class PodImageError(ValueError):
+    """Raised when the data is not an image Pillow can read"""
+
+
+def _dms_to_degrees(dms, ref):
+    degrees = float(dms[0]) + float(dms[1]) / 60 + float(dms[2]) / 3600
+    return -degrees if ref in ('S', 'W') else degrees
+
+
+def read_exif(image):
+    """
+    Capture time and position of a photo from its EXIF data, as a dict with
+    'taken_at' (datetime, timezone-aware when the camera recorded its
+    offset, else naive local time), 'latitude' and 'longitude'; values
+    missing or unreadable are None.
+    """
+    result = {'taken_at': None, 'latitude': None, 'longitude': None}
+    exif = image.getexif()
+    if not exif:
+        return result
+
+    details = exif.get_ifd(EXIF_IFD)
+    raw_time = details.get(TAG_DATETIME_ORIGINAL) or exif.get(TAG_DATETIME)
+    try:
+        taken_at = datetime.strptime(str(raw_time).strip('\x00 '), '%Y:%m:%d %H:%M:%S')
+        offset = details.get(TAG_OFFSET_TIME_ORIGINAL)
+        if offset:
+            sign = -1 if offset.startswith('-') else 1
+            hours, minutes = offset.lstrip('+-').split(':')
+            taken_at = taken_at.replace(tzinfo=timezone(sign * timedelta(hours=int(hours), minutes=int(minutes))))
+        result['taken_at'] = taken_at
+    except (TypeError, ValueError):
+        pass
+
+    gps = exif.get_ifd(GPS_IFD)
+    try:
+        if gps.get(GPS_LATITUDE) and gps.get(GPS_LONGITUDE):
+            result['latitude'] = _dms_to_degrees(gps[GPS_LATITUDE], gps.get(GPS_LATITUDE_REF))
+            result['longitude'] = _dms_to_degrees(gps[GPS_LONGITUDE], gps.get(GPS_LONGITUDE_REF))
+    except (TypeError, ValueError, IndexError, ZeroDivisionError):
+        result['latitude'] = result['longitude'] = None
+    return result
+
+
+def _encode(image, size, image_format, quality):
+    variant = image.copy()
+    if size:
+        variant.thumbnail((size, size), Image.LANCZOS)
+    if image_format == 'JPEG' and variant.mode != 'RGB':
+        variant = variant.convert('RGB')
+    output = io.BytesIO()
+    # Nothing but the pixels is saved: EXIF, XMP and ICC profiles are dropped
+    variant.save(output, format=image_format, quality=quality, optimize=True)
+    return output.getvalue()
+
+
+def process_photo(data):
+    """
+    Process raw POD photo bytes. Returns a dict with the metadata-free
+    'original', the 'thumbnail' (WebP when Pillow supports it, else JPEG)
+    and 'print' (JPEG, for PDF rendering) variants, their 'thumbnail_mimetype'
+    and the read_exif() values.
+    """
+    try:
+        image = Image.open(io.BytesIO(data))
+        image.load()
+    except (OSError, SyntaxError, Image.DecompressionBombError) as e:
+        raise PodImageError(str(e))
+
+    result = read_exif(image)
+    # Apply the camera orientation to the pixels before the EXIF tag is dropped
+    image = ImageOps.exif_transpose(image)
+
+    thumbnail_format = 'WEBP' if features.check('webp') else 'JPEG'
+    result.update({
+        'original': _encode(image, None, 'JPEG', ORIGINAL_QUALITY),
+        'thumbnail': _encode(image, THUMBNAIL_SIZE, thumbnail_format, THUMBNAIL_QUALITY),
+        'thumbnail_mimetype': 'image/%s' % thumbnail_format.lower(),
+        'print': _encode(image, PRINT_SIZE, 'JPEG', PRINT_QUALITY),
+    })
+    return result
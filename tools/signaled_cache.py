@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+Per-worker caches kept coherent across workers.
+
+A SignaledCache holds values read from the database in each worker process,
+and invalidates them the way Odoo signals its registry caches: a PostgreSQL
+sequence is bumped when the cached data changes, and every worker compares
+it with the value it saw last before reading from the cache. Clearing one of
+these caches leaves the registry's own caches alone.
+
+A bump may name the keys whose data changed (integer keys, e.g. record
+ids); they are logged with the sequence value, and workers catching up drop
+just those entries instead of the whole cache.
+"""
+
+import logging
+import threading
+
+from odoo import sql_db
+from odoo.tools.lru import LRU
+
+_logger = logging.getLogger(__name__)
+
+# Bumps whose keys are kept in the log; a worker further behind drops everything
+SIGNAL_LOG_SIZE = 1000
+
+
+class SignaledCache:
+
+    def __init__(self, sequence, size):
+        self.sequence = sequence
+        self.log_table = '%s_keys' % sequence
+        self.size = size
+        self._lock = threading.Lock()
+        self._entries = {}  # {dbname: LRU}
+        self._seen = {}     # {dbname: last sequence value checked}
+
+    def setup(self, cr):
+        """Create the signaling sequence and its key log, from a model's init()"""
+        cr.execute(f'CREATE SEQUENCE IF NOT EXISTS "{self.sequence}"')
+        cr.execute(f'CREATE TABLE IF NOT EXISTS "{self.log_table}" (seq bigint NOT NULL, key integer)')
+        cr.execute(f'CREATE INDEX IF NOT EXISTS "{self.log_table}_seq_index" ON "{self.log_table}" (seq)')
+
+    def _lru(self, dbname):
+        with self._lock:
+            lru = self._entries.get(dbname)
+            if lru is None:
+                lru = self._entries[dbname] = LRU(self.size)
+            return lru
+
+    def check(self, cr):
+        """
+        Drop this worker's entries whose data changed since the last check.
+        Call it once per request or batch, before get().
+        """
+        cr.execute(f'SELECT last_value, is_called FROM "{self.sequence}"')
+        last_value, is_called = cr.fetchone()
+        value = last_value if is_called else 0
+        seen = self._seen.get(cr.dbname)
+        if seen == value:
+            return
+        keys = None
+        if seen is not None and seen < value <= seen + SIGNAL_LOG_SIZE:
+            cr.execute(f'SELECT seq, key FROM "{self.log_table}" WHERE seq > %s AND seq <= %s', (seen, value))
+            rows = cr.fetchall()
+            # Bumps not logged yet (still committing) or pruned invalidate everything
+            if len({seq for seq, _key in rows}) == value - seen:
+                keys = {key for _seq, key in rows}
+        self._drop(cr.dbname, keys)
+        self._seen[cr.dbname] = value
+
+    def get(self, dbname, key, default=None):
+        return self._lru(dbname).get(key, default)
+
+    def set(self, dbname, key, value):
+        self._lru(dbname)[key] = value
+
+    def clear(self, dbname):
+        self._lru(dbname).clear()
+
+    def _drop(self, dbname, keys):
+        """Drop the entries of `keys`, or all of them if keys is None or holds None"""
+        if keys is None or None in keys:
+            self.clear(dbname)
+            return
+        lru = self._lru(dbname)
+        for key in keys:
+            lru.pop(key, None)
+
+    def signal(self, cr, keys=None):
+        """
+        Invalidate the cache for a change made in the transaction of `cr`,
+        for the given keys only or entirely if keys is None.
+        This worker's entries are dropped right away (and again on rollback,
+        as they may hold uncommitted data); other workers are told once the
+        transaction has committed, so they cannot re-read the old data.
+        """
+        dbname = cr.dbname
+        keys = {None} if keys is None else set(keys)
+        if not keys:
+            return
+        self._drop(dbname, keys)
+        pending = cr.postcommit.data.get(self.sequence)
+        if pending is None:
+            pending = cr.postcommit.data[self.sequence] = set()
+            cr.postcommit.add(lambda: self._bump(dbname, pending))
+            cr.postrollback.add(lambda: self._drop(dbname, pending))
+        pending.update(keys)
+
+    def _bump(self, dbname, keys):
+        try:
+            with sql_db.db_connect(dbname).cursor() as cr:
+                cr.execute('SELECT nextval(%s)', (self.sequence,))
+                seq = cr.fetchone()[0]
+                cr.execute(f'INSERT INTO "{self.log_table}" (seq, key) SELECT %s, unnest(%s::integer[])',
+                           (seq, list(keys)))
+                cr.execute(f'DELETE FROM "{self.log_table}" WHERE seq <= %s', (seq - SIGNAL_LOG_SIZE,))
+        except Exception as e:
+            _logger.warning(f'Could not signal the {self.sequence} cache: {str(e)}')
+        self._drop(dbname, keys)
@@ -3,6 +3,10 @@
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError
 
+# Search radius (km) and number of drivers suggested to the dispatcher
+NEARBY_DRIVER_RADIUS_KM = 10.0
+NEARBY_DRIVER_LIMIT = 5
+
 
 class AssignDriverWizard(models.TransientModel):
     _name = 'routy.assign.driver.wizard'
@@ -19,6 +23,16 @@ class AssignDriverWizard(models.TransientModel):
         string='Driver',
         required=True
     )
+    nearby_driver_ids = fields.Many2many(
+        'res.users',
+        string='Nearby Drivers',
+        compute='_compute_nearby_drivers',
+        help='Available drivers closest to the pickup location'
+    )
+    nearby_drivers_summary = fields.Text(
+        string='Nearby Drivers Distance',
+        compute='_compute_nearby_drivers'
+    )
     scheduled_pickup = fields.Datetime(
         string='Scheduled Pickup',
         default=fields.Datetime.now,
@@ -37,6 +51,20 @@ class AssignDriverWizard(models.TransientModel):
     )
     notes = fields.Text(string='Notes')
 
+    @api.depends('service_request_id')
+    def _compute_nearby_drivers(self):
+        """Suggest the available drivers closest to the pickup location"""
+        for wizard in self:
+            drivers = []
+            if wizard.service_request_id:
+                drivers = wizard.service_request_id.get_nearest_drivers(
+                    radius=NEARBY_DRIVER_RADIUS_KM, limit=NEARBY_DRIVER_LIMIT
+                )
+            wizard.nearby_driver_ids = [(6, 0, [d['driver_id'] for d in drivers])]
+            wizard.nearby_drivers_summary = '\n'.join(
+                '%s - %.1f km' % (d['driver_name'], d['distance_km']) for d in drivers
+            ) or False
+
     def action_assign(self):
         """Assign driver and create jobs"""
         self.ensure_one()